@@ -142,6 +142,13 @@ def eval(testOn):
 
         if testOn:
             print("Time for creating QueryProcessor:" , end - start) 
+
+        # all the queries are ranked together (see QueryProcessor.batchVectorQuery)
+        start = timer()
+        vectorResults = dict(zip(dictOfQuery.keys(), queryProcessor.batchVectorQuery(list(dictOfQuery.values()), k)))
+        end = timer()
+        if testOn:
+            print("Time for batchVectorQuery:", end - start) 
         countDoc = 0
         start = timer()
  
@@ -167,12 +174,9 @@ def eval(testOn):
             if testOn:
                 print("Time for booleanQuery:" , end - start) 
             
-            start = timer()
-            listOfDocIDAndSimilarity = queryProcessor.vectorQuery(k) # data need to look like k=3 [[625,0.8737006126353902],[401,0.8697643788341478],[943,0.8424991316663082]]
+            listOfDocIDAndSimilarity = vectorResults[qid] # data need to look like k=3 [[625,0.8737006126353902],[401,0.8697643788341478],[943,0.8424991316663082]]
             #vectorQueryDict[qid] = dictOfDocIDAndSimilarity
-            end = timer()
             if testOn:
-                print("Time for vectorQuery:", end - start) 
                 print("booleanQuery:", docIDs)
 
             #For Boolean part
@@ -0,0 +1,223 @@
+'''
+cluster pruning
+
+about sqrt(N) documents are picked at random as leaders, every document follows its FOLLOWER_LEADERS
+nearest leaders, by the cosine of their tf-idf vectors (weight log10(1 + tf) * idf, like InvertedIndex.tf_idf).
+A vector query is compared to the leaders only, then only the followers of its nearest leaders are scored
+(see QueryProcessor.vectorQuery): much less documents than the postings, but some of the top k can be missed.
+
+the clusters are built offline and saved next to the index, documents indexed later are in no cluster
+until they are built again:
+    python cluster.py index_file query.text [k] --recall
+builds and saves the clusters, then prints the recall@k of the cluster queries against the exact vectorQuery.
+'''
+import math
+import os
+import sys
+import shutil
+import tempfile
+import numpy as np
+from timeit import default_timer as timer
+
+FOLLOWER_LEADERS = 2                 # leaders of every document
+QUERY_LEADERS    = 3                 # leaders of a query whose followers are scored, by default
+CLUSTER_SEED     = 0                 # the random leaders are the same every time the clusters are built
+CLUSTER_SUFFIX   = ".clusters.npz"   # the clusters of "index_file" are saved in "index_file.clusters.npz"
+
+
+##
+# @brief     The leaders of an index and their followers
+#
+# @bug       None documented yet
+#
+class ClusterIndex:
+    ##
+    #    @param         self
+    #    @return        None
+    #    @brief         The constructor, the clusters are empty until they are built or loaded
+    #    @exception     None documented yet
+    ##
+    def __init__(self):
+        self.__leaders   = np.zeros(0, dtype=np.int32) # sorted docIDs of the leaders
+        self.__offsets   = np.zeros(1, dtype=np.int64) # where the followers of each leader start
+        self.__followers = np.zeros(0, dtype=np.int32) # sorted docIDs of the followers of each leader, one leader after the other
+
+    ##
+    #   @brief         This method picks the leaders and assigns every document to its nearest leaders
+    #   @param         self
+    #   @param         index: InvertedIndex or DiskIndex
+    #   @param         nLeaders: None for sqrt of the number of documents
+    #   @param         followerLeaders: leaders of every document
+    #   @param         seed
+    #   @return        self
+    #   @exception     None
+    ##
+    def build(self, index, nLeaders=None, followerLeaders=FOLLOWER_LEADERS, seed=CLUSTER_SEED):
+        # the documents with at least one term, deleted documents have no length
+        docs     = np.flatnonzero(index.get_doc_lengths() > 0)
+        if nLeaders == None:
+            nLeaders = int(round(math.sqrt(len(docs))))
+        nLeaders = max(1, min(nLeaders, len(docs)))
+        followerLeaders = min(followerLeaders, nLeaders)
+        leaders  = np.sort(np.random.RandomState(seed).choice(docs, nLeaders, replace=False)) if len(docs) > 0 else docs
+        # dot products of the tf-idf vectors of every document and every leader, one term at a time
+        dots     = np.zeros((len(index.get_doc_lengths()), len(leaders)))
+        for term in index.get_terms():
+            docIDs, tfs = index.get_postings(term)
+            found    = np.searchsorted(docIDs, leaders)
+            hits     = np.flatnonzero(docIDs[np.minimum(found, len(docIDs) - 1)] == leaders) if len(docIDs) > 0 else found[:0]
+            if len(hits) == 0:
+                continue
+            weights  = np.log10(tfs + 1.0) * index.idf(term)
+            dots[np.ix_(docIDs, hits)] += np.outer(weights, weights[found[hits]])
+        norms    = index.get_doc_norms()
+        cosines  = dots[docs] / np.maximum(np.outer(norms[docs], norms[leaders]), 1e-12)
+        # the nearest leaders first, then the lowest docID
+        nearest  = np.argsort(-cosines, axis=1, kind="stable")[:, :followerLeaders]
+        pairs    = np.lexsort((np.repeat(docs, followerLeaders), nearest.ravel()))
+        self.__leaders   = leaders.astype(np.int32)
+        self.__followers = np.repeat(docs, followerLeaders)[pairs].astype(np.int32)
+        self.__offsets   = np.concatenate(([0], np.cumsum(np.bincount(nearest.ravel(), minlength=len(leaders))))).astype(np.int64)
+        return self
+
+    ##
+    #   @brief         This method returns the leaders
+    #   @param         self
+    #   @return        docIDs:np.ndarray sorted
+    #   @exception     None
+    ##
+    def get_leaders(self):
+        return self.__leaders
+
+    ##
+    #   @brief         This method returns the followers of some leaders
+    #   @param         self
+    #   @param         leaders: docIDs of leaders
+    #   @return        docIDs:np.ndarray sorted
+    #   @exception     KeyError if a docID is not a leader
+    ##
+    def get_followers(self, leaders):
+        found = np.searchsorted(self.__leaders, leaders)
+        if np.any(found >= len(self.__leaders)) or np.any(self.__leaders[np.minimum(found, len(self.__leaders) - 1)] != leaders):
+            raise KeyError("not a leader")
+        followers = [self.__followers[self.__offsets[i]:self.__offsets[i + 1]] for i in np.asarray(found).tolist()]
+        return np.unique(np.concatenate([np.zeros(0, dtype=np.int32)] + followers))
+
+    def __len__(self):
+        return len(self.__leaders)
+
+    ##
+    #   @brief         This method saves the clusters
+    #   @param         self
+    #   @param         fileName: ending with .npz
+    #   @return        None
+    #   @exception     IOError
+    ##
+    def save(self, fileName):
+        np.savez(fileName, leaders=self.__leaders, offsets=self.__offsets, followers=self.__followers)
+
+    ##
+    #   @brief         This method loads saved clusters
+    #   @param         self
+    #   @param         fileName
+    #   @return        self
+    #   @exception     IOError
+    ##
+    def load(self, fileName):
+        with np.load(fileName) as data:
+            self.__leaders   = data["leaders"]
+            self.__offsets   = data["offsets"]
+            self.__followers = data["followers"]
+        return self
+
+
+##
+#   @brief         This method loads the clusters saved next to an index
+#   @param         indexFile
+#   @return        clusters:ClusterIndex, None if they were not built
+#   @exception     None
+##
+def loadClusters(indexFile):
+    if not os.path.exists(indexFile + CLUSTER_SUFFIX):
+        return None
+    return ClusterIndex().load(indexFile + CLUSTER_SUFFIX)
+
+##
+#   @brief         This method returns the fraction of the exact top k found by an approximate query
+#   @param         exact: list[(docID, score)]
+#   @param         approximate: list[(docID, score)]
+#   @return        recall:float
+#   @exception     None
+##
+def recallAtK(exact, approximate):
+    exact = set(docID for docID, score in exact)
+    if len(exact) == 0:
+        return 1.0
+    return len(exact & set(docID for docID, score in approximate)) / float(len(exact))
+
+
+##
+#   @brief         This method builds and saves the clusters of an index, and reports the recall@k
+#                  of the cluster queries against the exact vectorQuery for several numbers of query leaders
+#   @return        None
+#   @exception     None
+##
+def main():
+    from query import QueryProcessor
+    from cranqry import loadCranQry
+    args      = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    indexFile = args[0]
+    queries   = loadCranQry(args[1])
+    k         = int(args[2]) if len(args) > 2 else 10
+    processor = QueryProcessor("", indexFile, None)
+    start     = timer()
+    processor.clusters = ClusterIndex().build(processor.index)
+    processor.clusters.save(indexFile + CLUSTER_SUFFIX)
+    print("leaders:", len(processor.clusters), "time:", timer() - start)
+    for leaders in [None, 1, 2, QUERY_LEADERS, 5, 10]:
+        recalls = []
+        start   = timer()
+        for qid, query in sorted(queries.items()):
+            processor.loadQuery(query.text)
+            recalls.append(processor.vectorQuery(k, clusters=leaders))
+        end     = timer()
+        if leaders == None:
+            exact = recalls
+            print("exact time:", end - start)
+            continue
+        recall  = sum(recallAtK(e, a) for e, a in zip(exact, recalls)) / len(exact)
+        print("query leaders:", leaders, "recall@" + str(k) + ":", round(recall, 4), "time:", end - start)
+
+
+##
+#   @brief     This method Is used for testing this Python script
+#
+#   @return        None
+#   @exception     None
+##
+def test():
+    ''' test your code thoroughly. put the testing cases here'''
+    from diskindex import loadIndex
+    index    = loadIndex("./Data/tempFile")
+    clusters = ClusterIndex().build(index)
+    docs     = np.flatnonzero(index.get_doc_lengths() > 0)
+    leaders  = clusters.get_leaders()
+    assert len(clusters) == round(math.sqrt(len(docs))) and np.isin(leaders, docs).all(), "Wrong leaders"
+    followers = clusters.get_followers(leaders)
+    assert followers.tolist() == docs.tolist(), "A document follows no leader"
+    assert all(leader in clusters.get_followers([leader]) for leader in leaders.tolist()), "A leader does not follow itself"
+    assert sum(len(clusters.get_followers([leader])) for leader in leaders.tolist()) == FOLLOWER_LEADERS * len(docs), "Wrong followers"
+    testDir  = tempfile.mkdtemp(prefix="cluster")
+    clusters.save(os.path.join(testDir, "TestClusters.npz"))
+    loaded = ClusterIndex().load(os.path.join(testDir, "TestClusters.npz"))
+    shutil.rmtree(testDir)
+    assert loaded.get_leaders().tolist() == leaders.tolist() and loaded.get_followers(leaders[:2]).tolist() == clusters.get_followers(leaders[:2]).tolist(), "Error in loading clusters"
+    assert recallAtK([("1", .5), ("2", .4)], [("2", .4), ("3", .3)]) == 0.5 and recallAtK([], []) == 1.0, "Wrong recall"
+    print("test Passed")
+
+#python cluster.py Data/tempFile CranfieldDataset/query.text 10 --recall
+if __name__ == '__main__':
+    if "--recall" in sys.argv:
+        main()
+    else:
+        test()
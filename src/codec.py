@@ -0,0 +1,238 @@
+'''
+compression of the postings
+
+docIDs and positions are sorted, so they are stored as gaps (the difference with the previous value)
+which are small numbers, and the gaps are written with the variable-byte code:
+7 bits per byte, the high bit marks the last byte of a number.
+Most gaps fit in one byte instead of the 4 bytes of an int32.
+
+Encoding and decoding are vectorized with numpy, there is no Python loop over the values.
+
+The docIDs of a posting list are encoded in blocks of BLOCK_SIZE postings (see encodePostingBlocks),
+with the last docID of every block kept uncompressed, so a reader can skip whole blocks
+and only decode the blocks it needs.
+Sorted docID lists are intersected by searching the values of the shorter list in the longer one
+(see intersectSorted), so the cost depends on the shorter list.
+'''
+import numpy as np
+
+BLOCK_SIZE = 128 # postings per compressed block
+MAX_BYTES  = 5   # bytes needed for a 32 bit number
+
+
+##
+#   @brief         This method encodes non negative integers with the variable-byte code
+#   @param         values: array of int
+#   @return        bytes
+#   @exception     None
+##
+def vbyteEncode(values):
+    values = np.asarray(values, dtype=np.uint64)
+    if len(values) == 0:
+        return b""
+    nbytes = np.ones(len(values), dtype=np.int64)
+    for k in range(1, MAX_BYTES):
+        nbytes += values >= (1 << (7 * k))
+    ends   = np.cumsum(nbytes)
+    starts = ends - nbytes
+    out    = np.zeros(int(ends[-1]), dtype=np.uint8)
+    for k in range(MAX_BYTES):
+        mask = nbytes > k
+        out[starts[mask] + k] = (values[mask] >> np.uint64(7 * k)) & np.uint64(0x7F)
+    out[ends - 1] |= 0x80 # the high bit marks the last byte of a number
+    return out.tobytes()
+
+##
+#   @brief         This method decodes a buffer of variable-byte encoded integers
+#   @param         buf: bytes, memoryview or np.ndarray(uint8) holding whole encoded numbers
+#   @return        values: np.ndarray(int64)
+#   @exception     None
+##
+def vbyteDecode(buf):
+    data = np.frombuffer(buf, dtype=np.uint8)
+    if len(data) == 0:
+        return np.zeros(0, dtype=np.int64)
+    ends    = np.flatnonzero(data & 0x80)
+    starts  = np.empty(len(ends), dtype=np.int64)
+    starts[0]  = 0
+    starts[1:] = ends[:-1] + 1
+    lengths = ends - starts + 1
+    values  = np.zeros(len(ends), dtype=np.int64)
+    for k in range(MAX_BYTES):
+        mask = lengths > k
+        if not mask.any():
+            break
+        values[mask] |= (data[starts[mask] + k] & 0x7F).astype(np.int64) << (7 * k)
+    return values
+
+##
+#   @brief         This method turns sorted values into gaps, the first value is kept relative to base
+#   @param         values: sorted array of int
+#   @param         base: int
+#   @return        gaps: np.ndarray(int64)
+#   @exception     None
+##
+def deltaEncode(values, base=0):
+    values = np.asarray(values, dtype=np.int64)
+    return np.diff(values, prepend=base)
+
+##
+#   @brief         This method turns gaps back into the sorted values
+#   @param         gaps: array of int
+#   @param         base: int
+#   @return        values: np.ndarray(int64)
+#   @exception     None
+##
+def deltaDecode(gaps, base=0):
+    return np.cumsum(gaps) + base
+
+##
+#   @brief         This method encodes groups of sorted values, the gaps restart at every group.
+#                  Used for the positions of each posting and for the docIDs of each term
+#   @param         values: array of int, grouped, sorted inside each group
+#   @param         offsets: array of int, group i is values[offsets[i]:offsets[i+1]]
+#   @return        bytes
+#   @exception     ValueError if the values of a group are not sorted
+##
+def encodeGroups(values, offsets):
+    values = np.asarray(values, dtype=np.int64)
+    gaps   = np.diff(values, prepend=0)
+    starts = np.asarray(offsets[:-1], dtype=np.int64)
+    starts = starts[starts < len(values)]
+    gaps[starts] = values[starts]
+    if (gaps < 0).any():
+        raise ValueError("the values of a group must be sorted")
+    return vbyteEncode(gaps)
+
+##
+#   @brief         This method decodes the groups written by encodeGroups
+#   @param         buf
+#   @param         offsets: array of int, group i is values[offsets[i]:offsets[i+1]]
+#   @return        values: np.ndarray(int64)
+#   @exception     None
+##
+def decodeGroups(buf, offsets):
+    offsets = np.asarray(offsets, dtype=np.int64)
+    sums    = np.cumsum(vbyteDecode(buf))
+    if len(sums) == 0:
+        return sums
+    # remove what the previous groups added to the running sum
+    starts  = offsets[1:-1]
+    before  = np.zeros(len(offsets) - 1, dtype=np.int64)
+    before[1:] = np.where(starts > 0, sums[starts - 1], 0)
+    return sums - np.repeat(before, np.diff(offsets))
+
+##
+#   @brief         This method encodes the docIDs and term frequencies of a posting list in blocks of BLOCK_SIZE postings.
+#                  Each block holds the docID gaps (relative to the last docID of the previous block) and the tfs.
+#   @param         docIDs: sorted array of int
+#   @param         tfs: array of int
+#   @return        (blockMax: np.ndarray(int32) last docID of each block,
+#                   blockEnds: np.ndarray(uint32) end of each block in the data,
+#                   data: bytes)
+#   @exception     None
+##
+def encodePostingBlocks(docIDs, tfs):
+    docIDs    = np.asarray(docIDs, dtype=np.int64)
+    tfs       = np.asarray(tfs, dtype=np.int64)
+    nBlocks   = (len(docIDs) + BLOCK_SIZE - 1) // BLOCK_SIZE
+    blockMax  = np.zeros(nBlocks, dtype=np.int32)
+    blockEnds = np.zeros(nBlocks, dtype=np.uint32)
+    data      = []
+    size      = 0
+    base      = 0
+    for b in range(nBlocks):
+        block = slice(b * BLOCK_SIZE, (b + 1) * BLOCK_SIZE)
+        encoded = vbyteEncode(np.concatenate((deltaEncode(docIDs[block], base), tfs[block])))
+        data.append(encoded)
+        size += len(encoded)
+        base  = docIDs[block][-1]
+        blockMax[b]  = base
+        blockEnds[b] = size
+    return blockMax, blockEnds, b"".join(data)
+
+##
+#   @brief         This method decodes one block written by encodePostingBlocks
+#   @param         buf: the bytes of the block
+#   @param         base: last docID of the previous block, 0 for the first block
+#   @return        (docIDs, tfs): np.ndarray(int64)
+#   @exception     None
+##
+def decodePostingBlock(buf, base):
+    values = vbyteDecode(buf)
+    n      = len(values) // 2
+    return deltaDecode(values[:n], base), values[n:]
+
+##
+#   @brief         This method decodes all blocks written by encodePostingBlocks at once
+#   @param         buf: the bytes of all blocks
+#   @param         df: number of postings
+#   @return        (docIDs, tfs): np.ndarray(int64)
+#   @exception     None
+##
+def decodePostingBlocks(buf, df):
+    values  = vbyteDecode(buf)
+    index   = np.arange(2 * df)
+    # each block holds its n docID gaps followed by its n tfs, only the last block has less than BLOCK_SIZE postings
+    inBlock = index % (2 * BLOCK_SIZE)
+    size    = np.minimum(BLOCK_SIZE, df - (index // (2 * BLOCK_SIZE)) * BLOCK_SIZE)
+    isGap   = inBlock < size
+    # the first gap of a block is relative to the last docID of the previous block, so the gaps simply add up
+    return np.cumsum(values[isGap]), values[~isGap]
+
+##
+#   @brief         This method intersects two sorted arrays of unique values.
+#                  Every value of the shorter array is looked up in the longer one with a binary search,
+#                  so the cost is len(short) * log(len(long)) instead of len(short) + len(long)
+#   @param         a: sorted array of int
+#   @param         b: sorted array of int
+#   @return        values in both arrays: np.ndarray, sorted
+#   @exception     None
+##
+def intersectSorted(a, b):
+    a = np.asarray(a)
+    b = np.asarray(b)
+    if len(a) > len(b):
+        a, b = b, a
+    if len(a) == 0:
+        return a
+    found = np.searchsorted(b, a)
+    found[found == len(b)] = len(b) - 1
+    return a[b[found] == a]
+
+
+##
+#   @brief     This method Is used for testing this Python script
+#
+#   @return        None
+#   @exception     None
+##
+def test():
+    ''' test your code thoroughly. put the testing cases here'''
+    values = np.array([0, 1, 127, 128, 300, 16383, 16384, 2 ** 21, 2 ** 31 - 1], dtype=np.int64)
+    assert vbyteDecode(vbyteEncode(values)).tolist() == values.tolist(), "Error in variable-byte code"
+    assert len(vbyteEncode([5, 127])) == 2 and len(vbyteEncode([128])) == 2, "Wrong variable-byte length"
+
+    docIDs = np.array([3, 7, 8, 200, 1000], dtype=np.int64)
+    assert deltaDecode(deltaEncode(docIDs)).tolist() == docIDs.tolist(), "Error in gaps"
+
+    positions = [4, 9, 30, 2, 5, 7]
+    offsets   = [0, 3, 4, 6]
+    assert decodeGroups(encodeGroups(positions, offsets), offsets).tolist() == positions, "Error in groups"
+    assert decodeGroups(encodeGroups([5, 6, 1], [0, 0, 2, 2, 3]), [0, 0, 2, 2, 3]).tolist() == [5, 6, 1], "Error in empty groups"
+
+    docIDs = np.arange(1, 1000, 3)
+    tfs    = (docIDs % 5) + 1
+    blockMax, blockEnds, data = encodePostingBlocks(docIDs, tfs)
+    assert len(blockMax) == 3 and blockMax[-1] == docIDs[-1], "Wrong blocks"
+    decoded, decodedTfs = decodePostingBlock(data[blockEnds[0]:blockEnds[1]], blockMax[0])
+    assert decoded.tolist() == docIDs[BLOCK_SIZE:2 * BLOCK_SIZE].tolist() and decodedTfs.tolist() == tfs[BLOCK_SIZE:2 * BLOCK_SIZE].tolist(), "Error in blocks"
+    decoded, decodedTfs = decodePostingBlocks(data, len(docIDs))
+    assert decoded.tolist() == docIDs.tolist() and decodedTfs.tolist() == tfs.tolist(), "Error in decoding all blocks"
+
+    assert intersectSorted([4, 10, 1000], docIDs).tolist() == [4, 10] and intersectSorted(docIDs, [2, 3, 997]).tolist() == [997], "Error in intersection"
+    assert intersectSorted([], docIDs).tolist() == [] and intersectSorted([5], [1, 2]).tolist() == [], "Error in intersection"
+    print("test Passed")
+
+if __name__ == '__main__':
+    test()
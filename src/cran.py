@@ -2,48 +2,97 @@
 
 processing the special format used by the Cranfield Dataset
 
-
+the file is memory-mapped and parsed lazily: iterating over a CranFile (or iterCranFile)
+yields one Document at a time, so indexing can start before the whole file is parsed
+and only one document is in memory at a time
 
 '''
 from doc import Document
+import mmap
+
+
+##
+#   @brief         This method returns the lines of a file one at a time, reading them from a memory map
+#   @param         filename
+#   @return        generator of lines: str
+#   @exception     None
+## 
+def mmapLines(filename):
+    with open(filename, 'rb') as f:
+        if f.seek(0, 2) == 0: # an empty file can not be mapped
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for line in iter(mm.readline, b''):
+                yield line.decode('utf-8')
+
+
+##
+#   @brief         This method parses the documents of a Cranfield file lazily
+#   @param         filename
+#   @return        generator of Document
+#   @exception     None
+## 
+def iterCranFile(filename):
+    docid = ''
+    title = ''
+    author = ''
+    buf = []
+
+    for line in mmapLines(filename):
+        if '.I' in line:
+            if docid != '':
+                yield Document(docid, title, author, ''.join(buf))
+            # start a new document
+            docid = line.strip().split()[1]
+            buf = []
+        elif '.T' in line:
+            None
+        elif '.A' in line:
+            title = ''.join(buf) # got title
+            buf = []
+        elif '.B' in line:
+            author = ''.join(buf) # got author
+            buf = []
+        elif '.W' in line:
+            buf = [] # skip affiliation
+        else:
+            buf.append(line)
+    if docid != '':
+        yield Document(docid, title, author, ''.join(buf)) # the last one
 
 
 class CranFile:
     def __init__(self, filename):
-        self.docs = []
-
-        cf = open(filename)
-        docid = ''
-        title = ''
-        author = ''
-        body = ''
-
-        for line in cf:
-            if '.I' in line:
-                if docid != '':
-                    body = buf
-                    self.docs.append(Document(docid, title, author, body))
-                # start a new document
-                docid = line.strip().split()[1]
-                buf = ''
-            elif '.T' in line:
-                None
-            elif '.A' in line:
-                title = buf # got title
-                buf = ''
-            elif '.B' in line:
-                author = buf # got author
-                buf = ''
-            elif '.W' in line:
-                buf = '' # skip affiliation
-            else:
-                buf += line
-        self.docs.append(Document(docid, title, author, buf)) # the last one
+        self.filename = filename
+        self.__docs = None
+
+    ##
+    #   @brief         This method streams the documents, they are not kept in memory
+    #   @param         self
+    #   @return        generator of Document
+    #   @exception     None
+    ## 
+    def __iter__(self):
+        if self.__docs != None:
+            return iter(self.__docs)
+        return iterCranFile(self.filename)
+
+    ##
+    #   @brief         The list of all documents, it is only parsed the first time it is used
+    #   @param         self
+    #   @return        docs: list[Document]
+    #   @exception     None
+    ## 
+    @property
+    def docs(self):
+        if self.__docs == None:
+            self.__docs = list(iterCranFile(self.filename))
+        return self.__docs
 
 if __name__ == '__main__':
     ''' testing '''
 
     cf = CranFile ('cran.all')
-    for doc in cf.docs:
+    for doc in cf:
         print(doc.docID, doc.title, doc.body)
     print( len(cf.docs))
@@ -2,6 +2,7 @@
 '''
   handling the specific input format of the query.text for the Cranfield data
 '''
+from cran import mmapLines
 
 
 class CranQry:
@@ -9,23 +10,33 @@ class CranQry:
         self.qid = qid
         self.text = text
 
-def loadCranQry(qfile):
-    queries = {}
-    f = open(qfile)
-    text = ''
+##
+#   @brief         This method parses the queries of a query file lazily, for large query logs
+#   @param         qfile
+#   @return        generator of CranQry
+#   @exception     None
+## 
+def iterCranQry(qfile):
+    text = []
     qid = ''
-    for line in f:
+    for line in mmapLines(qfile):
         if '.I' in line:
             if qid !='':
-                queries[qid] = CranQry(qid, text)
+                yield CranQry(qid, ''.join(text))
                 #print 'qid:', qid, text
             qid = line.strip().split()[1]
-            text = ''
+            text = []
         elif '.W' in line:
             None
         else:
-            text += line
-    queries[qid] = CranQry(qid, text)
+            text.append(line)
+    if qid != '':
+        yield CranQry(qid, ''.join(text))
+
+def loadCranQry(qfile):
+    queries = {}
+    for qry in iterCranQry(qfile):
+        queries[qry.qid] = qry
     return queries
 
 def test():
@@ -0,0 +1,744 @@
+'''
+binary on-disk format of the inverted index
+
+the index is saved in two files:
+    index_file            header, sorted front-coded term lexicon (see lexicon.py) and the document bitmaps
+    index_file.postings   the postings of every term, one term after the other
+
+the postings are compressed (docID gaps and tfs in blocks of codec.BLOCK_SIZE postings,
+position gaps, all with the variable-byte code, see codec.py).
+
+both files are memory-mapped by DiskIndex: opening an index only reads the header,
+terms are found with a binary search in the lexicon, and only the postings of the
+terms a query uses are decoded. So, unlike unpickling the whole InvertedIndex,
+the cost of opening an index does not depend on its size.
+
+usage:
+    python diskindex.py index_file binary_index_file
+
+    converts a saved (pickled) index to the binary format
+'''
+"""Internal libraries"""
+from index import InvertedIndex, IndexItem, DocBitmap, IndexStats, FieldExtents, splitField, expandWildcard, idfValue, championList
+from lexicon import Lexicon
+from wildcard import PermutermIndex
+from codec import encodePostingBlocks, decodePostingBlock, decodePostingBlocks, encodeGroups, decodeGroups, intersectSorted, BLOCK_SIZE
+
+"""Outside libraries"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import mmap
+import struct
+import uuid
+import numpy as np
+from array import array
+
+MAGIC   = b"SSEBIN03" # first bytes of a binary index file
+ALIGN   = 8           # sections start on a multiple of 8 bytes so they can be read as arrays in place
+
+
+##
+#   @brief         This method checks if a file is an index saved in the binary format
+#   @param         fileName
+#   @return        boolean
+#   @exception     None
+##
+def isBinaryIndex(fileName):
+    with open(fileName, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+##
+#   @brief         This method loads an index in any of the saved formats:
+#                  a DiskIndex for the binary format, an InvertedIndex for a json export (".json" or ".json.gz"),
+#                  otherwise the pickled InvertedIndex (with its segments)
+#   @param         fileName
+#   @return        DiskIndex or InvertedIndex
+#   @exception     None
+##
+def loadIndex(fileName):
+    if fileName.endswith(".json") or fileName.endswith(".json.gz"):
+        return InvertedIndex().load(fileName)
+    if isBinaryIndex(fileName):
+        return DiskIndex(fileName)
+    return InvertedIndex().loadData(fileName)
+
+##
+#   @brief         This method saves an InvertedIndex in the binary format
+#   @param         invertedIndex
+#   @param         fileName
+#   @return        None
+#   @exception     None
+##
+def writeBinaryIndex(invertedIndex, fileName):
+    writer = BinaryIndexWriter(fileName, invertedIndex.get_docs(), invertedIndex.get_deleted(), invertedIndex.get_extents(),
+                               invertedIndex.get_version())
+    for term, item in invertedIndex.sort_terms().items():
+        writer.add(term, item)
+    writer.close()
+
+
+##
+# @brief     This class writes an index in the binary format, one term at a time in term order.
+#            The postings are written to disk as they are added, only the lexicon and the docIDs and tfs
+#            of the postings (without the positions) are kept in memory,
+#            so the output of a SPIMI merge can be written without building the InvertedIndex.
+#            The postings of a term are stored one after the other:
+#                blockMax    int32 last docID of each block of BLOCK_SIZE postings
+#                blockEnds   uint32 end of each block in the block data
+#                blocks      docID gaps and tfs of each block (see codec.encodePostingBlocks)
+#                positions   position gaps of all postings (see codec.encodeGroups)
+#            so the docIDs can be read without the positions, and a block can be decoded on its own.
+#            The idf of the terms, their champion lists and the lengths and norms of the documents (see IndexStats)
+#            are computed while the terms are added and saved in the lexicon file,
+#            with the terms of every document (see docTermArrays) so a deleted document only changes its terms.
+#
+# @bug       None documented yet
+#
+class BinaryIndexWriter:
+    ##
+    #    @param         self
+    #    @param         fileName
+    #    @param         docs:DocBitmap     the indexed documents
+    #    @param         deleted:DocBitmap  the deleted documents
+    #    @param         extents:FieldExtents  the field extents of the documents
+    #    @param         version:str  the version of the index (see InvertedIndex.get_version), a new one by default
+    #    @return        None
+    #    @brief         The constructor.
+    #    @exception     None documented yet
+    ##
+    def __init__(self, fileName, docs, deleted, extents, version=None):
+        self.fileName         = fileName
+        self.__docs           = docs
+        self.__deleted        = deleted
+        self.__extents        = extents
+        self.__version        = version if version != None else "%s:0" % uuid.uuid4().hex
+        self.__stats          = IndexStats(len(docs) - len(deleted))
+        self.__postings       = open(fileName + ".postings", "wb")
+        self.__terms          = []              # the terms, in order
+        self.__df             = array('i')      # document frequency of each term
+        self.__postingOffsets = array('Q', [0]) # where the postings of each term start in the postings file
+        self.__termDocs       = []              # (docIDs, tfs) of the live postings of each term, for the terms of the documents
+
+    ##
+    #   @brief         This method writes the postings of the next term
+    #   @param         self
+    #   @param         term
+    #   @param         item:IndexItem
+    #   @return        None
+    #   @exception     ValueError if the terms are not added in sorted order
+    ##
+    def add(self, term, item):
+        if len(self.__terms) > 0 and term.encode("utf-8") <= self.__terms[-1].encode("utf-8"):
+            raise ValueError("terms must be added in sorted order: " + term)
+        docIDs, offsets, positions = item.get_arrays()
+        blockMax, blockEnds, blocks = encodePostingBlocks(docIDs, np.diff(offsets))
+        positions = encodeGroups(positions, offsets)
+        for data in (blockMax.tobytes(), blockEnds.tobytes(), blocks, positions):
+            self.__postings.write(data)
+        # the deleted documents are still in the postings (the df), not in the statistics
+        liveDocIDs, liveTfs = docIDs, np.diff(offsets)
+        if len(self.__deleted) > 0:
+            live = ~self.__deleted.contains_array(docIDs)
+            liveDocIDs, liveTfs = liveDocIDs[live], liveTfs[live]
+        self.__stats.add(term, liveDocIDs, liveTfs)
+        self.__termDocs.append((liveDocIDs, liveTfs))
+        self.__terms.append(term)
+        self.__df.append(len(docIDs))
+        self.__postingOffsets.append(self.__postingOffsets[-1] + 8 * len(blockMax) + len(blocks) + len(positions))
+
+    ##
+    #   @brief         This method writes the lexicon file and closes the index
+    #   @param         self
+    #   @return        None
+    #   @exception     None
+    ##
+    def close(self):
+        self.__postings.close()
+        idfs = self.__stats.get_idfs()
+        # the champion lists of all the terms one after the other, empty for the terms without one
+        champions = [self.__stats.get_champions(term) for term in self.__terms]
+        champions = [np.zeros(0, dtype=np.int32) if docIDs is None else docIDs for docIDs in champions]
+        championOffsets = np.concatenate(([0], np.cumsum([len(docIDs) for docIDs in champions]))).astype(np.uint64)
+        docTermOffsets, docTerms, docTermFreqs = docTermArrays(self.__termDocs, len(self.__stats.get_doc_lengths()))
+        sections = [
+            ("lexicon",        Lexicon(self.__terms).to_bytes()),
+            ("permuterm",      PermutermIndex(self.__terms).to_bytes()),
+            ("df",             np.array(self.__df, dtype=np.int32).tobytes()),
+            ("postingOffsets", np.array(self.__postingOffsets, dtype=np.uint64).tobytes()),
+            ("docs",           self.__docs.to_bytes()),
+            ("deleted",        self.__deleted.to_bytes()),
+            ("idf",            np.array([idfs[term] for term in self.__terms], dtype=np.float64).tobytes()),
+            ("docLengths",     self.__stats.get_doc_lengths().tobytes()),
+            ("docNorms",       self.__stats.get_doc_norms().tobytes()),
+            ("championOffsets", championOffsets.tobytes()),
+            ("championDocs",   np.concatenate([np.zeros(0, dtype=np.int32)] + champions).tobytes()),
+            ("docTermOffsets", docTermOffsets.tobytes()),
+            ("docTerms",       docTerms.tobytes()),
+            ("docTermFreqs",   docTermFreqs.tobytes()),
+            ("extents",        self.__extents.to_bytes()),
+        ]
+        writeSections(self.fileName, {"nDocs": len(self.__docs), "nTerms": len(self.__terms), 
+                                      "nLengths": len(self.__stats.get_doc_lengths()), "version": self.__version}, sections)
+
+
+##
+#   @brief         This method turns the postings of the terms into the terms of the documents:
+#                  the term numbers of document d are terms[offsets[d]:offsets[d + 1]], in term order,
+#                  with their tfs in freqs
+#   @param         termDocs: list[(docIDs, tfs)] the postings of the term number i are termDocs[i]
+#   @param         size: largest docID + 1
+#   @return        (offsets:np.ndarray(uint64), terms:np.ndarray(int32), freqs:np.ndarray(int32))
+#   @exception     None
+##
+def docTermArrays(termDocs, size):
+    docIDs = np.concatenate([np.zeros(0, dtype=np.int32)] + [docIDs for docIDs, tfs in termDocs]).astype(np.int64)
+    tfs    = np.concatenate([np.zeros(0, dtype=np.int32)] + [tfs for docIDs, tfs in termDocs]).astype(np.int32)
+    terms  = np.repeat(np.arange(len(termDocs), dtype=np.int32), [len(docIDs) for docIDs, tfs in termDocs])
+    # a stable sort keeps the terms of a document in term order
+    order  = np.argsort(docIDs, kind="stable")
+    counts = np.bincount(docIDs, minlength=size)[:size]
+    return np.concatenate(([0], np.cumsum(counts))).astype(np.uint64), terms[order], tfs[order]
+
+##
+#   @brief         This method writes a file made of a json header and binary sections.
+#                  The header holds the offset and length of each section, the sections are aligned on 8 bytes
+#   @param         fileName
+#   @param         header:dict
+#   @param         sections:list[(name, bytes)]
+#   @return        None
+#   @exception     None
+##
+def writeSections(fileName, header, sections):
+    header = dict(header)
+    header["sections"] = {}
+    # the header size depends on the section offsets, so the offsets are relative to the end of the header
+    offset = 0
+    for name, data in sections:
+        header["sections"][name] = [offset, len(data)]
+        offset += len(data) + (-len(data)) % ALIGN
+    encoded = json.dumps(header).encode("utf-8")
+    encoded += b" " * ((-(len(MAGIC) + 4 + len(encoded))) % ALIGN)
+    with open(fileName, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(encoded)))
+        f.write(encoded)
+        for name, data in sections:
+            f.write(data)
+            f.write(b"\0" * ((-len(data)) % ALIGN))
+
+##
+#   @brief         This method reads the header written by writeSections from a memory map
+#   @param         mm:mmap
+#   @return        (header:dict, start of the sections:int)
+#   @exception     ValueError if the file is not a binary index
+##
+def readHeader(mm):
+    if mm[:len(MAGIC)] != MAGIC:
+        raise ValueError("not a binary index file")
+    headerLength = struct.unpack("<I", mm[len(MAGIC):len(MAGIC) + 4])[0]
+    start        = len(MAGIC) + 4
+    return json.loads(mm[start:start + headerLength].decode("utf-8")), start + headerLength
+
+
+##
+# @brief     A read only index opened from the binary format (see BinaryIndexWriter).
+#            It has the same query methods as the InvertedIndex: find, get_postings, idf,
+#            get_total_number_Doc, get_terms and "term in index".
+#            Documents can be deleted, the tombstones are only kept in memory.
+#            The saved idf, document lengths and norms are used until a document is deleted,
+#            then the df, champion lists and lengths are updated for the terms of the deleted document only
+#            (the saved docTerms sections), the idf follows from the df.
+#            The norms depend on every idf, they are computed again from the docTerms sections when they are used.
+#
+# @bug       None documented yet
+#
+class DiskIndex:
+    ##
+    #    @param         self
+    #    @param         fileName
+    #    @return        None
+    #    @brief         The constructor, it maps the two files and reads the header
+    #    @exception     ValueError if the file is not a binary index
+    ##
+    def __init__(self, fileName):
+        self.fileName       = fileName
+        self.__files        = [open(fileName, "rb"), open(fileName + ".postings", "rb")]
+        self.__lex          = mmap.mmap(self.__files[0].fileno(), 0, access=mmap.ACCESS_READ)
+        self.__postings     = None
+        if self.__files[1].seek(0, 2) > 0: # an empty file can not be mapped
+            self.__postings = mmap.mmap(self.__files[1].fileno(), 0, access=mmap.ACCESS_READ)
+        header, start       = readHeader(self.__lex)
+        self.__nDocs        = header["nDocs"]
+        # id of the index and number of changes, the deletes since it was opened are added (see get_version)
+        version             = header.get("version", "%s:0" % uuid.uuid4().hex).rsplit(":", 1)
+        self.__version      = [version[0], int(version[1])]
+        nTerms              = header["nTerms"]
+        sections            = header["sections"]
+        self.__df             = self.__section(start, sections["df"], np.int32, nTerms)
+        self.__postingOffsets = self.__section(start, sections["postingOffsets"], np.uint64, nTerms + 1)
+        # the front-coded lexicon is read in place from the memory map
+        section               = sections["lexicon"]
+        self.__lexicon        = Lexicon().from_bytes(memoryview(self.__lex)[start + section[0]:start + section[0] + section[1]])
+        section               = sections["permuterm"]
+        self.__permuterm      = PermutermIndex().from_bytes(memoryview(self.__lex)[start + section[0]:start + section[0] + section[1]])
+        self.__docs           = DocBitmap()
+        self.__docs.from_bytes(self.__bytes(start, sections["docs"]))
+        self.__deleted        = DocBitmap()
+        self.__deleted.from_bytes(self.__bytes(start, sections["deleted"]))
+        self.__idf            = self.__section(start, sections["idf"], np.float64, nTerms)
+        self.__docLengths     = self.__section(start, sections["docLengths"], np.int32, header["nLengths"])
+        self.__docNorms       = self.__section(start, sections["docNorms"], np.float64, header["nLengths"])
+        self.__championOffsets = self.__championDocs = None # written before the champion lists, computed when used
+        if "championOffsets" in sections:
+            self.__championOffsets = self.__section(start, sections["championOffsets"], np.uint64, nTerms + 1)
+            self.__championDocs    = self.__section(start, sections["championDocs"], np.int32, int(self.__championOffsets[-1]))
+        self.__docTermOffsets = self.__docTerms = self.__docTermFreqs = None # written before the terms of the documents
+        if "docTermOffsets" in sections:
+            self.__docTermOffsets = self.__section(start, sections["docTermOffsets"], np.uint64, header["nLengths"] + 1)
+            self.__docTerms       = self.__section(start, sections["docTerms"], np.int32, int(self.__docTermOffsets[-1]))
+            self.__docTermFreqs   = self.__section(start, sections["docTermFreqs"], np.int32, int(self.__docTermOffsets[-1]))
+        # the statistics changed by the deletes, the saved ones are used until a document is deleted
+        self.__liveDf         = None # number of live documents of every term
+        self.__lengths        = None # number of tokens of every docID
+        self.__squares        = None # sum of the squared weights of every docID, None when out of date
+        self.__champions      = {}   # term number: its champion list, None for the whole posting list
+        self.__extents        = FieldExtents()
+        self.__extents.from_bytes(self.__bytes(start, sections["extents"]))
+
+    ##
+    #   @brief         This method reads a section of the lexicon file as an array, without copying it
+    #   @param         self
+    #   @param         start
+    #   @param         section:[offset, length]
+    #   @param         dtype
+    #   @param         count
+    #   @return        np.ndarray
+    #   @exception     None
+    ##
+    def __section(self, start, section, dtype, count):
+        return np.frombuffer(self.__lex, dtype=dtype, count=count, offset=start + section[0])
+
+    def __bytes(self, start, section):
+        return self.__lex[start + section[0]:start + section[0] + section[1]]
+
+    ##
+    #   @brief         This method closes the memory maps
+    #   @param         self
+    #   @return        None
+    #   @exception     None
+    ##
+    def close(self):
+        self.__df = self.__postingOffsets = self.__lexicon = self.__permuterm = None
+        self.__idf = self.__docLengths = self.__docNorms = None
+        self.__championOffsets = self.__championDocs = None
+        self.__docTermOffsets = self.__docTerms = self.__docTermFreqs = None
+        self.__lex.close()
+        if self.__postings != None:
+            self.__postings.close()
+        for f in self.__files:
+            f.close()
+
+    ##
+    #   @brief         This method decodes the docIDs and tfs of the term number i, the positions are not read
+    #   @param         self
+    #   @param         i
+    #   @return        (docIDs, tfs, where the positions start in the postings file)
+    #   @exception     None
+    ##
+    def __decode_docs(self, i):
+        df        = int(self.__df[i])
+        start     = int(self.__postingOffsets[i])
+        nBlocks   = (df + BLOCK_SIZE - 1) // BLOCK_SIZE
+        if nBlocks == 0:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32), start
+        blockEnds = np.frombuffer(self.__postings, dtype=np.uint32, count=nBlocks, offset=start + 4 * nBlocks)
+        start    += 8 * nBlocks
+        end       = start + int(blockEnds[-1])
+        docIDs, tfs = decodePostingBlocks(self.__postings[start:end], df)
+        return docIDs.astype(np.int32), tfs.astype(np.int32), end
+
+    ##
+    #   @brief         This method decodes the docIDs of the term number i that can be one of a list of docIDs.
+    #                  The last docID of every block is a skip pointer: only the blocks whose docID range
+    #                  holds one of the docIDs are decoded
+    #   @param         self
+    #   @param         i
+    #   @param         docIDs: sorted np.ndarray
+    #   @return        docIDs of the decoded blocks: np.ndarray(int32)
+    #   @exception     None
+    ##
+    def __decode_blocks(self, i, docIDs):
+        df        = int(self.__df[i])
+        start     = int(self.__postingOffsets[i])
+        nBlocks   = (df + BLOCK_SIZE - 1) // BLOCK_SIZE
+        if nBlocks == 0 or len(docIDs) == 0:
+            return np.zeros(0, dtype=np.int32)
+        blockMax  = np.frombuffer(self.__postings, dtype=np.int32, count=nBlocks, offset=start)
+        blocks    = np.unique(np.searchsorted(blockMax, docIDs))
+        blocks    = blocks[blocks < nBlocks]
+        if len(blocks) * 4 > nBlocks: # most blocks are needed, decoding them all at once is faster
+            return self.__decode_docs(i)[0]
+        blockEnds = np.frombuffer(self.__postings, dtype=np.uint32, count=nBlocks, offset=start + 4 * nBlocks)
+        start    += 8 * nBlocks
+        decoded   = [np.zeros(0, dtype=np.int64)]
+        for b in blocks.tolist():
+            begin = int(blockEnds[b - 1]) if b > 0 else 0
+            base  = int(blockMax[b - 1]) if b > 0 else 0
+            decoded.append(decodePostingBlock(self.__postings[start + begin:start + int(blockEnds[b])], base)[0])
+        return np.concatenate(decoded).astype(np.int32)
+
+    ##
+    #   @brief         This method decodes the postings arrays of the term number i
+    #   @param         self
+    #   @param         i
+    #   @return        (docIDs, offsets, positions): np.ndarray(int32)
+    #   @exception     None
+    ##
+    def __decode(self, i):
+        docIDs, tfs, start = self.__decode_docs(i)
+        offsets   = np.zeros(len(tfs) + 1, dtype=np.int32)
+        offsets[1:] = np.cumsum(tfs)
+        positions = decodeGroups(self.__postings[start:int(self.__postingOffsets[i + 1])], offsets)
+        return docIDs, offsets, positions.astype(np.int32)
+
+    ##
+    #   @brief     This method finds a term in the index and returns its posting list
+    #
+    #   @param         self
+    #   @param         term
+    #   @return        postingList:IndexItem
+    #   @exception     KeyError
+    ##
+    def find(self, term):
+        i = self.__lexicon.find(term)
+        if i < 0:
+            raise KeyError(term)
+        item = IndexItem(term)
+        item.set_arrays(*self.__decode(i))
+        return item
+
+    ##
+    #   @brief     This method returns the postings of a term without the deleted documents, 
+    #              only the occurrences in the field for a query term "field:term", like InvertedIndex.get_postings
+    #
+    #   @param         self
+    #   @param         term
+    #   @return        (docIDs:np.ndarray, tfs:np.ndarray)
+    #   @exception     KeyError
+    ##
+    def get_postings(self, term):
+        field, term = splitField(term)
+        i = self.__lexicon.find(term)
+        if i < 0:
+            raise KeyError(term)
+        if field != None:
+            docIDs, tfs = self.__extents.filter(field, *self.__decode(i))
+        else:
+            docIDs, tfs, _ = self.__decode_docs(i)
+        if len(self.__deleted) > 0:
+            live   = ~self.__deleted.contains_array(docIDs)
+            docIDs = docIDs[live]
+            tfs    = tfs[live]
+        return docIDs, tfs
+
+    ##
+    #   @brief     This method returns the docIDs of a term that are in a list of docIDs, like InvertedIndex.intersect.
+    #              Only the posting blocks that can hold the docIDs are decoded
+    #
+    #   @param         self
+    #   @param         term
+    #   @param         docIDs: sorted np.ndarray
+    #   @return        docIDs:np.ndarray
+    #   @exception     KeyError
+    ##
+    def intersect(self, term, docIDs):
+        field, base = splitField(term)
+        if field != None:
+            return intersectSorted(docIDs, self.get_postings(term)[0])
+        i = self.__lexicon.find(base)
+        if i < 0:
+            raise KeyError(base)
+        found = intersectSorted(docIDs, self.__decode_blocks(i, docIDs))
+        if len(self.__deleted) > 0:
+            found = found[~self.__deleted.contains_array(found)]
+        return found
+
+    ##
+    #   @brief     This method returns the document frequency of a term, like InvertedIndex.get_df
+    #
+    #   @param         self
+    #   @param         term
+    #   @return        df:int
+    #   @exception     None
+    ##
+    def get_df(self, term):
+        i = self.__lexicon.find(splitField(term)[1])
+        if i < 0:
+            return 0
+        return int(self.__df[i])
+
+    ##
+    #   @brief     This method returns the champion list of a term, like InvertedIndex.get_champions
+    #
+    #   @param         self
+    #   @param         term
+    #   @return        docIDs:np.ndarray sorted
+    #   @exception     KeyError
+    ##
+    def get_champions(self, term):
+        field, base = splitField(term)
+        champions   = None
+        i = self.__lexicon.find(base) if field == None else -1
+        if i >= 0 and i in self.__champions:
+            champions = self.__champions[i]
+        elif i >= 0 and self.__championOffsets is None:
+            champions = self.__champions[i] = championList(*self.get_postings(base))
+        elif i >= 0 and self.__championOffsets[i + 1] > self.__championOffsets[i]:
+            champions = self.__championDocs[int(self.__championOffsets[i]):int(self.__championOffsets[i + 1])]
+        if champions is None:
+            return self.get_postings(term)[0]
+        return champions
+
+    def __contains__(self, term):
+        return splitField(term)[1] in self.__lexicon
+
+    ##
+    #   @brief     This method returns the lexicon, it can be used like a set of terms
+    #
+    #   @param         self
+    #   @return        terms:Lexicon
+    #   @exception     None
+    ##
+    def get_terms(self):
+        return self.__lexicon
+
+    ##
+    #   @brief     This method returns the terms matching a wildcard query term, like InvertedIndex.expand_wildcard
+    #
+    #   @param         self
+    #   @param         term
+    #   @return        terms:list
+    #   @exception     None
+    ##
+    def expand_wildcard(self, term):
+        return expandWildcard(self.__permuterm, term)
+
+    def get_total_number_Doc(self):
+        return self.__nDocs - len(self.__deleted)
+
+    ##
+    #   @brief     This method returns the version of the index, like InvertedIndex.get_version
+    #
+    #   @param         self
+    #   @return        version:str
+    #   @exception     None
+    ##
+    def get_version(self):
+        return "%s:%d" % tuple(self.__version)
+
+    def get_docs(self):
+        return self.__docs
+
+    def get_extents(self):
+        return self.__extents
+
+    def get_deleted(self):
+        return self.__deleted
+
+    def deleteDoc(self, docID):
+        if not docID in self.__docs or not self.__deleted.add(docID):
+            return False
+        self.__version[1] += 1
+        self.__remove_doc(int(docID))
+        return True
+
+    def is_deleted(self, docID):
+        return docID in self.__deleted
+
+    ##
+    #   @brief     This method returns the terms of every document, read from the postings once for the files
+    #              written before the docTerms sections (see docTermArrays)
+    #
+    #   @param         self
+    #   @return        (offsets, terms, freqs)
+    #   @exception     None
+    ##
+    def __get_doc_terms(self):
+        if self.__docTermOffsets is None:
+            termDocs = []
+            for i in range(len(self.__df)):
+                docIDs, tfs, _ = self.__decode_docs(i)
+                keep = docIDs < len(self.__docLengths) # the others are deleted documents
+                termDocs.append((docIDs[keep], tfs[keep]))
+            self.__docTermOffsets, self.__docTerms, self.__docTermFreqs = docTermArrays(termDocs, len(self.__docLengths))
+        return self.__docTermOffsets, self.__docTerms, self.__docTermFreqs
+
+    ##
+    #   @brief     This method removes a deleted document from the statistics, only its terms are updated
+    #
+    #   @param         self
+    #   @param         docID
+    #   @return        None
+    #   @exception     None
+    ##
+    def __remove_doc(self, docID):
+        offsets, terms, freqs = self.__get_doc_terms()
+        if self.__liveDf is None:
+            # the documents deleted before the index was saved have no length
+            docOf          = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets).astype(np.int64))
+            self.__liveDf  = np.bincount(terms[self.__docLengths[docOf] > 0], minlength=len(self.__df))
+            self.__lengths = np.array(self.__docLengths)
+        self.__squares = None # the number of documents is in every idf
+        if docID >= len(self.__lengths) or self.__lengths[docID] == 0:
+            return
+        docTerms = terms[int(offsets[docID]):int(offsets[docID + 1])]
+        self.__liveDf[docTerms] -= 1
+        self.__lengths[docID] = 0
+        for i in docTerms.tolist():
+            self.__champions[i] = championList(*self.get_postings(self.__lexicon.term(i)))
+
+    ##
+    #   @brief     This method get IDF for a term, like InvertedIndex.idf
+    #
+    #   @param         self
+    #   @param         term
+    #   @return        idf:float
+    #   @exception     None
+    ##
+    def idf(self, term):
+        i = self.__lexicon.find(splitField(term)[1])
+        if i < 0:
+            return 0
+        if self.__liveDf is not None:
+            return idfValue(self.get_total_number_Doc(), int(self.__liveDf[i]))
+        return float(self.__idf[i])
+
+    ##
+    #   @brief     This method returns the number of tokens of every document, indexed by docID, like InvertedIndex.get_doc_lengths
+    #
+    #   @param         self
+    #   @return        np.ndarray(int32)
+    #   @exception     None
+    ##
+    def get_doc_lengths(self):
+        if self.__lengths is not None:
+            return self.__lengths
+        return self.__docLengths
+
+    ##
+    #   @brief     This method returns the L2 norm of the tf-idf vector of every document, like InvertedIndex.get_doc_norms
+    #
+    #   @param         self
+    #   @return        np.ndarray(float64)
+    #   @exception     None
+    ##
+    def get_doc_norms(self):
+        if self.__liveDf is None:
+            return self.__docNorms
+        if self.__squares is None:
+            # the weights of the live documents, in term order inside each document like BinaryIndexWriter
+            offsets, terms, freqs = self.__get_doc_terms()
+            N       = self.get_total_number_Doc()
+            idfs    = np.array([idfValue(N, df) for df in self.__liveDf.tolist()], dtype=np.float64)
+            docOf   = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets).astype(np.int64))
+            live    = self.__lengths[docOf] > 0
+            weights = np.log10(freqs[live] + 1.0) * idfs[terms[live]]
+            self.__squares = np.bincount(docOf[live], weights=np.square(weights), minlength=len(self.__lengths))
+        return np.sqrt(self.__squares)
+
+
+##
+#   @brief     This method Is used for testing this Python script
+#
+#   @return        None
+#   @exception     None
+##
+def test():
+    ''' test your code thoroughly. put the testing cases here'''
+    from cran import CranFile
+    filePath        = "src/CranfieldDataset/cran.all"
+    testDir         = tempfile.mkdtemp(prefix="diskindex")
+    fileName        = os.path.join(testDir, "TestPickle")
+    fileNameB       = os.path.join(testDir, "TestBinary")
+    invertedIndexer = InvertedIndex()
+    for doc in CranFile(filePath).docs:
+        invertedIndexer.indexDoc(doc)
+    invertedIndexer.storeData(fileName)
+    writeBinaryIndex(invertedIndexer, fileNameB)
+    assert isBinaryIndex(fileNameB) and not isBinaryIndex(fileName), "Error in detecting the binary format"
+
+    diskIndex = loadIndex(fileNameB)
+    assert diskIndex.get_total_number_Doc() == invertedIndexer.get_total_number_Doc(), "Wrong number of documents"
+    assert len(diskIndex.get_terms()) == len(invertedIndexer.get_terms()), "Wrong number of terms"
+    assert "experiment" in diskIndex and not "doooooog" in diskIndex, "Error in the lexicon"
+    assert str(diskIndex.idf("experiment")) == "0.6172" and diskIndex.idf("doooooog") == 0, "Wrong idf."
+    for term in ["experiment", "bifurc", "0", "zero"]:
+        docIDs, tfs = diskIndex.get_postings(term)
+        expected    = invertedIndexer.get_postings(term)
+        assert docIDs.tolist() == expected[0].tolist() and tfs.tolist() == expected[1].tolist(), "Wrong postings for " + term
+        assert diskIndex.find(term).get_positions(0).tolist() == invertedIndexer.find(term).get_positions(0).tolist(), "Wrong positions"
+    assert np.array_equal(diskIndex.get_doc_lengths(), invertedIndexer.get_doc_lengths()), "Wrong document lengths"
+    assert np.allclose(diskIndex.get_doc_norms(), invertedIndexer.get_doc_norms()), "Wrong document norms"
+    assert diskIndex.expand_wildcard("*sonic") == invertedIndexer.expand_wildcard("*sonic") != [], "Wrong wildcard expansion"
+    candidates = np.array([1, 2, 957, 1232, 1400], dtype=np.int32)
+    for term in ["bifurc", "flow", "the", "title:flow"]:
+        if term in diskIndex:
+            expected = np.intersect1d(candidates, invertedIndexer.get_postings(term)[0]).tolist()
+            assert diskIndex.intersect(term, candidates).tolist() == invertedIndexer.intersect(term, candidates).tolist() == expected, "Wrong intersection for " + term
+            assert diskIndex.intersect(term, candidates[-1:]).tolist() == [d for d in expected if d == 1400], "Wrong intersection for " + term
+    for term in ["flow", "bifurc", "title:flow"]:
+        assert diskIndex.get_champions(term).tolist() == invertedIndexer.get_champions(term).tolist(), "Wrong champion list for " + term
+
+    diskIndex.deleteDoc(957)
+    invertedIndexer.deleteDoc(957)
+    assert diskIndex.idf("bifurc") == invertedIndexer.idf("bifurc") and diskIndex.get_doc_lengths()[957] == 0, "Wrong statistics after a delete"
+    assert diskIndex.get_champions("bifurc").tolist() == [1232], "Deleted document in a champion list"
+    for docID in [1, 2, 1400]:
+        diskIndex.deleteDoc(docID)
+        invertedIndexer.deleteDoc(docID)
+    terms = invertedIndexer.get_terms()
+    assert [diskIndex.idf(term) for term in terms] == [invertedIndexer.idf(term) for term in terms], "Wrong idf after a delete"
+    assert np.array_equal(diskIndex.get_doc_lengths(), invertedIndexer.get_doc_lengths()), "Wrong document lengths after a delete"
+    assert np.allclose(diskIndex.get_doc_norms(), invertedIndexer.get_doc_norms()), "Wrong document norms after a delete"
+    for term in ["flow", "pressur", "bifurc"]:
+        assert diskIndex.get_champions(term).tolist() == invertedIndexer.get_champions(term).tolist(), "Wrong champion list after a delete"
+    diskIndex.close()
+
+    # the postings of the deleted documents are written, they are skipped when read
+    deleted = [1, 5, 17, 957]
+    for docID in deleted:
+        assert invertedIndexer.deleteDoc(docID) or docID in [1, 957], "Error in deleting a document"
+    writeBinaryIndex(invertedIndexer, fileNameB)
+    diskIndex = loadIndex(fileNameB)
+    assert diskIndex.get_deleted().to_array().tolist() == invertedIndexer.get_deleted().to_array().tolist(), "Wrong deleted documents"
+    for term in ["experiment", "flow", "bifurc", "title:flow"]:
+        docIDs, tfs = diskIndex.get_postings(term)
+        expected    = invertedIndexer.get_postings(term)
+        assert docIDs.tolist() == expected[0].tolist() and tfs.tolist() == expected[1].tolist(), "Wrong postings with deleted documents for " + term
+        assert not np.isin(docIDs, deleted).any() and diskIndex.idf(term) == invertedIndexer.idf(term), "Deleted document in the postings of " + term
+    assert diskIndex.find("experiment").get_positions(0).tolist() == invertedIndexer.find("experiment").get_positions(0).tolist(), "Wrong positions"
+    # the norms of the deleted documents after the last live one are not written
+    norms = invertedIndexer.get_doc_norms()
+    assert np.allclose(diskIndex.get_doc_norms(), norms[:len(diskIndex.get_doc_norms())]) and not norms[len(diskIndex.get_doc_norms()):].any(), "Wrong document norms with deleted documents"
+    diskIndex.close()
+    shutil.rmtree(testDir)
+    print("test Passed")
+
+##
+#   @brief     This method converts a saved index to the binary format
+#   @return        None
+#   @exception     None
+##
+def convert():
+    # command line usage: "python diskindex.py index_file binary_index_file"
+    invertedIndexer = InvertedIndex().loadData(sys.argv[1])
+    writeBinaryIndex(invertedIndexer, sys.argv[2])
+    print("Done")
+
+#python diskindex.py Data/tempFile Data/tempFile.bin
+if __name__ == '__main__':
+    #test()
+    convert()
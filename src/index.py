@@ -1,8 +1,8 @@
 ## @package index.py
 # Index structure:
 # The Index class contains a list of IndexItems, stored in a dictionary type for easier access
-# each IndexItem contains the term and a set of PostingItems
-# each PostingItem contains a document ID and a list of positions that the term occurs
+# each IndexItem contains the term and its postings, stored in typed arrays (integer docIDs, posting offsets and positions)
+# each posting is a document ID and a list of positions that the term occurs
 #
 
 #    Within a document collection, we assume that each document has a unique
@@ -40,8 +40,13 @@
 
 """Internal libraries"""
 import doc
+from doc import Document
 from util import Tokenizer
 from cran import CranFile
+from codec import vbyteEncode, vbyteDecode, encodeGroups, decodeGroups, intersectSorted
+from lexicon import Lexicon
+from wildcard import PermutermIndex
+from termmatrix import TermDocMatrix, MATRIX_SUFFIX
 
 """Outside libraries"""
 import sys
@@ -52,7 +57,37 @@ import collections
 import numpy as np
 import os.path
 from os import path
+from array import array
+import multiprocessing
+import tempfile
+import shutil
+import itertools
+import heapq
+import bisect
 import pickle
+import gzip
+import uuid
+import time
+import contextlib
+try:
+    import fcntl # the segment manifest is locked while it is changed, not available on Windows
+except ImportError:
+    fcntl = None
+
+# Estimated memory cost used by the SPIMI indexing to decide when a block is full
+SPIMI_MEMORY_BUDGET  = 64 * 1024 * 1024 # default size of a block
+SPIMI_TERM_BYTES     = 400              # IndexItem object, its arrays and the dict entry
+SPIMI_POSTING_BYTES  = 8                # docID and offset
+SPIMI_POSITION_BYTES = 4                # one position
+
+SEGMENT_MERGE_LIMIT  = 8                # segments added with addDocuments before they are merged into the index file
+SEGMENT_LOAD_RETRIES = 100              # times loadData reads the manifest again when a merge removed its files
+SEGMENT_LOAD_WAIT    = 0.05             # seconds between two of them
+
+CHAMPION_SIZE        = 64               # documents in the champion list of a term (see IndexStats)
+
+# Fields of a document, in the order they are indexed. A query term "field:term" only matches the term in that field
+FIELDS = ("title", "author", "body")
 
 ##
 #This is our posting clas. 
@@ -65,6 +100,9 @@ import pickle
 # or the position(s) of the term in each document.
 # We don't technically need to store the frequency as we can calculate it by looking at the positions
 #
+# NOTE: The index does not store Posting objects anymore (see IndexItem), they are only built as a view
+#       by IndexItem.get_posting_list()
+#
 # @bug       None documented yet   
 #
 class Posting:
@@ -139,8 +177,271 @@ class Posting:
         return (self.__docID, self.__positions)
   
 
+##
+# @brief     A compact set of integer docIDs, one bit per docID.
+#            Used by the InvertedIndex for the indexed documents and for the deleted documents (tombstones).
+#
+# @bug       None documented yet   
+#
+class DocBitmap:
+    ##
+    #    @param         self
+    #    @return        None
+    #    @brief         The constructor. 
+    #    @exception     None documented yet
+    ##
+    def __init__(self):
+        self.__bits  = bytearray()
+        self.__count = 0
+
+    ##
+    #   @brief         This method adds a docID, it returns False if the docID was already in the set
+    #   @param         self
+    #   @param         docID
+    #   @return        boolean
+    #   @exception     None
+    ## 
+    def add(self, docID):
+        docID = int(docID)
+        if docID in self:
+            return False
+        if (docID >> 3) >= len(self.__bits):
+            self.__bits.extend(bytes((docID >> 3) + 1 - len(self.__bits)))
+        self.__bits[docID >> 3] |= 1 << (docID & 7)
+        self.__count += 1
+        return True
+
+    ##
+    #   @brief         This method removes a docID, it returns False if the docID was not in the set
+    #   @param         self
+    #   @param         docID
+    #   @return        boolean
+    #   @exception     None
+    ## 
+    def remove(self, docID):
+        docID = int(docID)
+        if not docID in self:
+            return False
+        self.__bits[docID >> 3] &= ~(1 << (docID & 7)) & 0xFF
+        self.__count -= 1
+        return True
+
+    ##
+    #   @brief         This method checks if a docID is in the set
+    #   @param         self
+    #   @param         docID
+    #   @return        boolean
+    #   @exception     None
+    ## 
+    def __contains__(self, docID):
+        docID = int(docID)
+        return (docID >> 3) < len(self.__bits) and (self.__bits[docID >> 3] >> (docID & 7)) & 1 == 1
+
+    ##
+    #   @brief         This method return the number of docIDs in the set
+    #   @param         self
+    #   @return        int
+    #   @exception     None
+    ## 
+    def __len__(self):
+        return self.__count
+
+    ##
+    #   @brief         This method checks a whole array of docIDs at once
+    #   @param         self
+    #   @param         docIDs:np.ndarray
+    #   @return        mask:np.ndarray(bool), True for the docIDs in the set
+    #   @exception     None
+    ## 
+    def contains_array(self, docIDs):
+        bits   = np.frombuffer(bytes(self.__bits), dtype=np.uint8)
+        docIDs = np.asarray(docIDs, dtype=np.int64)
+        inside = (docIDs >> 3) < len(bits)
+        mask   = np.zeros(len(docIDs), dtype=bool)
+        mask[inside] = (bits[docIDs[inside] >> 3] >> (docIDs[inside] & 7)) & 1 == 1
+        return mask
+
+    ##
+    #   @brief         This method return all docIDs of the set, sorted
+    #   @param         self
+    #   @return        docIDs:np.ndarray
+    #   @exception     None
+    ## 
+    def to_array(self):
+        bits = np.frombuffer(bytes(self.__bits), dtype=np.uint8)
+        return np.flatnonzero(np.unpackbits(bits, bitorder='little')).astype(np.int32)
+
+    ##
+    #   @brief         This method return the bitmap as bytes, to be saved
+    #   @param         self
+    #   @return        bytes
+    #   @exception     None
+    ## 
+    def to_bytes(self):
+        return bytes(self.__bits)
+
+    ##
+    #   @brief         This method replaces the bitmap by saved bytes (see to_bytes)
+    #   @param         self
+    #   @param         bits:bytes
+    #   @return        None
+    #   @exception     None
+    ## 
+    def from_bytes(self, bits):
+        self.__bits  = bytearray(bits)
+        self.__count = int(np.unpackbits(np.frombuffer(bytes(bits), dtype=np.uint8)).sum())
+
+    ##
+    #   @brief         This method adds all docIDs of another DocBitmap
+    #   @param         self
+    #   @param         other:DocBitmap
+    #   @return        None
+    #   @exception     None
+    ## 
+    def update(self, other):
+        for docID in other.to_array().tolist():
+            self.add(docID)
+
+##
+# @brief     The field extents of every document: where each field (see FIELDS) starts and ends in the token positions.
+#            The fields are indexed one after the other, so only the end of every field but the last is stored,
+#            one int array per field indexed by docID.
+#            A document without extents has all its tokens in the last field (the body).
+#
+# @bug       None documented yet   
+#
+class FieldExtents:
+    ##
+    #    @param         self
+    #    @return        None
+    #    @brief         The constructor. 
+    #    @exception     None documented yet
+    ##
+    def __init__(self):
+        self.__ends = [array('i') for _ in FIELDS[:-1]] # __ends[f][docID] is the end of field f
+
+    ##
+    #   @brief         This method sets the extents of a document
+    #   @param         self
+    #   @param         docID
+    #   @param         ends: list[int] end of every field but the last
+    #   @return        None
+    #   @exception     None
+    ## 
+    def set(self, docID, ends):
+        docID = int(docID)
+        for fieldEnds, end in zip(self.__ends, ends):
+            if docID >= len(fieldEnds):
+                fieldEnds.extend([0] * (docID + 1 - len(fieldEnds)))
+            fieldEnds[docID] = end
+
+    ##
+    #   @brief         This method return the extents of a document
+    #   @param         self
+    #   @param         docID
+    #   @return        ends: list[int] end of every field but the last
+    #   @exception     None
+    ## 
+    def get(self, docID):
+        docID = int(docID)
+        return [fieldEnds[docID] if docID < len(fieldEnds) else 0 for fieldEnds in self.__ends]
+
+    ##
+    #   @brief         This method removes the extents of a document
+    #   @param         self
+    #   @param         docID
+    #   @return        None
+    #   @exception     None
+    ## 
+    def remove(self, docID):
+        self.set(docID, [0] * len(self.__ends))
+
+    ##
+    #   @brief         This method copies the extents of the given documents from another FieldExtents
+    #   @param         self
+    #   @param         other:FieldExtents
+    #   @param         docIDs:list[int]
+    #   @return        None
+    #   @exception     None
+    ## 
+    def update(self, other, docIDs):
+        for docID in docIDs:
+            self.set(docID, other.get(docID))
+
+    ##
+    #   @brief         This method keeps the postings of a term that are in a field, 
+    #                  with the term frequencies counted in the field only
+    #   @param         self
+    #   @param         field: one of FIELDS
+    #   @param         docIDs: np.ndarray
+    #   @param         offsets: np.ndarray posting i is positions[offsets[i]:offsets[i+1]]
+    #   @param         positions: np.ndarray
+    #   @return        (docIDs:np.ndarray, tfs:np.ndarray)
+    #   @exception     KeyError if the field is unknown
+    ## 
+    def filter(self, field, docIDs, offsets, positions):
+        if not field in FIELDS:
+            raise KeyError(field)
+        f       = FIELDS.index(field)
+        posting = np.repeat(np.arange(len(docIDs)), np.diff(offsets))
+        docs    = np.asarray(docIDs, dtype=np.int64)[posting]
+        starts  = self.__field_ends(f - 1, docs) if f > 0 else np.zeros(len(docs), dtype=np.int64)
+        inField = np.asarray(positions) >= starts
+        if f < len(self.__ends):
+            inField &= np.asarray(positions) < self.__field_ends(f, docs)
+        tfs  = np.bincount(posting[inField], minlength=len(docIDs)).astype(np.int32)
+        keep = tfs > 0
+        return np.asarray(docIDs)[keep], tfs[keep]
+
+    def __field_ends(self, f, docIDs):
+        ends   = np.frombuffer(self.__ends[f], dtype=np.int32) if len(self.__ends[f]) > 0 else np.zeros(1, dtype=np.int32)
+        inside = docIDs < len(ends)
+        return np.where(inside, ends[np.where(inside, docIDs, 0)], 0)
+
+    ##
+    #   @brief         This method return the extents as bytes, to be saved: the int32 arrays of the fields one after the other
+    #   @param         self
+    #   @return        bytes
+    #   @exception     None
+    ## 
+    def to_bytes(self):
+        size = max(len(fieldEnds) for fieldEnds in self.__ends)
+        return b"".join(np.pad(np.frombuffer(fieldEnds, dtype=np.int32), (0, size - len(fieldEnds))).astype(np.int32).tobytes() 
+                        for fieldEnds in self.__ends)
+
+    ##
+    #   @brief         This method replaces the extents by saved bytes (see to_bytes)
+    #   @param         self
+    #   @param         data:bytes
+    #   @return        None
+    #   @exception     None
+    ## 
+    def from_bytes(self, data):
+        size        = len(data) // (4 * len(self.__ends))
+        self.__ends = [array('i', data[4 * size * f:4 * size * (f + 1)]) for f in range(len(self.__ends))]
+
+##
+#   @brief     This method splits a query term "field:term" in its field and term
+#
+#   @param         term
+#   @return        (field or None, term)
+#   @exception     None
+## 
+def splitField(term):
+    field, _, base = term.rpartition(":")
+    if field in FIELDS:
+        return field, base
+    return None, term
+
 ##
 # @brief     Tested
+#            Postings are stored in a compact, array backed layout instead of one Posting object per document:
+#            __docIDs[i]   is the integer docID of the i-th posting (kept sorted by docID)
+#            __offsets[i]  is where the positions of the i-th posting start in __positions,
+#                          so the positions of posting i are __positions[__offsets[i]:__offsets[i+1]]
+#            __positions   all term positions of this term, grouped by posting
+#            A Python Posting object costs hundreds of bytes, while the typed arrays cost 4 bytes per value.
+#            Posting objects are still built on demand by get_posting_list() for code that needs them.
 #
 # @bug       None documented yet   
 #
@@ -154,27 +455,116 @@ class IndexItem:
     ##
     def __init__(self, term):
         self.__term             = term
-        self.__posting          = {} #postings are stored in a python dict for easier index building
-        self.__sorted_postings  = [] # may sort them by docID for easier query processing
-        self.__sorted_dict      = {} #not sure if need
+        self.__docIDs           = array('i')      # integer docIDs, one per posting
+        self.__offsets          = array('i', [0]) # start of each posting in __positions, plus the end of the last one
+        self.__positions        = array('i')      # positions of all postings, grouped by posting
+        self.__sorted           = True            # False when a docID was added out of order
+
+    ##
+    #   @brief         This method return the term of this item
+    #   @param         self
+    #   @return        term:str
+    #   @exception     None
+    ## 
+    def get_term(self):
+        return self.__term
 
     ##
-    #   @brief         This method sets the posting list
+    #   @brief         This method sets the posting list of one document.
+    #                  Kept for compatibility, the positions of the posting are added to the arrays
     #   @param         self
+    #   @param         docID
+    #   @param         posting
     #   @return        None
     #   @exception     None
     ## 
     def set_posting_list(self, docID, posting):
-        self.__posting[docID] = posting
+        for pos in posting.get_info()[1]:
+            self.add(docID, pos)
     
     ##
-    #   @brief         This method return the posting list
+    #   @brief         This method return the posting list as a dict of Posting objects keyed by the string docID.
+    #                  The Posting objects are built from the arrays on every call, so the query code should use
+    #                  get_docIDs, get_term_freqs and get_positions instead
     #   @param         self
-    #   @return        None
+    #   @return        posting:OrderedDict {docID: Posting}
     #   @exception     None
     ## 
     def get_posting_list(self):
-        return self.__posting
+        self.__check_sorted()
+        postingList = collections.OrderedDict()
+        for i, docID in enumerate(self.__docIDs):
+            posting = Posting(str(docID))
+            posting.merge(self.__positions[self.__offsets[i]:self.__offsets[i + 1]].tolist())
+            postingList[str(docID)] = posting
+        return postingList
+
+    ##
+    #   @brief         This method return the number of documents that contain the term (the document frequency)
+    #   @param         self
+    #   @return        df:int
+    #   @exception     None
+    ## 
+    def get_df(self):
+        return len(self.__docIDs)
+
+    ##
+    #   @brief         This method return the sorted integer docIDs of the posting list
+    #   @param         self
+    #   @return        docIDs:np.ndarray(int32)
+    #   @exception     None
+    ## 
+    def get_docIDs(self):
+        self.__check_sorted()
+        return np.array(self.__docIDs, dtype=np.int32)
+
+    ##
+    #   @brief         This method return the term frequency of every posting, in the order of get_docIDs
+    #   @param         self
+    #   @return        tfs:np.ndarray(int32)
+    #   @exception     None
+    ## 
+    def get_term_freqs(self):
+        self.__check_sorted()
+        return np.diff(np.array(self.__offsets, dtype=np.int32))
+
+    ##
+    #   @brief         This method return the three arrays of the postings, used to save the index in other formats
+    #   @param         self
+    #   @return        (docIDs, offsets, positions): np.ndarray(int32)
+    #   @exception     None
+    ## 
+    def get_arrays(self):
+        self.__check_sorted()
+        return (np.array(self.__docIDs, dtype=np.int32), np.array(self.__offsets, dtype=np.int32), 
+                np.array(self.__positions, dtype=np.int32))
+
+    ##
+    #   @brief         This method replaces the postings by the given arrays, used to load the index from other formats.
+    #                  The docIDs must be sorted, offsets has one more value than docIDs
+    #   @param         self
+    #   @param         docIDs
+    #   @param         offsets
+    #   @param         positions
+    #   @return        None
+    #   @exception     None
+    ## 
+    def set_arrays(self, docIDs, offsets, positions):
+        self.__docIDs    = array('i', np.asarray(docIDs, dtype=np.int32).tobytes())
+        self.__offsets   = array('i', np.asarray(offsets, dtype=np.int32).tobytes())
+        self.__positions = array('i', np.asarray(positions, dtype=np.int32).tobytes())
+        self.__sorted    = True
+
+    ##
+    #   @brief         This method return the positions of the i-th posting
+    #   @param         self
+    #   @param         i
+    #   @return        positions:array
+    #   @exception     IndexError
+    ## 
+    def get_positions(self, i):
+        self.__check_sorted()
+        return self.__positions[self.__offsets[i]:self.__offsets[i + 1]]
 
     ##
     #   @brief         This method adds a term position, for a Document to the postings list.
@@ -182,6 +572,8 @@ class IndexItem:
     # the method creates a new posting (with docID) 
     # and then adds this the position the term was in the document.
     # Otherwise, This method just adds the new position.
+    # Documents are indexed one at a time, so the document is always the last posting
+    # unless documents are added out of order, which sort() repairs.
     #
     #   @param         self
     #   @param         docid
@@ -190,14 +582,16 @@ class IndexItem:
     #   @exception     None
     ## 
     def add(self, docid, pos):
-        key = self.__posting.keys() #list of all keys
-        if docid not in key:
-            self.__posting[docid] = Posting(docid)
-        self.__posting[docid].append(pos)
-        #Removed old code, as python 3 does not have has_key.
-        # if not self.posting.has_key(docid):
-        #     self.posting[docid] = Posting(docid)
-        # self.posting[docid].append(pos)
+        docid = int(docid)
+        if len(self.__docIDs) > 0 and self.__docIDs[-1] == docid:
+            self.__positions.append(pos)
+            self.__offsets[-1] += 1
+            return
+        if len(self.__docIDs) > 0 and self.__docIDs[-1] > docid:
+            self.__sorted = False
+        self.__docIDs.append(docid)
+        self.__positions.append(pos)
+        self.__offsets.append(len(self.__positions))
 
     ##
     #   @brief         This method sort the posting list by document ID for more efficient merging. 
@@ -209,20 +603,15 @@ class IndexItem:
     #   @exception     None
     ## 
     def return_sorted_posting(self):
-        for key, postingTemp in self.__posting.items():
-            postingTemp.sort()
-
-        self.__sorted_postings    = sorted(self.__posting.items(), key=operator.itemgetter(0))
-        self.__sorted_dict        = collections.OrderedDict(self.__sorted_postings)
-        return self.__sorted_postings , self.__sorted_dict
+        self.sort()
+        sortedDict = self.get_posting_list()
+        return list(sortedDict.items()), sortedDict
 
     ##
     #   @brief         This method sort the posting list by document ID for more efficient merging. 
     #                  And also sort each posting positions.
-    #     sort by document ID for more efficient merging. For each document also sort the positions
-    #     Firt sort all posting positions
-    #     then sort doc id 
-    #     also creat new sorted dict. // not sure if need but why not
+    #     Postings of the same docID (a document added twice) are merged into one posting.
+    #     Nothing is done when the postings were added in docID order, which is the normal case.
     # 
     #
     #   @param         self
@@ -230,33 +619,307 @@ class IndexItem:
     #   @exception     None
     ## 
     def sort(self):
-        for key, postingTemp in self.__posting.items():
-            postingTemp.sort()
+        if self.__sorted:
+            return
+        merged = collections.OrderedDict()
+        for i in sorted(range(len(self.__docIDs)), key=lambda i: self.__docIDs[i]):
+            merged.setdefault(self.__docIDs[i], []).extend(self.__positions[self.__offsets[i]:self.__offsets[i + 1]])
+        self.__docIDs    = array('i', merged.keys())
+        self.__offsets   = array('i', [0])
+        self.__positions = array('i')
+        for positions in merged.values():
+            self.__positions.extend(sorted(positions))
+            self.__offsets.append(len(self.__positions))
+        self.__sorted    = True
 
-        self.__sorted_postings    = sorted(self.__posting.items(), key=operator.itemgetter(0))
-        self.__posting            = collections.OrderedDict(self.__sorted_postings)
+    ##
+    #   @brief         This method merges the postings of another IndexItem of the same term into this one.
+    #                  When all docIDs of the other item come after ours (shards of consecutive documents) 
+    #                  the arrays are just concatenated, otherwise the postings are sorted again lazily.
+    #   @param         self
+    #   @param         other:IndexItem
+    #   @return        None
+    #   @exception     None
+    ## 
+    def merge(self, other):
+        if len(other.__docIDs) == 0:
+            return
+        if len(self.__docIDs) > 0 and self.__docIDs[-1] >= other.__docIDs[0]:
+            self.__sorted = False
+        base = self.__offsets[-1]
+        self.__docIDs.extend(other.__docIDs)
+        self.__positions.extend(other.__positions)
+        self.__offsets.extend(array('i', (offset + base for offset in other.__offsets[1:])))
+        self.__sorted = self.__sorted and other.__sorted
+
+    ##
+    #   @brief         This method physically removes the postings of the given docIDs.
+    #                  Few docIDs (a document update) are looked up with a binary search, so terms 
+    #                  that do not contain them are not copied. Many docIDs (a compaction) are filtered at once.
+    #   @param         self
+    #   @param         docIDs:list[int]
+    #   @return        number of postings removed: int
+    #   @exception     None
+    ## 
+    def remove(self, docIDs):
+        self.__check_sorted()
+        if len(docIDs) <= 16:
+            docIDs = [docID for docID in docIDs if self.__find_doc(docID) >= 0]
+            if len(docIDs) == 0:
+                return 0
+        ids  = np.array(self.__docIDs, dtype=np.int32)
+        keep = ~np.isin(ids, docIDs)
+        if keep.all():
+            return 0
+        tfs              = np.diff(np.array(self.__offsets, dtype=np.int32))
+        positions        = np.array(self.__positions, dtype=np.int32)
+        self.__docIDs    = array('i', ids[keep].tobytes())
+        self.__positions = array('i', positions[np.repeat(keep, tfs)].tobytes())
+        self.__offsets   = array('i', np.concatenate(([0], np.cumsum(tfs[keep]))).astype(np.int32).tobytes())
+        return int(len(keep) - keep.sum())
+
+    ##
+    #   @brief         This method finds the posting of a docID with a binary search
+    #   @param         self
+    #   @param         docID
+    #   @return        index of the posting or -1: int
+    #   @exception     None
+    ## 
+    def __find_doc(self, docID):
+        i = bisect.bisect_left(self.__docIDs, docID)
+        if i < len(self.__docIDs) and self.__docIDs[i] == docID:
+            return i
+        return -1
+
+    ##
+    #   @brief         This method sorts the postings if a docID was added out of order
+    #   @param         self
+    #   @return        None
+    #   @exception     None
+    ## 
+    def __check_sorted(self):
+        if not self.__sorted:
+            self.sort()
     
     ##
     #   @brief         This Method transforms the postings data into a dictionary format to be converted to Json
     #   @param         self
+    #   @param         deleted:DocBitmap  the postings of these documents are left out
     #   @return        posting: dict
     #   @exception     None
     ## 
-    def posting_list_to_string(self):
-        docID       = int
-        positions   = []
+    def posting_list_to_string(self, deleted=None):
+        self.__check_sorted()
         listOfShit  = {}
         posting  = {}
-        numberOfTimeTermIsInDoc = 0
-        for docID, post in  self.__posting.items():
-            docID, positions = post.get_info()
-            listOfShit[docID] = positions
-            numberOfTimeTermIsInDoc += 1
+        for i, docID in enumerate(self.__docIDs):
+            if deleted != None and docID in deleted:
+                continue
+            listOfShit[str(docID)] = self.get_positions(i).tolist()
 
-        posting["df"]       = numberOfTimeTermIsInDoc 
+        posting["df"]       = len(listOfShit)
         posting["posting"]  = listOfShit
         return posting
 ##
+# @brief     The statistics of an index that the ranking needs, computed once from the postings
+#            instead of on every query: the idf of every term, and the length (number of indexed tokens)
+#            and the norm of every document, indexed by docID.
+#            The norm of a document is the L2 norm of its whole tf-idf vector, with weight = log10(1 + tf) * idf,
+#            so the cosine can be computed with all the terms of the document.
+#            The champion list of a term is its CHAMPION_SIZE documents with the highest weighted tf log10(1 + tf),
+#            a vector query can score only the champions of its terms (see QueryProcessor.vectorQuery).
+#            Only the terms with more postings have one, the champion list of the others is their posting list.
+#            Deleted documents must not be added, their length and norm are 0.
+#            When a document is added or removed only its length and the df and champion list of its terms
+#            are updated (add_doc, remove_doc, update_term), the idf follows from the df.
+#            The number of documents is in every idf, so the norms must then be computed again (set_norms).
+#
+# @bug       None documented yet   
+#
+class IndexStats:
+    ##
+    #    @param         self
+    #    @param         nDocs   number of (live) documents, used for the idf
+    #    @param         size    largest docID + 1 if it is known, the arrays grow when needed
+    #    @return        None
+    #    @brief         The constructor. 
+    #    @exception     None documented yet
+    ##
+    def __init__(self, nDocs, size=0):
+        self.__nDocs   = nDocs
+        self.__df      = {}                                 # number of live documents of every term
+        self.__lengths = np.zeros(size, dtype=np.int32)     # number of tokens of every docID
+        self.__squares = np.zeros(size, dtype=np.float64)   # sum of the squared weights of every docID, None when out of date
+        self.__champions = {}                               # sorted docIDs of the champion list of the long posting lists
+
+    ##
+    #   @brief         This method makes the arrays long enough for a docID
+    #   @param         self
+    #   @param         docID
+    #   @return        None
+    #   @exception     None
+    ## 
+    def __grow(self, docID):
+        if docID >= len(self.__lengths):
+            grow = int(docID) + 1 - len(self.__lengths)
+            self.__lengths = np.concatenate((self.__lengths, np.zeros(grow, dtype=np.int32)))
+            if self.__squares is not None:
+                self.__squares = np.concatenate((self.__squares, np.zeros(grow, dtype=np.float64)))
+
+    ##
+    #   @brief         This method adds the live postings of a term
+    #   @param         self
+    #   @param         term
+    #   @param         docIDs:np.ndarray  sorted docIDs of the live postings
+    #   @param         tfs:np.ndarray
+    #   @return        None
+    #   @exception     None
+    ## 
+    def add(self, term, docIDs, tfs):
+        self.__df[term] = len(docIDs)
+        if len(docIDs) == 0:
+            return
+        idf = self.get_idf(term)
+        self.__grow(docIDs[-1])
+        # the docIDs of a posting list are unique, so a plain fancy index add is enough
+        self.__lengths[docIDs] += tfs
+        self.__squares[docIDs] += np.square(np.log10(tfs + 1.0) * idf)
+        self.update_term(term, docIDs, tfs)
+
+    ##
+    #   @brief         This method updates a term whose postings changed: its df and its champion list
+    #   @param         self
+    #   @param         term
+    #   @param         docIDs:np.ndarray  sorted docIDs of the live postings
+    #   @param         tfs:np.ndarray
+    #   @return        None
+    #   @exception     None
+    ## 
+    def update_term(self, term, docIDs, tfs):
+        self.__df[term] = len(docIDs)
+        champions = championList(docIDs, tfs)
+        if champions is not None:
+            self.__champions[term] = champions
+        else:
+            self.__champions.pop(term, None)
+
+    ##
+    #   @brief         This method removes a term that has no postings anymore
+    #   @param         self
+    #   @param         term
+    #   @return        None
+    #   @exception     None
+    ## 
+    def remove_term(self, term):
+        self.__df.pop(term, None)
+        self.__champions.pop(term, None)
+
+    ##
+    #   @brief         This method adds a document, the postings of its terms are given to update_term
+    #   @param         self
+    #   @param         docID
+    #   @param         length: number of tokens of the document
+    #   @return        None
+    #   @exception     None
+    ## 
+    def add_doc(self, docID, length):
+        self.__grow(docID)
+        self.__lengths[docID] = length
+        self.__nDocs  += 1
+        self.__squares = None
+
+    ##
+    #   @brief         This method removes a (live) document, the postings of its terms are given to update_term
+    #   @param         self
+    #   @param         docID
+    #   @return        None
+    #   @exception     None
+    ## 
+    def remove_doc(self, docID):
+        if docID < len(self.__lengths):
+            self.__lengths[docID] = 0
+        self.__nDocs  -= 1
+        self.__squares = None
+
+    ##
+    #   @brief         This method return the idf of a term, 0 for an unknown term
+    #   @param         self
+    #   @param         term
+    #   @return        idf:float
+    #   @exception     None
+    ## 
+    def get_idf(self, term):
+        return idfValue(self.__nDocs, self.__df.get(term, 0))
+
+    def get_idfs(self):
+        return dict((term, idfValue(self.__nDocs, df)) for term, df in self.__df.items())
+
+    ##
+    #   @brief         This method return the champion list of a term
+    #   @param         self
+    #   @param         term
+    #   @return        docIDs:np.ndarray(int32) sorted, None if the champion list is the whole posting list
+    #   @exception     None
+    ## 
+    def get_champions(self, term):
+        return self.__champions.get(term)
+
+    ##
+    #   @brief         This method return the number of tokens of every document, indexed by docID
+    #   @param         self
+    #   @return        np.ndarray(int32)
+    #   @exception     None
+    ## 
+    def get_doc_lengths(self):
+        return self.__lengths
+
+    ##
+    #   @brief         This method checks if the norms are up to date, they are not after add_doc or remove_doc
+    #   @param         self
+    #   @return        boolean
+    #   @exception     None
+    ## 
+    def has_norms(self):
+        return self.__squares is not None
+
+    ##
+    #   @brief         This method computes the norms again from all the live postings
+    #   @param         self
+    #   @param         docIDs:np.ndarray   docID of every posting, term after term like add
+    #   @param         weights:np.ndarray  log10(1 + tf) * idf of every posting
+    #   @return        None
+    #   @exception     None
+    ## 
+    def set_norms(self, docIDs, weights):
+        # bincount adds the weights in order, like add term after term
+        self.__squares = np.bincount(docIDs, weights=np.square(weights), minlength=len(self.__lengths))[:len(self.__lengths)]
+
+    ##
+    #   @brief         This method return the L2 norm of the tf-idf vector of every document, indexed by docID
+    #   @param         self
+    #   @return        np.ndarray(float64)
+    #   @exception     ValueError if the norms are out of date (see has_norms)
+    ## 
+    def get_doc_norms(self):
+        if self.__squares is None:
+            raise ValueError("the norms must be computed again")
+        return np.sqrt(self.__squares)
+
+##
+#   @brief         This method returns the champion list of a posting list (see IndexStats)
+#   @param         docIDs:np.ndarray  sorted docIDs of the live postings
+#   @param         tfs:np.ndarray
+#   @return        docIDs:np.ndarray(int32) sorted, None if the champion list is the whole posting list
+#   @exception     None
+##
+def championList(docIDs, tfs):
+    if len(docIDs) <= CHAMPION_SIZE:
+        return None
+    # log10(1 + tf) has the order of tf: the highest tf first, then the lowest docID
+    best = np.lexsort((docIDs, -tfs))[:CHAMPION_SIZE]
+    return np.sort(docIDs[best]).astype(np.int32)
+
+##
 # @brief     
 #
 # @bug       None documented yet   
@@ -273,9 +936,30 @@ class InvertedIndex:
         self.__items     = {} # list of IndexItems
         self.__nDocs     = 0  # the number of indexed documents
         self.__tokenizer = Tokenizer()
+        self.__docs      = DocBitmap() # docIDs of the indexed documents
+        self.__deleted   = DocBitmap() # docIDs of the deleted documents (tombstones), their postings are still in the index
+        self.__stats     = None        # IndexStats, computed when needed and updated when documents are added or removed
+        self.__docTerms  = {}          # docID: its terms, so only these terms change when the document is removed,
+                                       # None when they are not known (not pickled), built from the postings when needed
+        self.__extents   = FieldExtents() # where the fields of every document start and end
+        self.__lexicon   = None        # sorted Lexicon of the terms, built when needed and dropped when terms are added or removed
+        self.__permuterm = None        # PermutermIndex of the terms for the wildcard queries, like the lexicon
+        self.__version   = [uuid.uuid4().hex, 0] # id of the index and number of changes, see get_version
 
     ##
-    #   @brief     This method return the total number of doc in our data set
+    #   @brief     This method returns the version of the index: its id and the number of changes
+    #              (documents indexed, deleted, purged or merged). It is saved with the index,
+    #              so the data built from an index (see termmatrix.py) can tell if the index changed since.
+    #
+    #   @param         self
+    #   @return        version:str
+    #   @exception     None
+    ## 
+    def get_version(self):
+        return "%s:%d" % tuple(self.__version)
+
+    ##
+    #   @brief     This method return the total number of doc in our data set, deleted documents are not counted
     #
     #   @param         self
     #   @param         Doc
@@ -283,8 +967,28 @@ class InvertedIndex:
     #   @exception     None
     ## 
     def get_total_number_Doc(self):
-        return self.__nDocs
+        return self.__nDocs - len(self.__deleted)
     
+    ##
+    #   @brief     This method return the docIDs of the indexed documents, including the deleted ones
+    #
+    #   @param         self
+    #   @return        docs: DocBitmap
+    #   @exception     None
+    ## 
+    def get_docs(self):
+        return self.__docs
+
+    ##
+    #   @brief     This method return the docIDs of the deleted documents (tombstones)
+    #
+    #   @param         self
+    #   @return        deleted: DocBitmap
+    #   @exception     None
+    ## 
+    def get_deleted(self):
+        return self.__deleted
+
     ##
     #   @brief     This method return the total number of doc in our data set
     #
@@ -297,37 +1001,301 @@ class InvertedIndex:
         return self.__items
 
     ##
-    #   @brief     This method is designed to index a docuemnt, using the simple SPIMI algorithm, 
-    #              but no need to store blocks due to the small collection we are handling. 
-    #              Using save/load the whole index instead
-    # 
-    #       ToDo: indexing only title and body; use some functions defined in util.py
-    #       (1) convert to lower cases,
-    #       (2) remove stopwords,
-    #       (3) stemming
+    #   @brief     This method is designed to index a docuemnt, using the simple SPIMI algorithm, 
+    #              but no need to store blocks due to the small collection we are handling. 
+    #              Using save/load the whole index instead
+    # 
+    #       ToDo: indexing only title and body; use some functions defined in util.py
+    #       (1) convert to lower cases,
+    #       (2) remove stopwords,
+    #       (3) stemming
+    #
+    #   @param         self
+    #   @param         Doc
+    #   @return        None
+    #   @exception     None
+    ## 
+    def indexDoc(self, doc): # indexing a Document object
+        fields = self.tokenizeFields(doc)
+        self.indexTokens(doc.docID, list(itertools.chain.from_iterable(fields)), fieldEnds(fields))
+
+    ##
+    #   @brief     This method returns the indexing terms of a document, in the order they appear
+    #
+    #   @param         self
+    #   @param         doc
+    #   @return        list[term]
+    #   @exception     None
+    ## 
+    def tokenizeDoc(self, doc):
+        #Concatenate document title
+        newDoc              = doc.title +" "+   doc.author +" "+  doc.body
+        return self.__tokenizer.transpose_document_tokenized_stemmed(newDoc)
+
+    ##
+    #   @brief     This method returns the indexing terms of every field of a document (see FIELDS).
+    #              Tokens never span two fields, so the fields one after the other are the terms of tokenizeDoc
+    #
+    #   @param         self
+    #   @param         doc
+    #   @return        list[list[term]]
+    #   @exception     None
+    ## 
+    def tokenizeFields(self, doc):
+        return [self.__tokenizer.transpose_document_tokenized_stemmed(getattr(doc, field)) for field in FIELDS]
+
+    ##
+    #   @brief     This method adds the already tokenized terms of one document to the index
+    #
+    #   @param         self
+    #   @param         docID
+    #   @param         full_stemmed_list:list[term]
+    #   @param         ends:list[int]  end of every field but the last (see FieldExtents), all in the body by default
+    #   @return        None
+    #   @exception     None
+    ## 
+    def indexTokens(self, docID, full_stemmed_list, ends=None):
+        added = not docID in self.__docs
+        for position, term in enumerate(full_stemmed_list):
+            if self.__items.get(term) == None:
+                #key does not exists in dict
+                self.__items[term]                  = IndexItem(term)
+                self.__lexicon                      = None
+                self.__permuterm                    = None
+            self.__items[term].add(docID, position)
+        self.__docs.add(docID)
+        if ends != None:
+            self.__extents.set(docID, ends)
+        self.__nDocs += 1
+        self.__version[1] += 1
+        # the terms of the document, the strings of the IndexItems so they are pickled once
+        terms = tuple(self.__items[term].get_term() for term in dict.fromkeys(full_stemmed_list))
+        if self.__docTerms != None:
+            self.__docTerms[int(docID)] = terms if added else tuple(set(self.__docTerms.get(int(docID), ())) | set(terms))
+        if self.__stats != None and added:
+            self.__stats.add_doc(int(docID), len(full_stemmed_list))
+            self.__update_terms(terms)
+        else:
+            self.__stats = None
+
+    ##
+    #   @brief     This method deletes a document. The docID is only marked as deleted (a tombstone), 
+    #              queries skip it and idf does not count it, the postings are removed by purge()
+    #
+    #   @param         self
+    #   @param         docID
+    #   @return        boolean, False if the document is not in the index or already deleted
+    #   @exception     None
+    ## 
+    def deleteDoc(self, docID):
+        if not docID in self.__docs or not self.__deleted.add(docID):
+            return False
+        self.__version[1] += 1
+        if self.__stats != None:
+            self.__stats.remove_doc(int(docID))
+            self.__update_terms(self.__get_doc_terms().get(int(docID), ()))
+        return True
+
+    ##
+    #   @brief     This method updates the statistics of terms whose postings changed
+    #
+    #   @param         self
+    #   @param         terms
+    #   @return        None
+    #   @exception     None
+    ## 
+    def __update_terms(self, terms):
+        for term in terms:
+            if term in self.__items:
+                self.__stats.update_term(term, *self.get_postings(term))
+            else:
+                self.__stats.remove_term(term)
+
+    ##
+    #   @brief     This method returns the terms of every document, built from the postings when they are not known
+    #
+    #   @param         self
+    #   @return        docTerms: {docID: tuple of terms}
+    #   @exception     None
+    ## 
+    def __get_doc_terms(self):
+        if self.__docTerms == None:
+            docTerms = collections.defaultdict(list)
+            for term, item in self.__items.items():
+                for docID in item.get_docIDs().tolist():
+                    docTerms[docID].append(term)
+            self.__docTerms = dict((docID, tuple(terms)) for docID, terms in docTerms.items())
+        return self.__docTerms
+
+    ##
+    #   @brief     This method replaces a document by a new version with the same docID.
+    #              The postings of the old version are removed (only the terms of the document are changed)
+    #              and the new version is indexed
+    #
+    #   @param         self
+    #   @param         doc
+    #   @return        None
+    #   @exception     None
+    ## 
+    def updateDoc(self, doc):
+        self.purgeDocs([int(doc.docID)])
+        self.indexDoc(doc)
+
+    ##
+    #   @brief     This method checks if a document is deleted
+    #
+    #   @param         self
+    #   @param         docID
+    #   @return        boolean
+    #   @exception     None
+    ## 
+    def is_deleted(self, docID):
+        return docID in self.__deleted
+
+    ##
+    #   @brief     This method physically removes documents from the index, only the postings of their terms are read.
+    #              Terms left without postings are removed too
+    #
+    #   @param         self
+    #   @param         docIDs:list[int]
+    #   @return        None
+    #   @exception     None
+    ## 
+    def purgeDocs(self, docIDs):
+        docIDs = [int(docID) for docID in docIDs if docID in self.__docs]
+        if len(docIDs) == 0:
+            return
+        docTerms  = self.__get_doc_terms()
+        live      = [docID for docID in docIDs if not docID in self.__deleted]
+        liveTerms = set(term for docID in live for term in docTerms.get(docID, ()))
+        termDocs  = collections.defaultdict(list) # the removed docIDs of every term
+        for docID in docIDs:
+            for term in docTerms.pop(docID, ()):
+                termDocs[term].append(docID)
+        for term, removed in termDocs.items():
+            self.__items[term].remove(removed)
+            if self.__items[term].get_df() == 0:
+                del self.__items[term]
+                liveTerms.add(term)
+                self.__lexicon = None
+                self.__permuterm = None
+        for docID in docIDs:
+            self.__docs.remove(docID)
+            self.__deleted.remove(docID)
+            self.__extents.remove(docID)
+        self.__nDocs -= len(docIDs)
+        self.__version[1] += 1
+        # the deleted documents were already removed from the statistics, not their terms without postings
+        if self.__stats != None:
+            for docID in live:
+                self.__stats.remove_doc(docID)
+            self.__update_terms(liveTerms)
+
+    ##
+    #   @brief     This method removes the postings of all deleted documents (compaction)
+    #
+    #   @param         self
+    #   @return        None
+    #   @exception     None
+    ## 
+    def purge(self):
+        self.purgeDocs(self.__deleted.to_array().tolist())
+
+    ##
+    #   @brief     This method index documents with the block based SPIMI algorithm, for collections that do not fit in memory.
+    #              Postings are accumulated in a block index until the estimated size of the block reaches memoryBudget,
+    #              then the block is written to disk with its terms sorted and a new block is started.
+    #              At the end all blocks are merged with a k-way merge (mergeBlocks) into this index.
+    #              Blocks hold consecutive documents, so merging the postings of a term in block order keeps them sorted by docID.
+    #
+    #   @param         self
+    #   @param         docs:iterable[Document]
+    #   @param         memoryBudget:int  bytes of postings kept in memory before a block is flushed
+    #   @param         blockDir:str      directory for the block files, a temporary directory by default
+    #   @return        None
+    #   @exception     None
+    ## 
+    def indexDocsSPIMI(self, docs, memoryBudget=SPIMI_MEMORY_BUDGET, blockDir=None):
+        removeBlockDir = blockDir == None
+        if removeBlockDir:
+            blockDir = tempfile.mkdtemp(prefix="spimi")
+        blockFiles, indexedDocs, extents = spimiInvert(docs, memoryBudget, blockDir)
+
+        for term, item in mergeBlocks(blockFiles):
+            if self.__items.get(term) == None:
+                self.__items[term] = item
+            else:
+                self.__items[term].merge(item)
+        self.__nDocs += sum(nDocs for nDocs, _ in blockFiles)
+        self.__docs.update(indexedDocs)
+        self.__extents.update(extents, indexedDocs.to_array().tolist())
+        self.__stats   = None
+        self.__docTerms = None
+        self.__lexicon = None
+        self.__permuterm = None
+        self.__version[1] += 1
+
+        removeBlocks(blockFiles, blockDir if removeBlockDir else None)
+  
+
+    ##
+    #   @brief     This method index a list of documents using a pool of processes.
+    #              The documents are split into shards of consecutive documents, each process builds 
+    #              a partial InvertedIndex for its shard (the tokenizing and stemming is most of the work)
+    #              and the partial indexes are merged into this index in shard order, 
+    #              so the merged postings stay sorted by docID.
+    #
+    #   @param         self
+    #   @param         docs:list[Document]
+    #   @param         processes:int  number of worker processes, default is the number of cores
+    #   @return        None
+    #   @exception     None
+    ## 
+    def indexDocsParallel(self, docs, processes=None):
+        if processes == None:
+            processes = multiprocessing.cpu_count()
+        docs = list(docs)
+        if processes <= 1 or len(docs) < 2:
+            for doc in docs:
+                self.indexDoc(doc)
+            return
+        # a few shards per process so a slow shard does not keep the other processes waiting
+        shardSize = max(1, int(math.ceil(len(docs) / float(processes * 4))))
+        shards    = [docs[i:i + shardSize] for i in range(0, len(docs), shardSize)]
+        with multiprocessing.Pool(processes) as pool:
+            for partialIndex in pool.imap(indexShard, shards):
+                self.merge(partialIndex)
+        self.sort()
+
+    ##
+    #   @brief     This method merges another InvertedIndex (for example a partial index built 
+    #              by another process) into this index. The number of documents is added up.
+    #              A document in both indexes is replaced by the version of the other index
     #
     #   @param         self
-    #   @param         Doc
+    #   @param         other:InvertedIndex
     #   @return        None
     #   @exception     None
     ## 
-    def indexDoc(self, doc): # indexing a Document object
-        #Concatenate document title
-        newDoc              = doc.title +" "+   doc.author +" "+  doc.body
-        docID               = doc.docID
-        full_stemmed_list   = self.__tokenizer.transpose_document_tokenized_stemmed(newDoc)
-        
-        for position, term in enumerate(full_stemmed_list):
-            if self.__items.get(term) !=None:
-                self.__items[term].add(docID, position)
-            else:
-                #key does not exists in dict
-                newPosting                          = Posting(docID)
-                newPosting.append(position)
-                self.__items[term]                  = IndexItem(term)
-                self.__items[term].set_posting_list(docID, newPosting)
-        self.__nDocs += 1
-  
+    def merge(self, other):
+        # documents of the other index replace the documents with the same docID in this index (updates)
+        self.purgeDocs(other.__docs.to_array().tolist())
+        for term, item in other.get_items_inverted().items():
+            if self.__items.get(term) == None:
+                self.__items[term] = IndexItem(term)
+            self.__items[term].merge(item)
+        self.__nDocs += other.__nDocs
+        self.__docs.update(other.__docs)
+        self.__deleted.update(other.__deleted)
+        self.__extents.update(other.__extents, other.__docs.to_array().tolist())
+        if self.__docTerms != None and other.__docTerms != None:
+            self.__docTerms.update(other.__docTerms)
+        else:
+            self.__docTerms = None
+        self.__stats   = None
+        self.__lexicon = None
+        self.__permuterm = None
+        self.__version[1] += 1
 
     ##
     #   @brief     This method Sorts all posting list by document ID. 
@@ -353,20 +1321,150 @@ class InvertedIndex:
     ## 
     def sort_terms(self):
         ''' sort all posting lists by docID'''
-        return collections.OrderedDict(sorted(self.__items.items(), key=operator.itemgetter(0)))
-        #
+        return collections.OrderedDict((term, self.__items[term]) for term in self.get_lexicon())
+
+    ##
+    #   @brief     This method returns the sorted lexicon of the terms, for exact, prefix and range lookups.
+    #              It is only built again when terms were added or removed
+    #
+    #   @param         self
+    #   @return        Lexicon
+    #   @exception     None
+    ## 
+    def get_lexicon(self):
+        if self.__lexicon == None:
+            self.__lexicon = Lexicon(sorted(self.__items))
+        return self.__lexicon
+
+    ##
+    #   @brief     This method returns the permuterm index of the terms, used to expand wildcard query terms
+    #
+    #   @param         self
+    #   @return        PermutermIndex
+    #   @exception     None
+    ## 
+    def get_permuterm(self):
+        if self.__permuterm == None:
+            self.__permuterm = PermutermIndex(self.get_lexicon())
+        return self.__permuterm
+
+    ##
+    #   @brief     This method returns the terms of the index matching a wildcard query term like "aero*" or "title:*sonic"
+    #
+    #   @param         self
+    #   @param         term
+    #   @return        terms:list
+    #   @exception     None
+    ## 
+    def expand_wildcard(self, term):
+        return expandWildcard(self.get_permuterm(), term)
   
     ##
     #   @brief     This method finds a term in the indexing and returns its posting list
     #
     #   @param         self
     #   @param         term
-    #   @return        postingList:dict
-    #   @exception     None
+    #   @return        postingList:IndexItem
+    #   @exception     KeyError
     ## 
     def find(self, term):
         return self.__items[term]
 
+    ##
+    #   @brief     This method returns the postings of a term without the deleted documents.
+    #              For a query term "field:term" only the occurrences in the field are counted (see FieldExtents)
+    #
+    #   @param         self
+    #   @param         term
+    #   @return        (docIDs:np.ndarray, tfs:np.ndarray)
+    #   @exception     KeyError
+    ## 
+    def get_postings(self, term):
+        field, term = splitField(term)
+        item   = self.__items[term]
+        if field != None:
+            docIDs, tfs = self.__extents.filter(field, *item.get_arrays())
+        else:
+            docIDs = item.get_docIDs()
+            tfs    = item.get_term_freqs()
+        if len(self.__deleted) > 0:
+            live   = ~self.__deleted.contains_array(docIDs)
+            docIDs = docIDs[live]
+            tfs    = tfs[live]
+        return docIDs, tfs
+
+    ##
+    #   @brief     This method returns the docIDs of a term that are in a list of docIDs, without the deleted documents.
+    #              The docIDs are looked up in the posting list (see codec.intersectSorted),
+    #              so a short list is intersected with a long posting list without reading all of it
+    #
+    #   @param         self
+    #   @param         term
+    #   @param         docIDs: sorted np.ndarray
+    #   @return        docIDs:np.ndarray
+    #   @exception     KeyError
+    ## 
+    def intersect(self, term, docIDs):
+        field, base = splitField(term)
+        if field != None:
+            return intersectSorted(docIDs, self.get_postings(term)[0])
+        found = intersectSorted(docIDs, self.__items[base].get_docIDs())
+        if len(self.__deleted) > 0:
+            found = found[~self.__deleted.contains_array(found)]
+        return found
+
+    ##
+    #   @brief     This method returns the document frequency of a term, deleted documents included,
+    #              for a query term "field:term" it is the document frequency of the term
+    #
+    #   @param         self
+    #   @param         term
+    #   @return        df:int, 0 if the term is not in the index
+    #   @exception     None
+    ## 
+    def get_df(self, term):
+        item = self.__items.get(splitField(term)[1])
+        if item == None:
+            return 0
+        return item.get_df()
+
+    ##
+    #   @brief     This method returns the champion list of a term without the deleted documents (see IndexStats).
+    #              A query term "field:term" has no champion list, its live docIDs are returned
+    #
+    #   @param         self
+    #   @param         term
+    #   @return        docIDs:np.ndarray sorted
+    #   @exception     KeyError
+    ##
+    def get_champions(self, term):
+        field, base = splitField(term)
+        champions   = self.get_stats().get_champions(base) if field == None else None
+        if champions is None:
+            return self.get_postings(term)[0]
+        return champions
+
+    ##
+    #   @brief     This method checks if a term is in the index, so "term in index" can be used
+    #
+    #   @param         self
+    #   @param         term
+    #   @return        boolean
+    #   @exception     None
+    ## 
+    def __contains__(self, term):
+        return splitField(term)[1] in self.__items
+
+    ##
+    #   @brief     This method returns all the indexing terms, used by the query spelling corrector
+    #
+    #   @param         self
+    #   @return        terms:set
+    #   @exception     None
+    ## 
+    def get_terms(self):
+        return set(self.__items.keys())
+
 
     ##
     #   @brief     This method to dumper for json
@@ -383,48 +1481,98 @@ class InvertedIndex:
             return obj.__dict__
 
     ##
-    #   @brief     This method Serializes the inverted index to a json format and 
-    #              clears the Memory that holds this dictionary
+    #   @brief     This method Serializes the inverted index to a json format.
+    #              The file is written term by term (the whole json is never built in memory), one term per line:
+    #                  {"nDoc":N,"docs":[docIDs],"extents":[field ends of the docs],"Data":{
+    #                  "term":{"df":df,"posting":{"docID":[positions]},"idf":idf},
+    #                  ...
+    #                  }}
+    #              Deleted documents are left out. The file is gzipped when the filename ends with ".gz"
     #
     #   @param         self
     #   @param         filename
-    #   @return        ValueError
+    #   @return        None
     #   @exception     None
     ## 
     def save(self, filename):
-        write_stream = open(filename, 'w')
-        listTerm = self.sort_terms()
-        dictMain = {}
-        listInfo = {}
-
-        for term, postingList in listTerm.items():
-            dictTemp = postingList.posting_list_to_string()
-            dictTemp["idf"] = self.idf(term)
-            dictMain[term] = dictTemp
-
-        listInfo["nDoc"] = self.get_total_number_Doc()
-        listInfo["Data"] = dictMain
-        try: 
-            write_stream.write(json.dumps(listInfo, indent=3))
-        except ValueError as e: 
-             print ("Is not valid json")
-        write_stream.close()
+        stats   = self.get_stats()
+        deleted = self.__deleted if len(self.__deleted) > 0 else None
+        live    = [docID for docID in self.__docs.to_array().tolist() if deleted == None or not docID in deleted]
+        with openText(filename, "w") as write_stream:
+            write_stream.write('{"nDoc":%d,"docs":%s,"extents":%s,"Data":{' % (self.get_total_number_Doc(), json.dumps(live, separators=(",", ":")), 
+                               json.dumps([self.__extents.get(docID) for docID in live], separators=(",", ":"))))
+            separator = "\n"
+            for term in self.get_lexicon():
+                dictTemp = self.__items[term].posting_list_to_string(deleted)
+                if dictTemp["df"] == 0:
+                    continue
+                dictTemp["idf"] = stats.get_idf(term)
+                write_stream.write(separator + json.dumps(term) + ":" + json.dumps(dictTemp, separators=(",", ":")))
+                separator = ",\n"
+            write_stream.write("\n}}\n")
 
     ##
-    #   @brief     This method deserializes a json file in a object by reallocating the self.__items
+    #   @brief     This method rebuilds the inverted index from a json file written by save, one term at a time,
+    #              so only one term of the json is in memory next to the index. 
+    #              Json files in another layout (the indented files of older versions) are parsed whole.
     #
     #   @param         self
     #   @param         filename
-    #   @return        json: dict
-    #   @exception     ValueError
+    #   @return        invertedIndexer
+    #   @exception     ValueError if the file is not valid json
     ## 
     def load(self, filename):
-        try: 
-            with open(filename) as json_file:
-                return json.load(json_file)
-        except ValueError as e: 
-            print ("Is not valid json") 
+        self.__items   = {}
+        self.__docs    = DocBitmap()
+        self.__deleted = DocBitmap()
+        self.__stats   = None
+        self.__docTerms = None
+        self.__extents = FieldExtents()
+        self.__lexicon = None
+        self.__permuterm = None
+        self.__version[1] += 1
+        with openText(filename, "r") as json_file:
+            header = json_file.readline().rstrip()
+            if header.endswith('"Data":{'):
+                info = json.loads(header + "}}")
+                for line in json_file:
+                    line = line.rstrip().rstrip(",")
+                    if line == "}}":
+                        break
+                    term, dictTemp = json.loads("{" + line + "}").popitem()
+                    self.__load_term(term, dictTemp)
+            else:
+                json_file.seek(0)
+                info = json.load(json_file)
+                for term, dictTemp in info["Data"].items():
+                    self.__load_term(term, dictTemp)
+        self.__nDocs = info["nDoc"]
+        if not "docs" in info: 
+            # older files do not list the documents, only the documents with postings are known
+            info["docs"] = np.unique(np.concatenate([item.get_docIDs() for item in self.__items.values()] + [np.zeros(0, dtype=np.int32)])).tolist()
+        for docID in info["docs"]:
+            self.__docs.add(docID)
+        for docID, ends in zip(info["docs"], info.get("extents", [])):
+            self.__extents.set(docID, ends)
+        return self
 
+    ##
+    #   @brief     This method adds the postings of one term read from json, they are in docID order
+    #
+    #   @param         self
+    #   @param         term
+    #   @param         dictTemp: {"df": df, "posting": {docID: [positions]}}
+    #   @return        None
+    #   @exception     None
+    ## 
+    def __load_term(self, term, dictTemp):
+        docIDs    = [int(docID) for docID in dictTemp["posting"]]
+        lists     = list(dictTemp["posting"].values())
+        offsets   = np.zeros(len(lists) + 1, dtype=np.int32)
+        offsets[1:] = np.cumsum([len(positions) for positions in lists])
+        item      = IndexItem(term)
+        item.set_arrays(docIDs, offsets, list(itertools.chain.from_iterable(lists)))
+        self.__items[term] = item
 
     ##
     #   @brief     This method get IDF for  term by compute the inverted document frequency for a given term.
@@ -437,16 +1585,70 @@ class InvertedIndex:
     ## 
     def idf(self, term):
         ''' '''
-        if not term in self.__items:
-            return 0
-        termData = self.__items[term]
-        N = self.get_total_number_Doc()
-        df = len(termData.get_posting_list())
-        #inverse document frequency 
-        idf = round(math.log10(N/(float(df))), 4)
-        #probabilistic inverse document frequency from  
-        #idf = round(math.log10(N - df /(float(df))), 4)
-        return idf
+        return self.get_stats().get_idf(splitField(term)[1])
+
+    ##
+    #   @brief     This method returns the field extents of the documents
+    #
+    #   @param         self
+    #   @return        extents:FieldExtents
+    #   @exception     None
+    ## 
+    def get_extents(self):
+        return self.__extents
+
+    ##
+    #   @brief     This method returns the statistics of the index (idf, document lengths and norms).
+    #              They are computed from the postings the first time they are needed, 
+    #              then only the terms of the added and removed documents are updated
+    #
+    #   @param         self
+    #   @return        stats:IndexStats
+    #   @exception     None
+    ## 
+    def get_stats(self):
+        if self.__stats == None:
+            docs  = self.__docs.to_array()
+            stats = IndexStats(self.get_total_number_Doc(), int(docs[-1]) + 1 if len(docs) > 0 else 0)
+            for term in self.__items:
+                stats.add(term, *self.get_postings(term))
+            self.__stats = stats
+        return self.__stats
+
+    ##
+    #   @brief     This method returns the number of tokens of every document, indexed by docID (0 for deleted documents)
+    #
+    #   @param         self
+    #   @return        np.ndarray(int32)
+    #   @exception     None
+    ## 
+    def get_doc_lengths(self):
+        return self.get_stats().get_doc_lengths()
+
+    ##
+    #   @brief     This method returns the L2 norm of the tf-idf vector of every document, indexed by docID
+    #
+    #   @param         self
+    #   @return        np.ndarray(float64)
+    #   @exception     None
+    ## 
+    def get_doc_norms(self):
+        stats = self.get_stats()
+        if not stats.has_norms():
+            # every idf changed with the number of documents, the weights are computed again in the order of get_stats
+            docIDs  = [np.zeros(0, dtype=np.int32)]
+            weights = [np.zeros(0)]
+            for term, item in self.__items.items():
+                docIDs.append(item.get_docIDs())
+                weights.append(np.log10(item.get_term_freqs() + 1.0) * stats.get_idf(term))
+            docIDs  = np.concatenate(docIDs)
+            weights = np.concatenate(weights)
+            if len(self.__deleted) > 0:
+                live    = ~self.__deleted.contains_array(docIDs)
+                docIDs  = docIDs[live]
+                weights = weights[live]
+            stats.set_norms(docIDs, weights)
+        return stats.get_doc_norms()
       
     ##
     #   @brief     This method create IDF for doc
@@ -458,7 +1660,7 @@ class InvertedIndex:
     def idfDict(self):
         idf = collections.OrderedDict()
     
-        for term, postingList in self.sort_terms().items():
+        for term in self.get_lexicon():
             idf[term] = self.idf(term)
 
         return idf
@@ -474,10 +1676,11 @@ class InvertedIndex:
     ##   
     def tf_doc(self):
         word_tf_values = collections.OrderedDict()
-        for term, postingList in self.sort_terms().items():
+        for term in self.get_lexicon():
+            postingList = self.__items[term]
             doc_tf = collections.OrderedDict()
-            for docID, post in postingList.get_posting_list().items():
-                doc_tf[docID] = round(math.log10(1 + post.term_freq()), 4) #log normalize 
+            for docID, tf in zip(postingList.get_docIDs().tolist(), postingList.get_term_freqs().tolist()):
+                doc_tf[str(docID)] = round(math.log10(1 + tf), 4) #log normalize 
             word_tf_values[term] = doc_tf
         return word_tf_values
 
@@ -493,7 +1696,7 @@ class InvertedIndex:
     def tf_idf(self,word_tf_valuesm, idfDict):
         TFIDF_dict =  collections.defaultdict(list)
         
-        for term, postingList in self.sort_terms().items():
+        for term in self.get_lexicon():
             tf_idf = 0.0 
             for doc , doctf in word_tf_valuesm[term].items():
                 term_tf_idf_doc = {}
@@ -505,6 +1708,44 @@ class InvertedIndex:
     
         ##
     
+    ##
+    #   @brief     This method returns the state that is pickled (storeData, segments, parallel shards).
+    #              The postings are pickled compressed (see encodeItems) instead of as int32 arrays
+    #
+    #   @param         self
+    #   @return        state:dict
+    #   @exception     None
+    ##
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_InvertedIndex__lexicon"] = self.get_lexicon()
+        state["_InvertedIndex__items"]   = encodeItems(self.__items, self.get_lexicon())
+        # as big as the postings once pickled, it is built again from them when a document is removed
+        state["_InvertedIndex__docTerms"] = None
+        return state
+
+    ##
+    #   @brief     This method restores a pickled state, the postings are decompressed
+    #
+    #   @param         self
+    #   @param         state:dict
+    #   @return        None
+    #   @exception     None
+    ##
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__items = decodeItems(state["_InvertedIndex__items"])
+        self.__stats   = state.get("_InvertedIndex__stats")
+        if self.__stats != None and not hasattr(self.__stats, "_IndexStats__df"):
+            self.__stats = None # saved by an older version, computed again
+        self.__docTerms  = state.get("_InvertedIndex__docTerms")
+        self.__lexicon   = state.get("_InvertedIndex__lexicon")
+        self.__permuterm = state.get("_InvertedIndex__permuterm")
+        if not "_InvertedIndex__extents" in state:
+            self.__extents = FieldExtents()
+        if not "_InvertedIndex__version" in state:
+            self.__version = [uuid.uuid4().hex, 0] # saved by an older version
+
     ##
     #   @brief     This method Saves the current state of the InvertedIndex
     #
@@ -515,6 +1756,8 @@ class InvertedIndex:
     ##          
     def storeData(self, filename):
         
+        self.get_doc_norms() # the statistics are saved with the index, so they are not computed again when it is loaded
+        self.get_permuterm()
         try: 
             fileP = open(filename, "wb") 
             pickle.dump(self, fileP) # serialize class object
@@ -524,13 +1767,17 @@ class InvertedIndex:
     
     ##
     #   @brief     This method Loads the saved InvertedIndex
+    #              and merges the segments added with addDocuments (see below), so the loaded index is up to date
     #
     #   @param         self
     #   @param         filename
+    #   @param         withSegments:boolean  False to load only the index file itself
     #   @return        invertedIndexer
     #   @exception     (pickle.UnpicklingError, ImportError, EOFError, IndexError, TypeError)
     ##  
-    def loadData(self, filename): 
+    def loadData(self, filename, withSegments=True): 
+        if withSegments:
+            return loadWithSegments(filename)
         try:
             fileP = open(filename ,"rb")
             invertedIndexer = pickle.load(fileP)
@@ -540,6 +1787,442 @@ class InvertedIndex:
         fileP.close()
         return invertedIndexer
 
+##
+#   Incremental indexing:
+#   New documents are not added to the saved index file, they are stored as a new segment 
+#   (a small pickled InvertedIndex, "index_file.segN") listed in the json manifest "index_file.segments".
+#   Adding a batch of documents only costs the indexing and saving of the batch. 
+#   A document added again with the same docID replaces the older version (an update).
+#   Deleted docIDs are only written to the manifest (tombstones).
+#   loadData merges the segments into the loaded index and marks the deleted documents, 
+#   so nDocs and idf are computed over the live documents, and mergeSegments folds the segments 
+#   into the index file once there are too many of them, removing the deleted documents for good.
+#   The manifest is only changed under a lock ("index_file.segments.lock") and replaced atomically.
+#   A merge writes the merged index to a new file ("index_file.baseN") and switches the manifest to it
+#   and to the remaining segments at once, so a load sees either the old or the new files.
+#   A load that finds a file of its manifest removed by a merge reads the manifest again.
+#   NOTE: only one process should merge the segments of an index at a time.
+##
+
+##
+#   @brief     This method returns the path of a segment, segments are stored next to the index file
+#   @param         fileName
+#   @param         segmentName
+#   @return        path:str
+#   @exception     None
+## 
+def segmentPath(fileName, segmentName):
+    return os.path.join(os.path.dirname(fileName), segmentName)
+
+##
+#   @brief     This method reads the segment manifest of an index file
+#   @param         fileName
+#   @return        segments: {"next": int, "segments": [segmentName], "deleted": [docID],
+#                             "base": file of the index when a merge is switching it, None for the index file}
+#   @exception     None
+## 
+def readSegments(fileName):
+    if not path.exists(fileName + ".segments"):
+        return {"next": 1, "segments": [], "deleted": [], "base": None}
+    with open(fileName + ".segments") as manifest:
+        segments = json.load(manifest)
+    segments.setdefault("deleted", [])
+    segments.setdefault("base", None)
+    return segments
+
+##
+#   @brief     This method locks the segment manifest of an index file while it is read and written again,
+#              so the changes of other processes are not lost
+#   @param         fileName
+#   @return        context manager
+#   @exception     None
+## 
+@contextlib.contextmanager
+def lockSegments(fileName):
+    with open(fileName + ".segments.lock", "a") as lock:
+        if fcntl != None:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl != None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+##
+#   @brief     This method loads a saved index with its segments (see InvertedIndex.loadData)
+#   @param         fileName
+#   @return        invertedIndexer
+#   @exception     FileNotFoundError if the files of the manifest are still missing after SEGMENT_LOAD_RETRIES reads
+## 
+def loadWithSegments(fileName):
+    for attempt in range(SEGMENT_LOAD_RETRIES):
+        segments = readSegments(fileName)
+        try:
+            base = segmentPath(fileName, segments["base"]) if segments["base"] != None else fileName
+            invertedIndexer = InvertedIndex().loadData(base, withSegments=False)
+            for segmentName in segments["segments"]:
+                invertedIndexer.merge(InvertedIndex().loadData(segmentPath(fileName, segmentName), withSegments=False))
+        except FileNotFoundError:
+            # a merge removed the files of this manifest since it was read
+            if attempt + 1 == SEGMENT_LOAD_RETRIES:
+                raise
+            time.sleep(SEGMENT_LOAD_WAIT)
+            continue
+        invertedIndexer.sort()
+        for docID in segments["deleted"]:
+            invertedIndexer.deleteDoc(docID)
+        return invertedIndexer
+
+##
+#   @brief     This method writes the segment manifest of an index file, the manifest is replaced atomically
+#   @param         fileName
+#   @param         segments
+#   @return        None
+#   @exception     None
+## 
+def writeSegments(fileName, segments):
+    with open(fileName + ".segments.tmp", "w") as manifest:
+        json.dump(segments, manifest)
+    os.replace(fileName + ".segments.tmp", fileName + ".segments")
+
+##
+#   @brief     This method adds documents to a saved index as a new segment.
+#              If the index file does not exist yet the documents are saved as the index itself.
+#              When there are more than maxSegments segments they are merged into the index file.
+#   @param         fileName
+#   @param         docs:iterable[Document]
+#   @param         maxSegments:int
+#   @return        number of documents added: int
+#   @exception     None
+## 
+def addDocuments(fileName, docs, maxSegments=SEGMENT_MERGE_LIMIT):
+    segmentIndex = InvertedIndex()
+    for doc in docs:
+        segmentIndex.indexDoc(doc)
+    if not path.exists(fileName):
+        segmentIndex.storeData(fileName)
+        return segmentIndex.get_total_number_Doc()
+
+    with lockSegments(fileName):
+        segments    = readSegments(fileName)
+        segmentName = "%s.seg%d" % (os.path.basename(fileName), segments["next"])
+        segmentIndex.storeData(segmentPath(fileName, segmentName))
+        segments["next"] += 1
+        segments["segments"].append(segmentName)
+        # a deleted document that is added again is live
+        segments["deleted"] = [docID for docID in segments["deleted"] if not docID in segmentIndex.get_docs()]
+        writeSegments(fileName, segments)
+
+    if len(segments["segments"]) > maxSegments:
+        mergeSegments(fileName)
+    return segmentIndex.get_total_number_Doc()
+
+##
+#   @brief     This method deletes documents from a saved index, the docIDs are added to the segment manifest
+#              and the documents are removed for good by the next mergeSegments
+#   @param         fileName
+#   @param         docIDs:list
+#   @return        None
+#   @exception     None
+## 
+def deleteDocuments(fileName, docIDs):
+    with lockSegments(fileName):
+        segments = readSegments(fileName)
+        for docID in docIDs:
+            if not int(docID) in segments["deleted"]:
+                segments["deleted"].append(int(docID))
+        writeSegments(fileName, segments)
+
+##
+#   @brief     This method merges all segments of an index into the index file, and deletes them.
+#              The deleted documents are purged from the index file.
+#              With background=True the merge runs in another process and the process is returned,
+#              queries can still load the index and its segments while the merge runs:
+#              the merged index is written to a new file, then one write of the manifest switches the loads
+#              to it and to the segments added meanwhile. The merged index is moved back to the index file
+#              after the merged segments are removed, so a load with the old manifest reads it again.
+#   @param         fileName
+#   @param         background:boolean
+#   @return        multiprocessing.Process when background, otherwise None
+#   @exception     None
+## 
+def mergeSegments(fileName, background=False):
+    if background:
+        process = multiprocessing.Process(target=mergeSegments, args=(fileName,))
+        process.start()
+        return process
+
+    with lockSegments(fileName):
+        segments = readSegments(fileName)
+        if len(segments["segments"]) == 0 and len(segments["deleted"]) == 0:
+            return None
+        # the name of the merged index is reserved like a segment name
+        baseName = "%s.base%d" % (os.path.basename(fileName), segments["next"])
+        segments["next"] += 1
+        writeSegments(fileName, segments)
+    merged   = segments["segments"]
+    deleted  = segments["deleted"]
+    invertedIndexer = InvertedIndex().loadData(segmentPath(fileName, segments["base"]) if segments["base"] != None else fileName, withSegments=False)
+    for segmentName in merged:
+        invertedIndexer.merge(InvertedIndex().loadData(segmentPath(fileName, segmentName), withSegments=False))
+    invertedIndexer.sort()
+    for docID in deleted:
+        invertedIndexer.deleteDoc(docID)
+    invertedIndexer.purge()
+    invertedIndexer.storeData(segmentPath(fileName, baseName))
+
+    # the loads switch to the merged index at once, segments added and documents deleted while merging stay
+    with lockSegments(fileName):
+        segments = readSegments(fileName)
+        oldBase  = segments["base"]
+        segments["base"]     = baseName
+        segments["segments"] = [segmentName for segmentName in segments["segments"] if not segmentName in merged]
+        segments["deleted"]  = [docID for docID in segments["deleted"] if not docID in deleted]
+        writeSegments(fileName, segments)
+    for segmentName in merged:
+        os.remove(segmentPath(fileName, segmentName))
+    if oldBase != None:
+        os.remove(segmentPath(fileName, oldBase))
+    # a load that read the manifest before the switch finds its segments removed and reads it again
+    os.replace(segmentPath(fileName, baseName), fileName)
+    with lockSegments(fileName):
+        segments = readSegments(fileName)
+        segments["base"] = None
+        writeSegments(fileName, segments)
+    return None
+
+##
+#   @brief     This method removes all segments of an index, used when the index file is rebuilt from scratch
+#   @param         fileName
+#   @return        None
+#   @exception     None
+## 
+def removeSegments(fileName):
+    for segmentName in readSegments(fileName)["segments"]:
+        if path.exists(segmentPath(fileName, segmentName)):
+            os.remove(segmentPath(fileName, segmentName))
+    base = readSegments(fileName)["base"]
+    if base != None and path.exists(segmentPath(fileName, base)):
+        os.remove(segmentPath(fileName, base))
+    for suffix in [".segments", ".segments.lock"]:
+        if path.exists(fileName + suffix):
+            os.remove(fileName + suffix)
+
+##
+#   @brief     This method is the inversion step of the SPIMI algorithm (see InvertedIndex.indexDocsSPIMI):
+#              postings are accumulated in a block index until its estimated size reaches memoryBudget,
+#              then the block is written to blockDir and a new block is started.
+#
+#   @param         docs:iterable[Document]
+#   @param         memoryBudget:int
+#   @param         blockDir:str
+#   @return        (blockFiles:list[(nDocs, fileName)], indexedDocs:DocBitmap, extents:FieldExtents)
+#   @exception     None
+## 
+def spimiInvert(docs, memoryBudget, blockDir):
+    blockFiles  = []
+    indexedDocs = DocBitmap()
+    extents     = FieldExtents()
+    block       = InvertedIndex()
+    blockSize   = 0
+    for doc in docs:
+        indexedDocs.add(doc.docID)
+        fields      = block.tokenizeFields(doc)
+        tokens      = list(itertools.chain.from_iterable(fields))
+        terms       = set(tokens)
+        newTerms    = sum(1 for term in terms if not term in block)
+        extents.set(doc.docID, fieldEnds(fields))
+        block.indexTokens(doc.docID, tokens)
+        blockSize  += newTerms * SPIMI_TERM_BYTES + len(terms) * SPIMI_POSTING_BYTES + len(tokens) * SPIMI_POSITION_BYTES
+        if blockSize >= memoryBudget:
+            blockFiles.append(writeBlock(block, os.path.join(blockDir, "block%d" % len(blockFiles))))
+            block      = InvertedIndex()
+            blockSize  = 0
+    if block.get_total_number_Doc() > 0:
+        blockFiles.append(writeBlock(block, os.path.join(blockDir, "block%d" % len(blockFiles))))
+    return blockFiles, indexedDocs, extents
+
+##
+#   @brief     This method deletes the SPIMI block files once they are merged
+#
+#   @param         blockFiles:list[(nDocs, fileName)]
+#   @param         blockDir:str  also removed when given
+#   @return        None
+#   @exception     None
+## 
+def removeBlocks(blockFiles, blockDir=None):
+    for _, blockFile in blockFiles:
+        os.remove(blockFile)
+    if blockDir != None:
+        os.rmdir(blockDir)
+
+##
+#   @brief     This method expands a wildcard query term with a permuterm index, the field of the term is kept
+#
+#   @param         permuterm:PermutermIndex
+#   @param         term:   "pattern" or "field:pattern"
+#   @return        terms:list
+#   @exception     None
+## 
+def expandWildcard(permuterm, term):
+    field, pattern = splitField(term)
+    terms = permuterm.expand(pattern)
+    if field != None:
+        return [field + ":" + t for t in terms]
+    return terms
+
+##
+#   @brief     This method returns the end of every field but the last from the terms of the fields
+#
+#   @param         fields:list[list[term]]
+#   @return        ends:list[int]
+#   @exception     None
+## 
+def fieldEnds(fields):
+    return list(itertools.accumulate(len(terms) for terms in fields))[:-1]
+
+##
+#   @brief     This method opens a text file, gzipped when the filename ends with ".gz"
+#
+#   @param         filename
+#   @param         mode: "r" or "w"
+#   @return        file
+#   @exception     IOError
+## 
+def openText(filename, mode):
+    if filename.endswith(".gz"):
+        return gzip.open(filename, mode + "t", compresslevel=6, encoding="utf-8")
+    return open(filename, mode, encoding="utf-8")
+
+##
+#   @brief     This method computes the inverted document frequency of a term.
+#              We used this IDF = (Total number of (documents))/(Number of  (documents) containing the word)
+#
+#   @param         N:int   number of documents
+#   @param         df:int  number of documents containing the term
+#   @return        idf:float, 0 when no document contains the term
+#   @exception     None
+## 
+def idfValue(N, df):
+    if df == 0:
+        return 0
+    #inverse document frequency 
+    idf = round(math.log10(N/(float(df))), 4)
+    #probabilistic inverse document frequency from  
+    #idf = round(math.log10(N - df /(float(df))), 4)
+    return idf
+
+##
+#   @brief     This method compresses the postings of all terms for pickling.
+#              The arrays of all terms are concatenated and encoded at once: docIDs as gaps inside each term,
+#              positions as gaps inside each posting, all written with the variable-byte code (see codec.py)
+#
+#   @param         items:dict {term: IndexItem}
+#   @param         terms:Lexicon   the terms, in the order they are saved
+#   @return        dict
+#   @exception     None
+## 
+def encodeItems(items, terms):
+    arrays = [items[term].get_arrays() for term in terms]
+    dfs    = np.array([len(docIDs) for docIDs, _, _ in arrays], dtype=np.int64)
+    tfs    = np.concatenate([np.diff(offsets) for _, offsets, _ in arrays] + [np.zeros(0, dtype=np.int32)])
+    return {
+        "terms":     terms,
+        "df":        vbyteEncode(dfs),
+        "docIDs":    encodeGroups(np.concatenate([docIDs for docIDs, _, _ in arrays] + [np.zeros(0, dtype=np.int32)]), 
+                                  np.concatenate(([0], np.cumsum(dfs)))),
+        "tfs":       vbyteEncode(tfs),
+        "positions": encodeGroups(np.concatenate([positions for _, _, positions in arrays] + [np.zeros(0, dtype=np.int32)]), 
+                                  np.concatenate(([0], np.cumsum(tfs)))),
+    }
+
+##
+#   @brief     This method decompresses the postings written by encodeItems
+#
+#   @param         encoded:dict
+#   @return        items:dict {term: IndexItem}
+#   @exception     None
+## 
+def decodeItems(encoded):
+    docOffsets = np.concatenate(([0], np.cumsum(vbyteDecode(encoded["df"]))))
+    tfs        = vbyteDecode(encoded["tfs"])
+    posOffsets = np.concatenate(([0], np.cumsum(tfs)))
+    docIDs     = decodeGroups(encoded["docIDs"], docOffsets).astype(np.int32)
+    positions  = decodeGroups(encoded["positions"], posOffsets).astype(np.int32)
+    posOffsets = posOffsets.astype(np.int32)
+    items      = {}
+    for i, term in enumerate(encoded["terms"]):
+        start, end = docOffsets[i], docOffsets[i + 1]
+        item = IndexItem(term)
+        item.set_arrays(docIDs[start:end], posOffsets[start:end + 1] - posOffsets[start], 
+                        positions[posOffsets[start]:posOffsets[end]])
+        items[term] = item
+    return items
+
+##
+#   @brief     This method writes a SPIMI block to disk: the number of documents of the block 
+#              followed by one pickled (term, IndexItem) record per term, in term order
+#
+#   @param         block:InvertedIndex
+#   @param         fileName
+#   @return        (nDocs, fileName)
+#   @exception     None
+## 
+def writeBlock(block, fileName):
+    with open(fileName, "wb") as fileP:
+        pickle.dump(block.get_total_number_Doc(), fileP)
+        for term, item in block.sort_terms().items():
+            pickle.dump((term, item), fileP)
+    return (block.get_total_number_Doc(), fileName)
+
+##
+#   @brief     This method reads the (term, IndexItem) records of a SPIMI block one at a time
+#
+#   @param         fileName
+#   @return        generator of (term, IndexItem)
+#   @exception     None
+## 
+def readBlock(fileName):
+    with open(fileName, "rb") as fileP:
+        pickle.load(fileP) # number of documents of the block
+        while True:
+            try:
+                yield pickle.load(fileP)
+            except EOFError:
+                return
+
+##
+#   @brief     This method does the k-way merge of SPIMI blocks. Only one record per block is in memory,
+#              the postings of a term found in several blocks are merged in block order.
+#
+#   @param         blockFiles:list[(nDocs, fileName)]
+#   @return        generator of (term, IndexItem) in term order
+#   @exception     None
+## 
+def mergeBlocks(blockFiles):
+    # heapq.merge is stable, records of the same term come out in block order
+    records = heapq.merge(*[readBlock(fileName) for _, fileName in blockFiles], key=operator.itemgetter(0))
+    for term, group in itertools.groupby(records, key=operator.itemgetter(0)):
+        _, item = next(group)
+        for _, other in group:
+            item.merge(other)
+        yield term, item
+
+##
+#   @brief     This method builds the partial InvertedIndex of one shard of documents.
+#              It is run by the worker processes of InvertedIndex.indexDocsParallel, 
+#              so it has to be a module level function to be pickled
+#
+#   @param         docs:list[Document]
+#   @return        InvertedIndex
+#   @exception     None
+## 
+def indexShard(docs):
+    partialIndex = InvertedIndex()
+    for doc in docs:
+        partialIndex.indexDoc(doc)
+    return partialIndex
+
 ##
 #   @brief     This method Is used for tasting this Python script
 #   Most testing was done in the debugger or ipython.  
@@ -558,8 +2241,9 @@ def test():
     dictTest_bifurc = {'957': 1, '1232': 1}
 
     filePath = "src/CranfieldDataset/cran.all"
-    fileName = "src/Data/Test.json"
-    fileNameO = "src/Data/TestPickle"        
+    testDir = tempfile.mkdtemp(prefix="index")
+    fileName = path.join(testDir, "Test.json.gz")
+    fileNameO = path.join(testDir, "TestPickle")
     #filePath = "./CranfieldDataset/cran.all"
     #fileName = "./Data/tempFile.json"
     invertedIndexer = InvertedIndex()
@@ -587,10 +2271,69 @@ def test():
     dictTest_bifurc = {'957': 1, '1232': 1}
     for docID, post in invertedIndexer.find("bifurc").get_posting_list().items():
         assert  docID in dictTest_bifurc and post.term_freq() == dictTest_bifurc[docID], "For Term experiment wrong value"
+    assert invertedIndexer.find("bifurc").get_docIDs().tolist() == [957, 1232], "Wrong docIDs in compact postings"
+    assert invertedIndexer.find("bifurc").get_term_freqs().tolist() == [1, 1], "Wrong term freqs in compact postings"
+    lengths = invertedIndexer.get_doc_lengths()
+    assert lengths[957] == len(invertedIndexer.tokenizeDoc(data.docs[956])) and lengths[471] == 0, "Wrong document lengths"
+    weights = [math.log10(1 + tf) * invertedIndexer.idf(term) for term, tf in collections.Counter(invertedIndexer.tokenizeDoc(data.docs[956])).items()]
+    assert abs(invertedIndexer.get_doc_norms()[957] - math.sqrt(sum(w * w for w in weights))) < 1e-9, "Wrong document norm"
+    docIDs, tfs = invertedIndexer.get_postings("flow")
+    champions   = invertedIndexer.get_champions("flow")
+    assert len(champions) == CHAMPION_SIZE and np.isin(champions, docIDs).all(), "Wrong champion list"
+    assert min(tfs[np.isin(docIDs, champions)]) >= max(tfs[~np.isin(docIDs, champions)]), "Champion list not by tf"
+    assert invertedIndexer.get_champions("bifurc").tolist() == [957, 1232], "Wrong champion list of a short posting list"
+
+    parallelIndexer = InvertedIndex()
+    parallelIndexer.indexDocsParallel(data.docs, 4)
+    assert parallelIndexer.get_total_number_Doc() == 1400, "Wrong total number of Doc in parallel index"
+    assert parallelIndexer.idf("experiment") == invertedIndexer.idf("experiment"), "Wrong idf in parallel index"
+    assert parallelIndexer.find("experiment").get_docIDs().tolist() == invertedIndexer.find("experiment").get_docIDs().tolist(), "Parallel postings are not sorted"
+
+    #Delete and update test
+    deleteIndexer = InvertedIndex()
+    deleteIndexer.merge(invertedIndexer)
+    norms = deleteIndexer.get_doc_norms()
+    assert deleteIndexer.deleteDoc("957") and not deleteIndexer.deleteDoc("957"), "Error in deleting a document"
+    assert deleteIndexer.get_total_number_Doc() == 1399 and deleteIndexer.get_postings("bifurc")[0].tolist() == [1232], "Deleted document not skipped"
+    assert str(deleteIndexer.idf("bifurc")) == "3.1458" and deleteIndexer.get_doc_lengths()[957] == 0, "Wrong idf after delete"
+    deleteIndexer.purge()
+    assert deleteIndexer.find("bifurc").get_docIDs().tolist() == [1232], "Error in purging a document"
+    deleteIndexer.updateDoc(Document("1232", "", "", "aeroelastic"))
+    assert not "bifurc" in deleteIndexer and deleteIndexer.get_total_number_Doc() == 1399, "Error in updating a document"
+    # the statistics updated for the terms of the changed documents are the ones of the live postings
+    N       = deleteIndexer.get_total_number_Doc()
+    squares = np.zeros(len(deleteIndexer.get_doc_lengths()))
+    for term in deleteIndexer.get_terms():
+        docIDs, tfs = deleteIndexer.get_postings(term)
+        assert deleteIndexer.idf(term) == idfValue(N, len(docIDs)), "Wrong idf after update for " + term
+        np.add.at(squares, docIDs, np.square(np.log10(tfs + 1.0) * idfValue(N, len(docIDs))))
+    assert np.allclose(deleteIndexer.get_doc_norms(), np.sqrt(squares)) and not np.allclose(deleteIndexer.get_doc_norms()[:len(norms)], norms), "Wrong norms after update"
+
+    spimiIndexer = InvertedIndex()
+    spimiIndexer.indexDocsSPIMI(data.docs, memoryBudget=256 * 1024)
+    assert spimiIndexer.get_total_number_Doc() == 1400, "Wrong total number of Doc in SPIMI index"
+    assert spimiIndexer.get_terms() == invertedIndexer.get_terms(), "Wrong terms in SPIMI index"
+    assert spimiIndexer.find("experiment").get_docIDs().tolist() == invertedIndexer.find("experiment").get_docIDs().tolist(), "SPIMI postings are not sorted"
+    assert spimiIndexer.get_postings("title:flow")[0].tolist() == invertedIndexer.get_postings("title:flow")[0].tolist(), "Wrong field extents in SPIMI index"
+
+    #Lexicon test
+    lexicon = invertedIndexer.get_lexicon()
+    assert list(lexicon) == sorted(invertedIndexer.get_terms()) and lexicon.term(lexicon.find("experiment")) == "experiment", "Error in the lexicon"
+    assert "aerodynam" in list(lexicon.terms(*lexicon.prefix("aero"))), "Error in prefix lookup"
+    assert "aerodynam" in invertedIndexer.expand_wildcard("aero*") and invertedIndexer.expand_wildcard("title:*flow")[0].startswith("title:"), "Error in wildcard expansion"
+
+    #Field extents test, doc 1 has 5 title terms and 1 author term
+    assert invertedIndexer.get_extents().get(1) == [5, 6], "Wrong field extents"
+    assert 1 in invertedIndexer.get_postings("author:brenckman")[0].tolist() and not 1 in invertedIndexer.get_postings("title:brenckman")[0].tolist(), "Error in field postings"
+    assert invertedIndexer.get_postings("author:experiment")[0].tolist() == [], "Error in field postings"
     
 
     invertedIndexer.save(fileName)
     assert path.exists(fileName), "error in saving json data."
+    jsonIndexer = InvertedIndex().load(fileName)
+    assert jsonIndexer.get_terms() == invertedIndexer.get_terms() and jsonIndexer.get_total_number_Doc() == 1400, "Error in loading json data."
+    assert jsonIndexer.find("bifurc").get_positions(1).tolist() == invertedIndexer.find("bifurc").get_positions(1).tolist(), "Wrong positions in json data."
+    assert jsonIndexer.idf("experiment") == invertedIndexer.idf("experiment"), "Wrong idf in json data."
 
     invertedIndexer.storeData(fileNameO)
     assert path.exists(fileNameO), "error in saving json data."
@@ -598,8 +2341,55 @@ def test():
     idfScore = Temp.idf("experiment")
     assert str(idfScore) == "0.6172"  ," Error in Load the picle file."
 
+    #Incremental indexing test
+    fileNameS = path.join(testDir, "TestSegments")
+    addDocuments(fileNameS, data.docs[:1000])
+    addDocuments(fileNameS, data.docs[1000:1200])
+    addDocuments(fileNameS, data.docs[1200:])
+    assert len(readSegments(fileNameS)["segments"]) == 2, "Error in adding segments"
+    Temp = InvertedIndex().loadData(fileNameS)
+    assert Temp.get_total_number_Doc() == 1400 and str(Temp.idf("experiment")) == "0.6172", "Error in loading segments"
+    mergeSegments(fileNameS)
+    assert len(readSegments(fileNameS)["segments"]) == 0 and readSegments(fileNameS)["base"] == None, "Error in merging segments"
+    Temp = InvertedIndex().loadData(fileNameS)
+    assert Temp.find("experiment").get_docIDs().tolist() == invertedIndexer.find("experiment").get_docIDs().tolist(), "Error in merging segments"
+    # the loads during a merge see the documents once, before or after the switch
+    deleteDocuments(fileNameS, [957])
+    addDocuments(fileNameS, data.docs[1300:])
+    merge = mergeSegments(fileNameS, background=True)
+    while merge.is_alive():
+        Temp = InvertedIndex().loadData(fileNameS)
+        assert Temp.get_total_number_Doc() == 1399 and Temp.get_postings("bifurc")[0].tolist() == [1232], "Error in loading while merging"
+    merge.join()
+    left = sorted(name for name in os.listdir(testDir) if name.startswith("TestSegments."))
+    assert left == ["TestSegments.segments", "TestSegments.segments.lock"], "Merged files not removed"
+    assert InvertedIndex().loadData(fileNameS).get_total_number_Doc() == 1399, "Error in merging deleted documents"
+    shutil.rmtree(testDir)
+
     print("test Passed")
 ##
+#   @brief     This method returns the value of a "--name=value" command line option
+#   @param         name
+#   @param         default
+#   @return        value:str
+#   @exception     None
+##  
+def getOption(name, default):
+    for arg in sys.argv[3:]:
+        if arg.startswith("--" + name + "="):
+            return arg.split("=", 1)[1]
+    return default
+
+##
+#   @brief     This method checks if a "--name" command line flag is given
+#   @param         name
+#   @return        boolean
+#   @exception     None
+##  
+def hasOption(name):
+    return ("--" + name) in sys.argv[3:]
+
+##
 #   @brief     This method is the driver program for launching the Python script
 #   @return        None
 #   @exception     None
@@ -609,23 +2399,74 @@ def indexingCranfield():
     # command line usage: "python index.py cran.all index_file"
     # the index is saved to index_file
 
+    # options: --processes=N builds the index with a pool of N processes
+    #          --spimi=MB      builds the index with the SPIMI algorithm, flushing blocks of MB megabytes to disk
+    #          --append        adds the documents to the existing index_file as a new segment
+    #          --merge         merges the segments of index_file into it (after appending)
+    #          --binary        saves the index in the memory-mapped binary format (see diskindex.py)
+    #          --matrix        also saves the term-document matrix in index_file.matrix.npz (see termmatrix.py)
     filePath = sys.argv[1]
     fileName = sys.argv[2]
+    processes = int(getOption("processes", 1))
+    spimiBudget = getOption("spimi", None)
 
     #filePath = "src/CranfieldDataset/cran.all"
     #fileName = "src/Data/tempFile"
     #filePath = "./CranfieldDataset/cran.all"
     #fileName = "./Data/tempFile"
    
+    data = CranFile(filePath) # documents are parsed while they are indexed
+    if hasOption("append") or hasOption("merge"):
+        if hasOption("append"):
+            addDocuments(fileName, data)
+        if hasOption("merge"):
+            mergeSegments(fileName)
+        print("Done")
+        return
+
+    if hasOption("binary") and spimiBudget != None:
+        # the merged SPIMI blocks are written straight to disk, the whole index is never in memory
+        import diskindex
+        blockDir = tempfile.mkdtemp(prefix="spimi")
+        blockFiles, indexedDocs, extents = spimiInvert(data, int(float(spimiBudget) * 1024 * 1024), blockDir)
+        writer = diskindex.BinaryIndexWriter(fileName, indexedDocs, DocBitmap(), extents)
+        for term, item in mergeBlocks(blockFiles):
+            writer.add(term, item)
+        writer.close()
+        removeBlocks(blockFiles, blockDir)
+        removeSegments(fileName)
+        if hasOption("matrix"):
+            diskIndex = diskindex.DiskIndex(fileName)
+            TermDocMatrix().build(diskIndex).save(fileName + MATRIX_SUFFIX)
+            diskIndex.close()
+        print("Done")
+        return
+
     invertedIndexer = InvertedIndex()
-    data = CranFile(filePath)
-    for doc in data.docs:
-        invertedIndexer.indexDoc(doc)
+    if spimiBudget != None:
+        invertedIndexer.indexDocsSPIMI(data, int(float(spimiBudget) * 1024 * 1024))
+    elif processes > 1:
+        invertedIndexer.indexDocsParallel(data, processes)
+    else:
+        for doc in data:
+            invertedIndexer.indexDoc(doc)
 
-    invertedIndexer.storeData(fileName)
+    if hasOption("binary"):
+        import diskindex # diskindex imports this module
+        diskindex.writeBinaryIndex(invertedIndexer, fileName)
+    else:
+        invertedIndexer.storeData(fileName)
+    if hasOption("matrix"):
+        TermDocMatrix().build(invertedIndexer).save(fileName + MATRIX_SUFFIX)
+    removeSegments(fileName)
     print("Done")
    
 #python index.py CranfieldDataset/cran.all Data/tempFile
+#python index.py CranfieldDataset/cran.all Data/tempFile --processes=4
+#python index.py CranfieldDataset/cran.all Data/tempFile --spimi=64
+#python index.py new_documents.all Data/tempFile --append
+#python index.py CranfieldDataset/cran.all Data/tempFile.bin --spimi=64 --binary
+#python index.py CranfieldDataset/cran.all Data/tempFile --matrix
 if __name__ == '__main__':
     #test()
     indexingCranfield()
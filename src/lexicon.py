@@ -0,0 +1,312 @@
+'''
+sorted term dictionary
+
+the terms are sorted and front-coded in blocks of BLOCK_SIZE terms:
+the first term of a block is stored whole, every other term only stores the length
+of the prefix it shares with the previous term and the rest of the term.
+Sorted terms share long prefixes (stems of the same word family), so this takes
+less memory than a set or dict of strings, and terms are found with a binary search
+over the first terms of the blocks, then a scan of one block.
+
+the lexicon also gives the rank (ordinal) of each term, used by the binary index
+to find the statistics and postings of a term.
+'''
+import bisect
+import struct
+import numpy as np
+from array import array
+
+BLOCK_SIZE   = 16 # terms per front-coded block
+CACHE_BLOCKS = 64 # decoded blocks kept, a query looks up the same few terms many times
+
+
+##
+# @brief     A sorted, front-coded term dictionary with exact, prefix and range lookups.
+#            Terms are compared as utf-8 bytes, which is the same order as Python strings.
+#            The encoded lexicon can be used in place from a memory map (see from_bytes).
+#
+# @bug       None documented yet
+#
+class Lexicon:
+    ##
+    #    @param         self
+    #    @param         terms: sorted iterable of unique terms
+    #    @return        None
+    #    @brief         The constructor, it encodes the terms
+    #    @exception     ValueError if the terms are not sorted
+    ##
+    def __init__(self, terms=()):
+        blocks        = bytearray()
+        blockOffsets  = array('Q')
+        count         = 0
+        previous      = None
+        for term in terms:
+            encoded = term.encode("utf-8")
+            if previous != None and encoded <= previous:
+                raise ValueError("terms must be sorted and unique: " + term)
+            if count % BLOCK_SIZE == 0:
+                blockOffsets.append(len(blocks))
+                shared = 0
+            else:
+                shared = commonPrefix(previous, encoded)
+            blocks.extend(encodeNumber(shared))
+            blocks.extend(encodeNumber(len(encoded) - shared))
+            blocks.extend(encoded[shared:])
+            previous = encoded
+            count   += 1
+        blockOffsets.append(len(blocks))
+        self.__count        = count
+        self.__blocks       = bytes(blocks)
+        self.__blockOffsets = np.frombuffer(blockOffsets.tobytes(), dtype=np.uint64)
+        self.__cache        = {} # decoded blocks
+
+    ##
+    #   @brief         This method return the lexicon as bytes, to be saved:
+    #                  the number of terms and blocks, the block offsets and the blocks
+    #   @param         self
+    #   @return        bytes
+    #   @exception     None
+    ##
+    def to_bytes(self):
+        return (struct.pack("<QQ", self.__count, len(self.__blockOffsets)) + self.__blockOffsets.tobytes()
+                + bytes(self.__blocks))
+
+    ##
+    #   @brief         This method replaces the lexicon by saved bytes (see to_bytes).
+    #                  The bytes are not copied, so a memoryview of a memory map is read in place
+    #   @param         self
+    #   @param         data: bytes or memoryview
+    #   @return        self
+    #   @exception     None
+    ##
+    def from_bytes(self, data):
+        data                = memoryview(data)
+        self.__count, n     = struct.unpack("<QQ", data[:16])
+        self.__blockOffsets = np.frombuffer(data, dtype=np.uint64, count=n, offset=16)
+        self.__blocks       = data[16 + 8 * n:]
+        self.__cache        = {}
+        return self
+
+    def __getstate__(self):
+        return self.to_bytes()
+
+    def __setstate__(self, state):
+        self.from_bytes(state)
+
+    ##
+    #   @brief         This method decodes the terms of a block
+    #   @param         self
+    #   @param         b: block number
+    #   @return        terms: list[bytes]
+    #   @exception     None
+    ##
+    def __decode_block(self, b):
+        terms = self.__cache.get(b)
+        if terms != None:
+            return terms
+        data  = self.__blocks
+        pos   = int(self.__blockOffsets[b])
+        end   = int(self.__blockOffsets[b + 1])
+        terms = []
+        previous = b""
+        while pos < end:
+            shared, pos = decodeNumber(data, pos)
+            length, pos = decodeNumber(data, pos)
+            previous    = previous[:shared] + bytes(data[pos:pos + length])
+            pos        += length
+            terms.append(previous)
+        if len(self.__cache) >= CACHE_BLOCKS:
+            self.__cache.clear()
+        self.__cache[b] = terms
+        return terms
+
+    ##
+    #   @brief         This method decodes the first term of a block, used by the binary search
+    #   @param         self
+    #   @param         b: block number
+    #   @return        term: bytes
+    #   @exception     None
+    ##
+    def __block_head(self, b):
+        pos       = int(self.__blockOffsets[b]) + 1 # the first term shares no prefix
+        length, pos = decodeNumber(self.__blocks, pos)
+        return bytes(self.__blocks[pos:pos + length])
+
+    def __len__(self):
+        return self.__count
+
+    def __nBlocks(self):
+        return len(self.__blockOffsets) - 1
+
+    ##
+    #   @brief         This method return the term number i
+    #   @param         self
+    #   @param         i
+    #   @return        term:str
+    #   @exception     IndexError
+    ##
+    def term(self, i):
+        if i < 0 or i >= self.__count:
+            raise IndexError(i)
+        return self.__decode_block(i // BLOCK_SIZE)[i % BLOCK_SIZE].decode("utf-8")
+
+    ##
+    #   @brief         This method finds the rank of the first term that is not smaller than key
+    #   @param         self
+    #   @param         key: str
+    #   @return        rank: int, len(self) if all terms are smaller
+    #   @exception     None
+    ##
+    def lower_bound(self, key):
+        key = key.encode("utf-8")
+        # last block whose first term is <= key
+        lo, hi = 0, self.__nBlocks()
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.__block_head(mid) <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return 0
+        b = lo - 1
+        return b * BLOCK_SIZE + bisect.bisect_left(self.__decode_block(b), key)
+
+    ##
+    #   @brief         This method finds the rank of a term
+    #   @param         self
+    #   @param         term
+    #   @return        rank: int, -1 if the term is not in the lexicon
+    #   @exception     None
+    ##
+    def find(self, term):
+        i = self.lower_bound(term)
+        if i < self.__count and self.term(i) == term:
+            return i
+        return -1
+
+    def __contains__(self, term):
+        return self.find(term) >= 0
+
+    ##
+    #   @brief         This method finds the ranks of the terms starting with a prefix
+    #   @param         self
+    #   @param         prefix
+    #   @return        (first, end): the terms are the ranks first to end - 1
+    #   @exception     None
+    ##
+    def prefix(self, prefix):
+        first = self.lower_bound(prefix)
+        end   = first
+        while end < self.__count and self.term(end).startswith(prefix):
+            end += 1
+        return first, end
+
+    ##
+    #   @brief         This method finds the ranks of the terms between low (included) and high (excluded)
+    #   @param         self
+    #   @param         low
+    #   @param         high
+    #   @return        (first, end): the terms are the ranks first to end - 1
+    #   @exception     None
+    ##
+    def range(self, low, high):
+        first = self.lower_bound(low)
+        return first, max(first, self.lower_bound(high))
+
+    ##
+    #   @brief         This method return the terms of the ranks first to end - 1, in order
+    #   @param         self
+    #   @param         first
+    #   @param         end
+    #   @return        generator of terms
+    #   @exception     None
+    ##
+    def terms(self, first=0, end=None):
+        if end == None or end > self.__count:
+            end = self.__count
+        for i in range(first, end):
+            yield self.term(i)
+
+    def __iter__(self):
+        return self.terms()
+
+
+##
+#   @brief         This method return the length of the common prefix of two byte strings
+#   @param         a: bytes
+#   @param         b: bytes
+#   @return        int
+#   @exception     None
+##
+def commonPrefix(a, b):
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+##
+#   @brief         This method encodes a number with the variable-byte code (see codec.py)
+#   @param         n: int
+#   @return        bytes
+#   @exception     None
+##
+def encodeNumber(n):
+    out = bytearray()
+    while n >= 0x80:
+        out.append(n & 0x7F)
+        n >>= 7
+    out.append(n | 0x80)
+    return bytes(out)
+
+##
+#   @brief         This method decodes a number written by encodeNumber
+#   @param         data
+#   @param         pos: where the number starts
+#   @return        (number, position after the number)
+#   @exception     None
+##
+def decodeNumber(data, pos):
+    n, shift = 0, 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        n   |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            return n, pos
+        shift += 7
+
+
+##
+#   @brief     This method Is used for testing this Python script
+#
+#   @return        None
+#   @exception     None
+##
+def test():
+    ''' test your code thoroughly. put the testing cases here'''
+    words   = sorted(set(["aero", "aerodynam", "aeroelast", "aerofoil", "air", "airfoil", "b", "bifurc", "zurich", "über"]
+                         + ["term%03d" % i for i in range(100)]))
+    lexicon = Lexicon(words)
+    assert len(lexicon) == len(words) and list(lexicon) == words, "Error in encoding the lexicon"
+    assert all(lexicon.find(word) == i for i, word in enumerate(words)), "Error in finding terms"
+    assert lexicon.find("aer") == -1 and not "zzz" in lexicon and not "" in lexicon, "Error in finding missing terms"
+
+    first, end = lexicon.prefix("aero")
+    assert list(lexicon.terms(first, end)) == ["aero", "aerodynam", "aeroelast", "aerofoil"], "Error in prefix lookup"
+    first, end = lexicon.range("term010", "term020")
+    assert list(lexicon.terms(first, end)) == ["term%03d" % i for i in range(10, 20)], "Error in range lookup"
+    assert lexicon.prefix("zz") == (len(words) - 1, len(words) - 1) and lexicon.prefix("") == (0, len(words)), "Error in prefix lookup"
+
+    copy = Lexicon().from_bytes(lexicon.to_bytes())
+    assert list(copy) == words and copy.find("über") == words.index("über"), "Error in saving the lexicon"
+    try:
+        Lexicon(["b", "a"])
+        assert False, "unsorted terms accepted"
+    except ValueError:
+        pass
+    print("test Passed")
+
+if __name__ == '__main__':
+    test()
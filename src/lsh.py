@@ -0,0 +1,139 @@
+'''
+random-projection LSH for approximate cosine similarity
+
+every table hashes a tf-idf vector (weight log10(1 + tf) * idf) to LSH_BITS bits, the signs of its dot
+products with LSH_BITS random gaussian vectors: two vectors get the same bit with probability
+1 - angle / pi, so the documents in the bucket of the query are the ones with a small angle.
+A document is a candidate when it shares a bucket with the query in at least one of the LSH_TABLES tables,
+the bits of the query closest to a hyperplane can also be flipped to probe the nearby buckets.
+The candidates are then scored with the exact cosine (see QueryProcessor.vectorQuery).
+
+the tables are built with numpy only from the postings of an index, when a query first uses them.
+'''
+import math
+import numpy as np
+from index import splitField
+
+LSH_TABLES = 16  # hash tables
+LSH_BITS   = 6   # bits of a bucket key, less than 63
+LSH_PROBES = 2   # bits of the query flipped one at a time to probe more buckets of every table
+LSH_SEED   = 0   # the random hyperplanes are the same every time the tables are built
+
+
+##
+# @brief     The LSH tables of the documents of an index (InvertedIndex or DiskIndex).
+#            Documents indexed after the tables are built are not in them.
+#
+# @bug       None documented yet
+#
+class LSHIndex:
+    ##
+    #    @param         self
+    #    @param         tables
+    #    @param         bits
+    #    @param         seed
+    #    @return        None
+    #    @brief         The constructor, the tables are empty until they are built
+    #    @exception     None documented yet
+    ##
+    def __init__(self, tables=LSH_TABLES, bits=LSH_BITS, seed=LSH_SEED):
+        self.tables   = tables
+        self.bits     = bits
+        self.seed     = seed
+        self.__rows   = {}                    # term: its row in the hyperplanes
+        self.__planes = np.zeros((0, tables * bits)) # the term coordinates of the random vectors of all the tables
+        self.__keys   = []                    # sorted keys of the documents, one array per table
+        self.__docs   = []                    # docIDs in the order of the keys, one array per table
+
+    def __len__(self):
+        return self.tables
+
+    ##
+    #   @brief         This method hashes the documents of an index in every table
+    #   @param         self
+    #   @param         index
+    #   @return        self
+    #   @exception     None
+    ##
+    def build(self, index):
+        terms         = sorted(index.get_terms())
+        self.__rows   = dict((term, row) for row, term in enumerate(terms))
+        self.__planes = np.random.RandomState(self.seed).standard_normal((len(terms), self.tables * self.bits))
+        # dot products of every document vector and the random vectors, one term at a time
+        projections   = np.zeros((len(index.get_doc_lengths()), self.tables * self.bits))
+        for row, term in enumerate(terms):
+            docIDs, tfs = index.get_postings(term)
+            projections[docIDs] += np.outer(np.log10(tfs + 1.0) * index.idf(term), self.__planes[row])
+        # the documents with at least one term, deleted documents have no length
+        docs = np.flatnonzero(index.get_doc_lengths() > 0)
+        keys = self.__hash(projections[docs])
+        self.__keys = []
+        self.__docs = []
+        for table in range(self.tables):
+            order = np.argsort(keys[:, table], kind="stable")
+            self.__keys.append(keys[order, table])
+            self.__docs.append(docs[order].astype(np.int32))
+        return self
+
+    ##
+    #   @brief         This method turns the projections of vectors into a key per table
+    #   @param         self
+    #   @param         projections: np.ndarray(n, tables * bits)
+    #   @return        keys: np.ndarray(int64) (n, tables)
+    #   @exception     None
+    ##
+    def __hash(self, projections):
+        signs = projections.reshape(len(projections), self.tables, self.bits) > 0
+        return (signs * (np.int64(1) << np.arange(self.bits, dtype=np.int64))).sum(axis=2)
+
+    ##
+    #   @brief         This method returns the documents that share a bucket with a query vector
+    #   @param         self
+    #   @param         weights: {term: weight}, a query term "field:term" is hashed like the term
+    #   @param         probes: bits of the query flipped one at a time in every table, the closest to a hyperplane first
+    #   @return        docIDs:np.ndarray sorted
+    #   @exception     None
+    ##
+    def get_candidates(self, weights, probes=LSH_PROBES):
+        projection = np.zeros(self.tables * self.bits)
+        for term, weight in weights.items():
+            row = self.__rows.get(splitField(term)[1])
+            if row != None:
+                projection += weight * self.__planes[row]
+        key   = self.__hash(projection[np.newaxis])[0]
+        found = [np.zeros(0, dtype=np.int32)]
+        for table, margins in enumerate(projection.reshape(self.tables, self.bits)):
+            flips = np.argsort(np.abs(margins), kind="stable")[:probes]
+            for probe in [key[table]] + [key[table] ^ (1 << int(bit)) for bit in flips]:
+                begin = np.searchsorted(self.__keys[table], probe, side="left")
+                end   = np.searchsorted(self.__keys[table], probe, side="right")
+                found.append(self.__docs[table][begin:end])
+        return np.unique(np.concatenate(found))
+
+
+##
+#   @brief     This method Is used for testing this Python script
+#
+#   @return        None
+#   @exception     None
+##
+def test():
+    ''' test your code thoroughly. put the testing cases here'''
+    from diskindex import loadIndex
+    from cran import CranFile
+    index  = loadIndex("./Data/tempFile")
+    lsh    = LSHIndex().build(index)
+    words  = index.tokenizeDoc(CranFile("./CranfieldDataset/cran.all").docs[956])
+    vector = dict((word, math.log10(words.count(word) + 1) * index.idf(word)) for word in set(words))
+    assert 957 in lsh.get_candidates(vector, 0), "A document is not a candidate for its own vector"
+    assert set(lsh.get_candidates(vector, 0)) <= set(lsh.get_candidates(vector, 2)), "Error in probes"
+    # one bit splits the documents in two buckets, the opposite vector is in the other one
+    single   = LSHIndex(tables=1, bits=1).build(index)
+    opposite = dict((word, -weight) for word, weight in vector.items())
+    buckets  = single.get_candidates(vector, 0).tolist() + single.get_candidates(opposite, 0).tolist()
+    assert sorted(buckets) == np.flatnonzero(index.get_doc_lengths() > 0).tolist(), "Wrong buckets"
+    assert lsh.get_candidates({}, 0).tolist() == lsh.get_candidates({"doooooog": 1.0}, 0).tolist(), "Error in unknown terms"
+    print("test Passed")
+
+if __name__ == '__main__':
+    test()
@@ -7,6 +7,7 @@ Peter Norvig's python implementation of Spelling Corrector
 
 import re
 from collections import Counter
+from functools import lru_cache
 # augmented with additional stopwords from : https://www.ranks.nl/stopwords
 # get better results
 dd =["anyone","reality","empty", "non", "stop"]
@@ -22,6 +23,9 @@ def P(word, N=sum(WORDS.values())):
     "Probability of `word`."
     return WORDS[word] / N
 
+# the queries of an evaluation share words, a word missing from WORDS costs a walk of its edits2.
+# The cache is bounded so a long-running process does not keep every word it was asked about
+@lru_cache(maxsize=65536)
 def correction(word):
     "Most probable spelling correction for word."
     if word in dd: 
@@ -0,0 +1,97 @@
+'''
+positional intersection for phrase and proximity queries
+
+the positions of a term in a list of candidate documents are turned into sorted keys
+docID * POSITION_SHIFT + position, so the positions of all the candidates are compared
+at once with numpy instead of a loop over the documents:
+a phrase "a b c" matches where the keys of a, b - 1 and c - 2 are equal,
+"a NEAR/k b" matches where a key of b is at most k away from a key of a.
+The candidates come from the docID intersection, so only their positions are compared.
+'''
+import numpy as np
+
+POSITION_SHIFT = 1 << 32 # more than any position, keys of different documents are never close
+
+
+##
+#   @brief         This method returns the position keys of a term in the candidate documents
+#   @param         arrays: (docIDs, offsets, positions) of the term, see IndexItem.get_arrays
+#   @param         candidates: sorted array of docIDs
+#   @return        keys: sorted np.ndarray(int64), docID * POSITION_SHIFT + position
+#   @exception     None
+##
+def positionKeys(arrays, candidates):
+    docIDs, offsets, positions = arrays
+    candidates = np.asarray(candidates)
+    i      = np.searchsorted(docIDs, candidates)
+    i      = i[i < len(docIDs)]
+    i      = i[np.isin(docIDs[i], candidates)]
+    starts = offsets[i].astype(np.int64)
+    counts = offsets[i + 1].astype(np.int64) - starts
+    # index in positions of every occurrence: start of its posting + rank in the posting
+    firsts = np.cumsum(counts) - counts
+    index  = np.arange(int(counts.sum())) - np.repeat(firsts - starts, counts)
+    return np.repeat(docIDs[i].astype(np.int64), counts) * POSITION_SHIFT + positions[index]
+
+##
+#   @brief         This method finds the candidate documents holding a phrase: the terms at consecutive positions
+#   @param         termArrays: list of (docIDs, offsets, positions), one per term of the phrase, in order
+#   @param         candidates: sorted array of docIDs
+#   @return        docIDs: sorted np.ndarray
+#   @exception     None
+##
+def phraseDocs(termArrays, candidates):
+    # keys of the position where the phrase would start
+    keys = positionKeys(termArrays[0], candidates)
+    for shift, arrays in enumerate(termArrays[1:], 1):
+        if len(keys) == 0:
+            break
+        keys = np.intersect1d(keys, positionKeys(arrays, np.unique(keys // POSITION_SHIFT)) - shift, assume_unique=True)
+    return np.unique(keys // POSITION_SHIFT)
+
+##
+#   @brief         This method finds the candidate documents where two terms are at most k positions apart, in any order
+#   @param         arrays1: (docIDs, offsets, positions) of the first term
+#   @param         arrays2: (docIDs, offsets, positions) of the second term
+#   @param         k: int
+#   @param         candidates: sorted array of docIDs
+#   @return        docIDs: sorted np.ndarray
+#   @exception     None
+##
+def nearDocs(arrays1, arrays2, k, candidates):
+    keys1 = positionKeys(arrays1, candidates)
+    keys2 = positionKeys(arrays2, candidates)
+    if len(keys1) == 0 or len(keys2) == 0:
+        return np.zeros(0, dtype=np.int64)
+    # the closest occurrences of the second term are the ones just before and just after
+    after  = np.searchsorted(keys2, keys1)
+    before = np.maximum(after - 1, 0)
+    after  = np.minimum(after, len(keys2) - 1)
+    near   = (np.abs(keys2[after] - keys1) <= k) | (np.abs(keys1 - keys2[before]) <= k)
+    return np.unique(keys1[near] // POSITION_SHIFT)
+
+
+##
+#   @brief     This method Is used for testing this Python script
+#
+#   @return        None
+#   @exception     None
+##
+def test():
+    ''' test your code thoroughly. put the testing cases here'''
+    # positions of three terms in the documents 1, 2 and 5
+    boundary = (np.array([1, 2, 5]), np.array([0, 2, 3, 4]), np.array([3, 10, 7, 0]))
+    layer    = (np.array([1, 2, 5]), np.array([0, 1, 2, 4]), np.array([11, 1, 1, 9]))
+    flow     = (np.array([1, 5]),    np.array([0, 1, 2]),    np.array([12, 5]))
+    assert positionKeys(boundary, [2, 5]).tolist() == [2 * POSITION_SHIFT + 7, 5 * POSITION_SHIFT], "Wrong position keys"
+    assert phraseDocs([boundary, layer], [1, 2, 5]).tolist() == [1, 5], "Error in phrase"
+    assert phraseDocs([boundary, layer, flow], [1, 2, 5]).tolist() == [1], "Error in phrase"
+    assert phraseDocs([layer, boundary], [1, 2, 5]).tolist() == [], "Error in phrase order"
+    assert phraseDocs([boundary, layer], [2]).tolist() == [], "Error in phrase candidates"
+    assert nearDocs(boundary, layer, 1, [1, 2, 5]).tolist() == [1, 5], "Error in proximity"
+    assert nearDocs(layer, boundary, 6, [1, 2, 5]).tolist() == [1, 2, 5], "Error in proximity"
+    assert nearDocs(boundary, flow, 3, [1, 2, 5]).tolist() == [1], "Error in proximity"
+    print("test Passed")
+
+if __name__ == '__main__':
+    test()
@@ -7,9 +7,19 @@ query processing
 
 """Internal libraries"""
 from cran import CranFile
+from doc import Document
 from util import Tokenizer
 from cranqry import loadCranQry
-from index import Posting, InvertedIndex, IndexItem
+from index import Posting, InvertedIndex, IndexItem, FIELDS
+from diskindex import loadIndex
+from wildcard import isWildcard
+from positional import phraseDocs, nearDocs
+from queryparser import parseQuery, TERMS, AND, OR, NOT
+from tiered import TieredIndex
+from cluster import loadClusters, ClusterIndex
+from lsh import LSHIndex
+from termmatrix import TermDocMatrix, loadMatrix
+from codec import intersectSorted
 from operator import itemgetter 
 import math
 from collections import Counter
@@ -20,8 +30,21 @@ import sys
 import os
 import numpy as np
 import random
+import re
 from timeit import default_timer as timer
 
+# a query word restricted to a field: "title:word"
+FIELD_QUERY = re.compile(r'\b(' + '|'.join(FIELDS) + r'):(\S+)')
+# a wildcard query word: "aero*", "*sonic"
+WILDCARD_QUERY = re.compile(r'([\w*]*\*[\w*]*)')
+# a phrase: "boundary layer"
+PHRASE_QUERY = re.compile(r'"([^"]*)"')
+# a proximity operator between two words: boundary NEAR/3 layer
+NEAR_QUERY = re.compile(r'\bNEAR/(\d+)\b')
+# below this number of postings a vector query scores all its documents, finding the bound costs more than it saves
+# (the longest Cranfield queries have about 5000 postings), vectorQuery can be given another threshold
+PRUNE_MIN_POSTINGS = 8192
+
 class QueryProcessor:
     ##
     # 
@@ -33,16 +56,22 @@ class QueryProcessor:
     #    @brief         The constructor.  
     #                   This process is extremely expensive because it loads the entire pickle object into memory.
     #                   If we are only executing this for one query it is fine but if we are doing it 
-    #                   for the evaluation used the load query instead
+    #                   for the evaluation used the load query instead.
+    #                   An index saved in the binary format (diskindex.py) is memory-mapped instead, which is cheap
     #    @exception     None documented yet
     ##
     def __init__(self, query, index_file, collection):
         ''' index is the inverted index; collection is the document collection'''
         self.raw_query = query
-        self.index = InvertedIndex()
-        self.index = self.index.loadData(index_file)
+        self.index = loadIndex(index_file) # the binary format is memory-mapped instead of unpickled
         self.docs = collection
-        self.tokenizer = Tokenizer(known_words=set(self.index.get_items_inverted().keys()))
+        self.tokenizer = Tokenizer(known_words=self.index.get_terms())
+        self.index_file = index_file
+        self.tiered = TieredIndex(self.index) # impact-ordered postings, built when a query uses them
+        self.clusters = None # leaders and followers (see cluster.py), loaded when a query uses them
+        self.lsh = None # random-projection hash tables (see lsh.py), built when a query uses them
+        self.matrix = None # term-document matrix of the batch queries (see termmatrix.py), loaded when they are run
+        self.weighted = None # the matrix and its weights as scipy matrices, see weighted_matrix
         if self.raw_query:
             self.processed_query = self.preprocessing(self.raw_query)
 
@@ -60,9 +89,12 @@ class QueryProcessor:
 
     ##
     #   @brief         This method is used to load the next query for evaluation
+    #                  The query is parsed with the boolean operators AND, OR, NOT and parentheses (see queryparser.py)
+    #                  into self.query_tree, the words between operators are preprocessed by preprocessing_terms.
+    #                  The returned terms are the ones that are not under a NOT, used by the vector query
     #   @param         self
     #   @param         raw_query
-    #   @return        None
+    #   @return        terms:list
     #   @exception     None
     ## 
     def preprocessing(self,raw_query):
@@ -70,7 +102,146 @@ class QueryProcessor:
             also use the provided spelling corrector. Note that
             spelling corrector should be applied before stopword
             removal and stemming (why?)'''
-        return self.tokenizer.transpose_document_tokenized_stemmed_spelling(raw_query)
+        self.query_tree, terms, self.phrases, self.nears = self.parse_query(raw_query)
+        return terms
+
+    ##
+    #   @brief         This method parses and preprocesses a query like preprocessing, without loading it
+    #   @param         self
+    #   @param         raw_query
+    #   @return        (query_tree, terms:list, phrases:list[list[term]], nears:list[(term, term, k)])
+    #   @exception     None
+    ## 
+    def parse_query(self, raw_query):
+        query_tree = parseQuery(raw_query)
+        leaves     = query_tree.leaves() if query_tree != None else []
+        for leaf in leaves:
+            leaf.terms, leaf.phrases, leaf.nears = self.preprocessing_terms(leaf.text)
+        leaves     = query_tree.leaves(False) if query_tree != None else []
+        phrases    = [phrase for leaf in leaves for phrase in leaf.phrases]
+        nears      = [near for leaf in leaves for near in leaf.nears]
+        return query_tree, [term for leaf in leaves for term in leaf.terms], phrases, nears
+
+    ##
+    #   @brief         This method preprocesses words without boolean operators
+    #                  A phrase written "word word" matches the words at consecutive positions, 
+    #                  "word NEAR/k word" matches the two words at most k positions apart,
+    #                  their words are query terms and the position constraints are returned as phrases and nears
+    #                  for the boolean query (the vector query scores the words as terms)
+    #   @param         self
+    #   @param         text
+    #   @return        (terms:list, phrases:list[list[term]], nears:list[(term, term, k)])
+    #   @exception     None
+    ## 
+    def preprocessing_terms(self, text):
+        phrases = []
+        nears   = []
+        # the query terms and the distances of the proximity operators between them
+        items = []
+        # split keeps the captured phrases: [text, phrase, text, phrase, text]
+        parts = PHRASE_QUERY.split(text)
+        for i, part in enumerate(parts):
+            if i % 2 == 1:
+                phrase = self.tokenizer.transpose_document_tokenized_stemmed_spelling(part)
+                if len(phrase) > 1:
+                    phrases.append(phrase)
+                items.extend(phrase)
+                continue
+            # split keeps the captured distances: [text, k, text, k, text]
+            for j, text in enumerate(NEAR_QUERY.split(part)):
+                if j % 2 == 1:
+                    items.append(int(text))
+                else:
+                    items.extend(self.preprocessing_fields(text))
+        # "a NEAR/k b" is kept when a and b are plain terms (no field or wildcard)
+        for j in range(1, len(items) - 1):
+            if isinstance(items[j], int) and isPlainTerm(items[j - 1]) and isPlainTerm(items[j + 1]):
+                nears.append((items[j - 1], items[j + 1], items[j]))
+        return [item for item in items if not isinstance(item, int)], phrases, nears
+
+    ##
+    #   @brief         This method preprocesses a part of the query without phrases and proximity operators
+    #                  A word written "field:word" (field is title, author or body) only matches in that field,
+    #                  it becomes the query term "field:term" (see index.splitField)
+    #                  A word with "*" is a wildcard pattern, kept as it is and matched against the index terms (see wildcard.py)
+    #   @param         self
+    #   @param         text
+    #   @return        terms:list
+    #   @exception     None
+    ## 
+    def preprocessing_fields(self, text):
+        # split keeps the captured field and word: [text, field, word, text, field, word, text]
+        parts = FIELD_QUERY.split(text)
+        terms = self.preprocessing_text(parts[0])
+        for i in range(1, len(parts), 3):
+            field, word, text = parts[i:i + 3]
+            terms.extend(field + ":" + term for term in self.preprocessing_text(word))
+            terms.extend(self.preprocessing_text(text))
+        return terms
+
+    ##
+    #   @brief         This method preprocesses a part of the query without fields, the wildcard patterns are kept as they are
+    #   @param         self
+    #   @param         text
+    #   @return        terms:list
+    #   @exception     None
+    ## 
+    def preprocessing_text(self, text):
+        # split keeps the captured patterns: [text, pattern, text, pattern, text]
+        parts = WILDCARD_QUERY.split(text)
+        terms = self.tokenizer.transpose_document_tokenized_stemmed_spelling(parts[0])
+        for i in range(1, len(parts), 2):
+            terms.append(parts[i].lower())
+            terms.extend(self.tokenizer.transpose_document_tokenized_stemmed_spelling(parts[i + 1]))
+        return terms
+
+    ##
+    #   @brief         This method returns the sorted docIDs of a query term, only the ones in candidates if they are given.
+    #                  A wildcard pattern is the union (OR) of the terms it matches
+    #   @param         self
+    #   @param         term
+    #   @param         candidates: sorted np.ndarray or None
+    #   @return        docIDs:np.ndarray
+    #   @exception     KeyError
+    ## 
+    def term_docs(self, term, candidates=None):
+        terms = self.index.expand_wildcard(term) if isWildcard(term) else [term]
+        if candidates is None:
+            docIDs = [self.index.get_postings(t)[0] for t in terms]
+        else:
+            docIDs = [self.index.intersect(t, candidates) for t in terms]
+        if len(docIDs) == 1:
+            return docIDs[0]
+        return np.unique(np.concatenate(docIDs + [np.zeros(0, dtype=np.int32)]))
+
+    ##
+    #   @brief         This method returns the document frequency of a query term, used to order the boolean intersections.
+    #                  For a wildcard pattern it is the sum of the frequencies of the terms it matches
+    #   @param         self
+    #   @param         term
+    #   @return        df:int
+    #   @exception     None
+    ## 
+    def term_df(self, term):
+        if isWildcard(term):
+            return sum(self.index.get_df(t) for t in self.index.expand_wildcard(term))
+        return self.index.get_df(term)
+
+    ##
+    #   @brief         This method returns the query terms with the wildcard patterns replaced by the terms they match
+    #   @param         self
+    #   @param         processed_query: the terms of a query, None for the loaded query
+    #   @return        terms:list
+    #   @exception     None
+    ## 
+    def expanded_query(self, processed_query=None):
+        terms = []
+        for term in (self.processed_query if processed_query is None else processed_query):
+            if isWildcard(term):
+                terms.extend(self.index.expand_wildcard(term))
+            else:
+                terms.append(term)
+        return terms
 
     
     ##
@@ -88,46 +259,139 @@ class QueryProcessor:
             docs.sort(key=len) # notice it is still smart to order by size 
             return reduce(set.intersection,docs) 
         '''
-        if len(self.processed_query) == 0:
-            return[]
+        plan = self.plan(self.query_tree)
+        if plan == None:
+            return []
+        return [str(d) for d in self.evaluate(plan).tolist()]
 
-        ## checks that all of our query words are in the index, if not return [] ##
-        for w in self.processed_query:
-            if not w in self.index.get_items_inverted():
-                return []
+    ##
+    #   @brief         This method plans a parsed query: it removes the words without terms (stopwords only),
+    #                  estimates the number of documents of every node from the document frequencies
+    #                  and orders the operands of AND from the rarest, with the NOT operands last
+    #   @param         self
+    #   @param         node:QueryNode
+    #   @return        node:QueryNode, None if nothing is left
+    #   @exception     None
+    ## 
+    def plan(self, node):
+        if node == None:
+            return None
+        nDocs = self.index.get_total_number_Doc()
+        if node.op == TERMS:
+            if len(node.terms) == 0:
+                return None
+            ## a word that is not in the index matches no document ##
+            if any(not isWildcard(w) and not w in self.index for w in node.terms):
+                node.cost = 0
+            else:
+                node.cost = min(self.term_df(w) for w in node.terms)
+            return node
+        node.children = [child for child in map(self.plan, node.children) if child != None]
+        if len(node.children) == 0:
+            return None
+        if node.op == NOT:
+            node.cost = nDocs - node.children[0].cost
+        elif len(node.children) == 1:
+            return node.children[0]
+        elif node.op == OR:
+            node.cost = min(nDocs, sum(child.cost for child in node.children))
+        else:
+            # the NOT operands are differences against the candidates of the other operands
+            node.children.sort(key=lambda child: (child.op == NOT, child.cost))
+            node.cost = min(child.cost if child.op != NOT else nDocs for child in node.children)
+        return node
 
-        ## checks if we only have 1 term in the query and returns its posting list if we do ##
-        if len(self.processed_query) == 1:
-            return list(self.index.get_items_inverted()[self.processed_query[0]].get_posting_list().keys())
+    ##
+    #   @brief         This method evaluates a planned query, only for the candidates if they are given
+    #   @param         self
+    #   @param         node:QueryNode
+    #   @param         candidates: sorted np.ndarray or None for all the documents
+    #   @return        docIDs:np.ndarray
+    #   @exception     None
+    ## 
+    def evaluate(self, node, candidates=None):
+        if node.op == TERMS:
+            return self.terms_docs(node, candidates)
+        if node.op == NOT:
+            if candidates is None:
+                candidates = self.live_docs()
+            if len(candidates) == 0:
+                return candidates
+            return np.setdiff1d(candidates, self.evaluate(node.children[0], candidates), assume_unique=True)
+        if node.op == AND:
+            for child in node.children:
+                candidates = self.evaluate(child, candidates)
+                ## checks if we have already found operands totally disjoint from one another
+                if len(candidates) == 0:
+                    break
+            return candidates
+        results = np.zeros(0, dtype=np.int32)
+        for child in node.children:
+            results = np.union1d(results, self.evaluate(child, candidates))
+            ## all the candidates are found
+            if candidates is not None and len(results) == len(candidates):
+                break
+        return results
 
-        #### document_ids is a list of lists containing only document ids ####
-        document_ids = [list(self.index.get_items_inverted()[w].get_posting_list().keys()) for w in self.processed_query]
-    
-        # by sorting so that we start with the shortest list of documents we get a potential speed up
-        document_ids.sort(key=len)
-        results= document_ids[0]
-
-        ## iterates through each query word and does the intersection of docids from its posting list with all those before it ##
-        ## could be done faster if index was implemented as set or some other hash data structure
-        for p in document_ids[1:]:
-            intermediate=[]
-            i,j = 0,0
-            while i < len(results) and j < len(p): 
-                if int(results[i]) < int(p[j]): 
-                    i += 1
-                elif int(results[i]) > int(p[j]): 
-                    j+= 1
-                else: 
-                    intermediate.append(p[j]) 
-                    j += 1
-                    i += 1
-            results = intermediate
+    ##
+    #   @brief         This method returns the documents with all the terms of a run of words, which match its phrases and proximity operators
+    #   @param         self
+    #   @param         leaf:QueryNode with the terms
+    #   @param         candidates: sorted np.ndarray or None for all the documents
+    #   @return        docIDs:np.ndarray
+    #   @exception     None
+    ## 
+    def terms_docs(self, leaf, candidates=None):
+        ## checks that all of our query words are in the index, if not return [] ##
+        for w in leaf.terms:
+            if not isWildcard(w) and not w in self.index:
+                return np.zeros(0, dtype=np.int32)
+
+        # by starting with the rarest term the candidates are never more than the shortest posting list,
+        # then each other posting list is only searched for the candidates (see InvertedIndex.intersect)
+        results = candidates
+        for w in sorted(set(leaf.terms), key=self.term_df):
+            results = self.term_docs(w, results)
             
             ## checks if we have already found terms totally disjoint from one another
             if len(results) == 0:
                 return results
 
-        return results
+        return self.positional_filter(results, leaf.phrases, leaf.nears)
+
+    ##
+    #   @brief         This method returns the documents that are not deleted
+    #   @param         self
+    #   @return        docIDs:np.ndarray
+    #   @exception     None
+    ## 
+    def live_docs(self):
+        docIDs  = self.index.get_docs().to_array()
+        deleted = self.index.get_deleted()
+        if len(deleted) > 0:
+            docIDs = docIDs[~deleted.contains_array(docIDs)]
+        return docIDs
+
+    ##
+    #   @brief         This method keeps the candidate documents that match phrases and proximity operators,
+    #                  only the positions of the candidates are compared (see positional.py)
+    #   @param         self
+    #   @param         docIDs: sorted np.ndarray
+    #   @param         phrases: list[list[term]]
+    #   @param         nears: list[(term, term, k)]
+    #   @return        docIDs:np.ndarray
+    #   @exception     None
+    ## 
+    def positional_filter(self, docIDs, phrases, nears):
+        for phrase in phrases:
+            if len(docIDs) == 0:
+                return docIDs
+            docIDs = phraseDocs([self.index.find(t).get_arrays() for t in phrase], docIDs)
+        for a, b, k in nears:
+            if len(docIDs) == 0:
+                return docIDs
+            docIDs = nearDocs(self.index.find(a).get_arrays(), self.index.find(b).get_arrays(), k, docIDs)
+        return docIDs
 
     ##
     #   @brief         This method compute cosine similarity for two vectors
@@ -149,24 +413,46 @@ class QueryProcessor:
      
     ##
     #   @brief         This method compute vector model
+    #                  By default the cosine only uses the query terms of the documents (the query subspace),
+    #                  with fullNorm the document vectors are normalized by their whole norm, saved in the index.
+    #                  With prune the documents that can not be in the top k are not scored (see VectorScorer.candidates),
+    #                  the results are the same.
+    #                  With tiers only the documents in the first tiers of the impact-ordered postings are scored
+    #                  (see tiered.py), faster but some documents of the top k can be missed.
+    #                  With champions only the documents in the champion lists of the query words are scored
+    #                  (see IndexStats), all the documents when there are less than k of them, like with tiers
+    #                  some documents of the top k can be missed.
+    #                  With clusters the query is compared to the cluster leaders and only the followers of its
+    #                  nearest leaders are scored (see cluster.py), all the documents when there are less than k of them.
+    #                  With lsh only the documents in the buckets of the query in the LSH tables are scored (see lsh.py),
+    #                  all the documents when there are less than k of them.
+    #                  Only one of tiers, champions, clusters and lsh can be used by a query
     #   @param         self
     #   @param         k
+    #   @param         fullNorm: boolean
+    #   @param         prune: boolean
+    #   @param         tiers: None to score all the documents that can be in the top k, 
+    #                  or the number of tiers that can be read, 1 is the fastest
+    #   @param         champions: boolean
+    #   @param         clusters: None, or the number of nearest leaders whose followers are scored
+    #   @param         lsh: boolean
+    #   @param         pruneMinPostings: with prune, the documents are only pruned when the query words have
+    #                  at least this number of postings
+    #   @param         processed_query: the terms of another query (see parse_query), None for the loaded query
     #   @return        cosines: dict{docID: score}
     #   @bug           Fixed
-    #   @exception     ValueError
+    #   @exception     ValueError when more than one of tiers, champions, clusters and lsh is given
     ## 
-    def vectorQuery(self, k):
+    def vectorQuery(self, k, fullNorm=False, prune=True, tiers=None, champions=False, clusters=None, lsh=False,
+                    pruneMinPostings=PRUNE_MIN_POSTINGS, processed_query=None):
         ''' vector query processing, using the cosine similarity. '''
+        if [tiers != None, bool(champions), clusters != None, bool(lsh)].count(True) > 1:
+            raise ValueError("only one of tiers, champions, clusters and lsh can be used")
         #ToDo: return top k pairs of (docID, similarity), ranked by their cosine similarity with the query in the descending order
         # You can use term frequency or TFIDF to construct the vectors
-        if len(self.processed_query) == 0:
-            all_docids = set()
-            for _,v in self.index.get_items_inverted().items():
-                all_docids.update(v.get_posting_list().keys())
-            return [(str(id),0) for id in sorted(list(map(int,all_docids)))[:k]]
-
-        query_words = list(set(self.processed_query))
-        idfs= [self.index.idf(w) for w in query_words]
+        processed_query = self.expanded_query(processed_query)
+        if len(processed_query) == 0:
+            return self.zero_scores(k)
 
         # undefined behavior from document on what to do if k is larger than the corpus
         try:
@@ -176,78 +462,446 @@ class QueryProcessor:
             print(err.args)
             return 
 
+        query_words, idfs, query_tfidf = self.query_vector(processed_query)
+
         # below we define behavior if none of the words in the query are in any documents
         # this behavior was not defined in instructions so no documents seems most appropriate
         # if you used google and got 0 cosine it would return 0 documents even if you wanted the 50 most relevant
-        if set(idfs) == {0}: 
-            all_docids = set()
-            for _,v in self.index.get_items_inverted().items():
-                all_docids.update(v.get_posting_list().keys())
-            return [(str(id),0) for id in sorted(list(map(int,all_docids)))[:k]]
+        if len(query_words) == 0: 
+            return self.zero_scores(k)
+
+        ### NCC change if a term in a quiry does not appear in our inverted index Forget/Discount term 
+        #### postings should be a list of lists which contains word postings
+        postings = [self.index.get_postings(w) for w in query_words if w in self.index ]
+
+        scorer = VectorScorer(query_tfidf, idfs, postings, self.index.get_doc_norms() if fullNorm else None)
+        if tiers != None:
+            document_ids, scores = self.tiered_scores(scorer, query_words, k, tiers)
+        else:
+            document_ids = None
+            if champions:
+                document_ids = self.champion_docs(scorer, query_words, k)
+            elif clusters != None:
+                document_ids = self.cluster_docs(scorer, k, clusters)
+            elif lsh:
+                document_ids = self.lsh_docs(scorer, query_words, k)
+            if document_ids is None and prune:
+                document_ids = scorer.candidates(k, pruneMinPostings)
+            elif document_ids is None:
+                document_ids = scorer.all_docs()
+            scores = scorer.score(document_ids)
+        return self.ranking(document_ids, scores, k)
+
+    ##
+    #   @brief         This method ranks many queries at once, each result is the one of vectorQuery(k, fullNorm).
+    #                  The query vectors are the rows of a sparse matrix, multiplied once by the term-document matrix
+    #                  (see termmatrix.py) for the dot products and once for the squared norms of the documents
+    #                  in the query subspaces, then the top k of every row is taken.
+    #                  The words of a query are added in the order of vectorQuery, so the scores are the same.
+    #                  A query with a field term, or that vectorQuery answers without scores, is run with vectorQuery
+    #   @param         self
+    #   @param         queries: list of raw queries
+    #   @param         k
+    #   @param         fullNorm: boolean
+    #   @return        results: list, the result of vectorQuery for every query
+    #   @exception     ImportError if scipy is not installed
+    ## 
+    def batchVectorQuery(self, queries, k, fullNorm=False):
+        from scipy.sparse import csr_matrix
+        matrix  = self.term_matrix()
+        results = [None] * len(queries)
+        batch   = [] # (query number, query_tfidf, matrix rows of the query words)
+        for i, query in enumerate(queries):
+            # the loaded query is not changed
+            processed_query = self.expanded_query(self.parse_query(query)[1])
+            query_words, idfs, query_tfidf = self.query_vector(processed_query)
+            rows = [matrix.get_row(w) for w in query_words]
+            if len(query_words) == 0 or -1 in rows or k > self.index.get_total_number_Doc():
+                results[i] = self.vectorQuery(k, fullNorm, processed_query=processed_query)
+            else:
+                batch.append((i, query_tfidf, rows))
+        if len(batch) == 0:
+            return results
+
+        documents, squares = self.weighted_matrix(matrix)
+        queryRows = csr_matrix((np.concatenate([query_tfidf for i, query_tfidf, rows in batch]),
+                                np.concatenate([rows for i, query_tfidf, rows in batch]),
+                                np.cumsum([0] + [len(rows) for i, query_tfidf, rows in batch])),
+                               shape=(len(batch), matrix.shape()[0]))
+        dotProducts = queryRows.dot(documents)
+        queryRows.data[:] = 1
+        docSquares  = queryRows.dot(squares) # squared norm of the documents in the query subspaces
+        dotProducts.sort_indices()
+        docSquares.sort_indices()
+        docNorms    = self.index.get_doc_norms()
+        for row, (i, query_tfidf, rows) in enumerate(batch):
+            begin, end   = dotProducts.indptr[row], dotProducts.indptr[row + 1]
+            document_ids = matrix.get_docIDs()[dotProducts.indices[begin:end]]
+            if fullNorm:
+                scores = dotProducts.data[begin:end] / (math.sqrt(np.dot(query_tfidf, query_tfidf)) * docNorms[document_ids])
+            else:
+                querySquare = 0
+                for x in query_tfidf:
+                    querySquare += x*x
+                scores = dotProducts.data[begin:end] / np.sqrt(querySquare * docSquares.data[begin:end])
+            results[i] = self.ranking(document_ids, np.array(roundScores(scores, 4)), k)
+        return results
+
+    ##
+    #   @brief         This method returns the weights log10(1 + tf) * idf of the documents, like VectorScorer,
+    #                  and their squares as scipy matrices. They are computed again when the matrix changes
+    #   @param         self
+    #   @param         matrix:TermDocMatrix
+    #   @return        (weights, squares):scipy.sparse.csr_matrix
+    #   @exception     ImportError if scipy is not installed
+    ## 
+    def weighted_matrix(self, matrix):
+        from scipy.sparse import csr_matrix
+        if self.weighted == None or self.weighted[0] is not matrix:
+            tfs, indices, indptr = matrix.get_arrays("tf")
+            tfs           = tfs.astype(np.int64)
+            weights       = logTfTable(int(tfs.max()) if len(tfs) > 0 else 0)[tfs] * np.repeat(matrix.get_idfs(), np.diff(indptr))
+            self.weighted = (matrix, csr_matrix((weights, indices, indptr), shape=matrix.shape()),
+                             csr_matrix((weights * weights, indices, indptr), shape=matrix.shape()))
+        return self.weighted[1:]
+
+    ##
+    #   @brief         This method returns the term-document matrix of the index, the saved one is loaded first.
+    #                  It is built again when the index changed since the matrix was built (see InvertedIndex.get_version)
+    #   @param         self
+    #   @return        matrix:TermDocMatrix
+    #   @exception     None
+    ## 
+    def term_matrix(self):
+        if self.matrix == None:
+            self.matrix = loadMatrix(self.index_file)
+        if self.matrix == None or self.matrix.get_version() != self.index.get_version():
+            self.matrix = TermDocMatrix().build(self.index)
+        return self.matrix
+
+    ##
+    #   @brief         This method returns the top k of the scored documents, with the documents of zero_scores
+    #                  when there are less than k
+    #   @param         self
+    #   @param         document_ids: np.ndarray
+    #   @param         scores: np.ndarray
+    #   @param         k
+    #   @return        list[(docID, score)]
+    #   @exception     None
+    ## 
+    def ranking(self, document_ids, scores, k):
+        # a consistent ordering of documents: score descending then docID ascending
+        document_ids, scores = topK(document_ids, scores, k)
+        ret = [(str(d),s) for d, s in zip(document_ids.tolist(), scores.tolist())]
+        if len(ret) < k:
+            ret.extend(self.zero_scores(k - len(ret), document_ids))
+        return ret
+
+    ##
+    #   @brief         This method returns the query words of the index and their tf-idf weight in the query
+    #   @param         self
+    #   @param         processed_query: the query terms, with the wildcards expanded
+    #   @return        (query_words, idfs, query_tfidf:np.ndarray), empty when no word is in the index
+    #   @exception     None
+    ## 
+    def query_vector(self, processed_query):
+        query_words = list(set(processed_query))
+        idfs= [self.index.idf(w) for w in query_words]
 
         # removes any words that have 0 idf as that means they didn't appear in the corpus, means save memory
         # probably not necessary to turn it into lists, and may actually be more appropriate to leave as tuples
-        idfs,query_words = map(list,zip(*[i for i in list(zip(idfs,query_words)) if not i[0] == 0]))
+        pairs = [i for i in list(zip(idfs,query_words)) if not i[0] == 0]
+        if len(pairs) == 0:
+            return [], [], np.zeros(0)
+        idfs,query_words = map(list,zip(*pairs))
 
         #Calculates tfs of relevant words
-        query_term_counter = Counter(self.processed_query)
+        query_term_counter = Counter(processed_query)
         query_tf_vector = [round(math.log10(query_term_counter[w]+1),4) for w in query_words] 
 
         #Other way of doing tf
         #query_tf_vector = [round(1 + math.log10(query_term_counter[w]),4) if query_term_counter[w] > 0 else 0 for w in query_words]
-    
+        return query_words, idfs, np.multiply(query_tf_vector , idfs)
 
+    ##
+    #   @brief         This method scores the documents of the first tiers of the query words (see tiered.py),
+    #                  one more tier is read until the top k is the same as with the previous tier or tiers tiers are read
+    #   @param         self
+    #   @param         scorer:VectorScorer
+    #   @param         query_words
+    #   @param         k
+    #   @param         tiers: maximum number of tiers
+    #   @return        (docIDs, scores): np.ndarray
+    #   @exception     None
+    ## 
+    def tiered_scores(self, scorer, query_words, k, tiers):
+        document_ids = np.zeros(0, dtype=np.int64)
+        scores       = np.zeros(0)
+        previous     = None
+        for tier in range(max(1, min(tiers, len(self.tiered)))):
+            found = np.zeros(scorer.size, dtype=bool)
+            for w in query_words:
+                found[self.tiered.get_docs(w, tier)] = True
+            # the scores do not depend on the other candidates, only the new documents of the tier are scored
+            found[document_ids] = False
+            new          = np.flatnonzero(found)
+            document_ids = np.concatenate((document_ids, new))
+            scores       = np.concatenate((scores, scorer.score(new)))
+            order        = np.argsort(document_ids, kind="stable")
+            document_ids = document_ids[order]
+            scores       = scores[order]
+            top          = topK(document_ids, scores, k)[0]
+            ## the top k is stable when it has k documents and the last tier did not change it
+            if len(top) == k and previous is not None and np.array_equal(top, previous):
+                break
+            previous = top
+        return document_ids, scores
 
-        ### NCC change if a term in a quiry does not appear in our inverted index Forget/Discount term 
-        #### postings should be a list of lists which contains word postings
+    ##
+    #   @brief         This method returns the union of the champion lists of the query words (see IndexStats)
+    #   @param         self
+    #   @param         scorer:VectorScorer
+    #   @param         query_words
+    #   @param         k
+    #   @return        docIDs: np.ndarray sorted, None when there are less than k documents
+    #   @exception     None
+    ## 
+    def champion_docs(self, scorer, query_words, k):
+        found = np.zeros(scorer.size, dtype=bool)
+        for w in query_words:
+            found[self.index.get_champions(w)] = True
+        document_ids = np.flatnonzero(found)
+        if len(document_ids) < k:
+            return None
+        return document_ids
 
-        postings = [self.index.get_items_inverted()[w].get_posting_list() for w in query_words if w in self.index.get_items_inverted() ]
-      
-        document_ids = set().union(*postings)
-        document_tfs = {d:[0]*len(query_words) for d in document_ids}
-
-        for inx, term in enumerate(postings):
-            for document_id, posting in term.items():
-                #log normalization
-                document_tfs[document_id][inx] = math.log10(posting.term_freq()+1)
-                
-                #Other
-                # tf = posting.term_freq()
-                # if tf > 0 :
-                #     tf = 1 + math.log10(tf)
-                # else:
-                #     tf = 0
-                # document_tfs[document_id][inx] = tf
-
-        query_tfidf = np.multiply(query_tf_vector , idfs)
-
-        cosines = Counter({d: self.cosine_similarity(query_tfidf,np.multiply(d_tf , idfs)) for d,d_tf in document_tfs.items() })
-        # this has to be a list as dict are not sorted...
-        # need a consistent ordering of documents when multiple documents have the same score we first sort on score then docid, very slow 
-        # if we know k or know the number of documents we could use numpy to preallocate memory which means we would not have to use append and could just use copy
-        temp_k = k
-        scores = sorted(list(set(cosines.values())),reverse=True)
-        ret = []
-        for s in scores:
-            docs_with_score_s = sorted([int(d) for d,v in cosines.items() if v == s])
-            if len(docs_with_score_s) >= temp_k:
-                docs_with_score_s = docs_with_score_s[:temp_k]
-                ret.extend([(str(d),s) for d in docs_with_score_s])
-                temp_k=0
-                break
-            else:
-                temp_k = temp_k-len(docs_with_score_s)
-                ret.extend([(str(d),s) for d in docs_with_score_s])
-        if not temp_k == 0:
-            all_docids = set()
-            for _,v in self.index.get_items_inverted().items():
-                all_docids.update(v.get_posting_list().keys())
-
-            ret.extend([(str(j),0) for j in sorted(list(map(int,all_docids.difference({i[0] for i in ret}))))[:temp_k]])
-        return ret
+    ##
+    #   @brief         This method returns the followers of the nearest leaders of the query that have a query word.
+    #                  The saved clusters are loaded the first time, they are built if they were not saved with the index
+    #   @param         self
+    #   @param         scorer:VectorScorer
+    #   @param         k
+    #   @param         leaders: number of leaders
+    #   @return        docIDs: np.ndarray sorted, None when there are less than k documents
+    #   @exception     None
+    ## 
+    def cluster_docs(self, scorer, k, leaders):
+        if self.clusters == None:
+            self.clusters = loadClusters(self.index_file)
+        if self.clusters == None:
+            self.clusters = ClusterIndex().build(self.index)
+        nearest = scorer.matching(self.clusters.get_leaders())
+        nearest = topK(nearest, scorer.score(nearest), leaders)[0]
+        document_ids = scorer.matching(self.clusters.get_followers(nearest))
+        if len(document_ids) < k:
+            return None
+        return document_ids
+
+    ##
+    #   @brief         This method returns the documents in the buckets of the query vector that have a query word
+    #   @param         self
+    #   @param         scorer:VectorScorer
+    #   @param         query_words
+    #   @param         k
+    #   @return        docIDs: np.ndarray sorted, None when there are less than k documents
+    #   @exception     None
+    ## 
+    def lsh_docs(self, scorer, query_words, k):
+        if self.lsh == None:
+            self.lsh = LSHIndex().build(self.index)
+        document_ids = scorer.matching(self.lsh.get_candidates(dict(zip(query_words, scorer.query_weights.tolist()))))
+        if len(document_ids) < k:
+            return None
+        return document_ids
+
+    ##
+    #   @brief         This method returns the documents used when there are less than k documents with a score:
+    #                  the first documents (by docID) with at least one term, with a score of 0
+    #   @param         self
+    #   @param         k
+    #   @param         exclude: np.ndarray of docIDs already returned
+    #   @return        list[(docID, 0)]
+    #   @exception     None
+    ## 
+    def zero_scores(self, k, exclude=()):
+        # the documents with at least one term are the ones with a length, kept up to date by the index
+        docIDs = np.flatnonzero(self.index.get_doc_lengths() > 0)[:k + len(exclude)]
+        if len(exclude) > 0:
+            docIDs = docIDs[~np.isin(docIDs, exclude)]
+        return [(str(d),0) for d in docIDs[:max(k, 0)].tolist()]
 
     
 
+##
+# @brief     The cosine scores of a vector query for a list of candidate documents, term at a time:
+#            the scores are accumulated in arrays indexed by docID, each query term adds its contributions in one step.
+#            The terms are added in the order of the query words, so the sums are the same as a loop over 
+#            the vector of each document, and a document gets the same score whatever the other candidates are.
+#
+# @bug       None documented yet
+#
+class VectorScorer:
+    ##
+    #    @param         self
+    #    @param         query_weights: np.ndarray, tf-idf of the query words
+    #    @param         idfs: list, idf of the query words
+    #    @param         postings: list of (docIDs, tfs), one per query word
+    #    @param         docNorms: np.ndarray indexed by docID to normalize by the whole document vector,
+    #                   None for the cosine in the query subspace
+    #    @return        None
+    #    @brief         The constructor
+    #    @exception     None documented yet
+    ##
+    def __init__(self, query_weights, idfs, postings, docNorms=None):
+        self.query_weights = np.asarray(query_weights, dtype=np.float64)
+        self.idfs          = idfs
+        self.postings      = postings
+        self.docNorms      = docNorms
+        self.size          = 1 + max((int(docIDs[-1]) for docIDs, tfs in postings if len(docIDs) > 0), default=0)
+        self.logTfs        = logTfTable(max((int(tfs.max()) for docIDs, tfs in postings if len(tfs) > 0), default=0))
+        querySquare = 0
+        for x in query_weights:
+            querySquare += x*x
+        self.querySquare   = querySquare
+        self.queryNorm     = math.sqrt(np.dot(query_weights, query_weights))
+
+    ##
+    #   @brief         This method returns the documents with at least one query word
+    #   @param         self
+    #   @param         words: indexes of the query words, all by default
+    #   @return        docIDs: sorted np.ndarray
+    #   @exception     None
+    ##
+    def all_docs(self, words=None):
+        found = np.zeros(self.size, dtype=bool)
+        for i in (range(len(self.postings)) if words is None else words):
+            found[self.postings[i][0]] = True
+        return np.flatnonzero(found)
+
+    ##
+    #   @brief         This method returns the candidate documents with at least one query word, 
+    #                  they are looked up in the postings
+    #   @param         self
+    #   @param         candidates: sorted np.ndarray of docIDs
+    #   @return        docIDs: sorted np.ndarray
+    #   @exception     None
+    ##
+    def matching(self, candidates):
+        found = np.zeros(self.size, dtype=bool)
+        for docIDs, tfs in self.postings:
+            found[intersectSorted(candidates, docIDs)] = True
+        return np.flatnonzero(found)
+
+    ##
+    #   @brief         This method computes the rounded cosine of candidate documents.
+    #                  A posting list longer than the candidates is not read, the candidates are looked up in it
+    #   @param         self
+    #   @param         candidates: sorted np.ndarray of docIDs
+    #   @return        scores: np.ndarray, rounded to 4 digits
+    #   @exception     None
+    ##
+    def score(self, candidates):
+        dotProducts = np.zeros(self.size)
+        docSquares  = np.zeros(self.size) # squared norm of the document vectors in the query subspace
+        for query_weight, idf, (docIDs, tfs) in zip(self.query_weights, self.idfs, self.postings):
+            if len(docIDs) > 2 * len(candidates) and len(docIDs) > 0:
+                found  = np.searchsorted(docIDs, candidates)
+                found[found == len(docIDs)] = len(docIDs) - 1
+                found  = found[docIDs[found] == candidates]
+                docIDs = docIDs[found]
+                tfs    = tfs[found]
+            #log normalization
+            weights = self.logTfs[tfs] * idf
+            dotProducts[docIDs] += query_weight * weights
+            docSquares[docIDs]  += weights * weights
+        if self.docNorms is not None:
+            scores = dotProducts[candidates] / (self.queryNorm * self.docNorms[candidates])
+        else:
+            scores = dotProducts[candidates] / np.sqrt(self.querySquare * docSquares[candidates])
+        return np.array(roundScores(scores, 4))
+
+    ##
+    #   @brief         This method returns the documents that can be in the top k (MaxScore).
+    #                  By Cauchy-Schwarz a document with only the query words S has a cosine of at most
+    #                  sqrt(sum of the squared query weights of S) / |query|, whatever its tfs (the full norm only makes it smaller).
+    #                  The documents with the query word of highest weight are scored to find theta, a score reached by k documents.
+    #                  The words of lowest weight whose bound together is below theta are not essential:
+    #                  a document with only these words can not be in the top k, nor tie with it,
+    #                  so the candidates are the documents with an essential word
+    #   @param         self
+    #   @param         k
+    #   @param         minPostings: all the documents are returned when the query words have less postings
+    #   @return        docIDs: sorted np.ndarray
+    #   @exception     None
+    ##
+    def candidates(self, k, minPostings=PRUNE_MIN_POSTINGS):
+        order = np.argsort(self.query_weights ** 2, kind="stable")
+        first = self.postings[order[-1]][0]
+        if len(order) == 1 or len(first) <= k or k <= 0 or sum(len(docIDs) for docIDs, tfs in self.postings) < minPostings:
+            return self.all_docs()
+        theta  = np.partition(self.score(first), len(first) - k)[len(first) - k]
+        bounds = np.sqrt(np.cumsum(self.query_weights[order] ** 2) / self.querySquare)
+        # a rounded score is at least theta when the score is at least theta - 0.00005, 1e-9 covers the float errors
+        skipped = int(np.count_nonzero(bounds + 1e-9 < theta - 0.00005))
+        return self.all_docs(order[skipped:])
+
+
+##
+#   @brief         This method returns log10(tf + 1) for every tf up to maxTf, computed with math.log10 like the document vectors
+#   @param         maxTf: int
+#   @return        np.ndarray(float64) indexed by tf
+#   @exception     None
+## 
+def logTfTable(maxTf):
+    return np.array([math.log10(tf + 1) for tf in range(maxTf + 1)])
+
+##
+#   @brief         This method rounds scores like round(score, digits) for each score.
+#                  numpy rounds x * 10**digits to an integer, which only differs from round
+#                  when x * 10**digits is almost half way between two integers, these scores are rounded with round
+#   @param         scores: np.ndarray
+#   @param         digits: int
+#   @return        scores: list[float]
+#   @exception     None
+## 
+def roundScores(scores, digits):
+    scaled  = scores * 10.0 ** digits
+    rounded = (np.rint(scaled) / 10.0 ** digits).tolist()
+    for i in np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6).tolist():
+        rounded[i] = round(float(scores[i]), digits)
+    return rounded
+
+##
+#   @brief         This method selects the k best scores, ordered by score descending then docID ascending.
+#                  np.partition finds the k-th best score without sorting all the scores,
+#                  the documents with that score are taken by docID
+#   @param         docIDs: sorted np.ndarray
+#   @param         scores: np.ndarray
+#   @param         k
+#   @return        (docIDs, scores): np.ndarray
+#   @exception     None
+## 
+def topK(docIDs, scores, k):
+    k = max(k, 0)
+    if len(scores) > k:
+        kth    = np.partition(scores, len(scores) - k)[len(scores) - k] if k > 0 else np.inf
+        above  = np.flatnonzero(scores > kth)
+        ties   = np.flatnonzero(scores == kth)[:k - len(above)]
+        keep   = np.concatenate((above, ties))
+        docIDs = docIDs[keep]
+        scores = scores[keep]
+    order = np.lexsort((docIDs, -scores))
+    return docIDs[order], scores[order]
+
+##
+#   @brief         This method checks if a query term is a plain term: no field and no wildcard
+#   @param         term
+#   @return        boolean
+#   @exception     None
+## 
+def isPlainTerm(term):
+    return isinstance(term, str) and not isWildcard(term) and not ":" in term
+
 
 #needed
 def test():
@@ -445,8 +1099,140 @@ def test():
     qp.loadQuery(vtest_queries[9])
     vtest10 = qp.vectorQuery(3)
     assert not vtest10 == vtest9 and not vtest10[1][1] == 704
+    ## VTEST 11: the cosine with the whole document norm is not more than the cosine in the query subspace
+    qp.loadQuery(vtest_queries[3])
+    subspace = dict(qp.vectorQuery(20))
+    vtest11  = qp.vectorQuery(20, fullNorm=True)
+    assert len(vtest11) == 20 and all(0 < s <= subspace.get(d, 1) for d, s in vtest11 if d in subspace)
+    assert vtest11 == sorted(vtest11, key=lambda x: (-x[1], int(x[0])))
+    ## VTEST 12: top k with ties at the k-th score, taken by docID
+    docIDs, scores = topK(np.array([2, 3, 5, 8, 9]), np.array([.5, .9, .5, .5, .7]), 3)
+    assert docIDs.tolist() == [3, 9, 2] and scores.tolist() == [.9, .7, .5] and topK(docIDs, scores, 0)[0].tolist() == []
+    ## VTEST 13: the pruned top k is the same as the top k of all the documents
+    for q in vtest_queries + ["what similarity laws must be obeyed when constructing aeroelastic models of heated high speed aircraft"]:
+        qp.loadQuery(q)
+        for k in [1, 3, 10]:
+            assert qp.vectorQuery(k, pruneMinPostings=0) == qp.vectorQuery(k) == qp.vectorQuery(k, prune=False)
+            assert qp.vectorQuery(k, True, pruneMinPostings=0) == qp.vectorQuery(k, True) == qp.vectorQuery(k, True, False)
+    # the default threshold: a long posting list of low weight is not essential
+    docIDs  = np.arange(2 * PRUNE_MIN_POSTINGS, dtype=np.int32)
+    scorer  = VectorScorer([1.0, 0.1], [1.0, 0.1], [(docIDs[::100], np.full(len(docIDs[::100]), 3)), (docIDs, np.ones(len(docIDs), dtype=np.int64))])
+    assert scorer.candidates(10).tolist() == docIDs[::100].tolist() and len(scorer.candidates(10, len(docIDs) * 2)) == len(docIDs)
+    pruned  = topK(scorer.candidates(10), scorer.score(scorer.candidates(10)), 10)
+    assert [x.tolist() for x in pruned] == [x.tolist() for x in topK(scorer.all_docs(), scorer.score(scorer.all_docs()), 10)]
+    ## VTEST 14: the tiered query only scores the documents of the first tiers, with their exact score
+    qp.loadQuery(vtest_queries[3])
+    exact   = qp.vectorQuery(qp.index.get_total_number_Doc(), True)
+    vtest14 = qp.vectorQuery(10, True, tiers=1)
+    assert len(vtest14) == 10 and set(vtest14) <= set(exact) and vtest14[0] == exact[0]
+    assert vtest14 == sorted(vtest14, key=lambda x: (-x[1], int(x[0])))
+    ## VTEST 15: the champion lists give exact scores, and all the documents are scored when they are too short
+    vtest15 = qp.vectorQuery(10, True, champions=True)
+    assert len(vtest15) == 10 and set(vtest15) <= set(exact) and vtest15[0] == exact[0]
+    qp.loadQuery("bifurc")
+    assert qp.vectorQuery(5, champions=True) == qp.vectorQuery(5)
+    ## VTEST 16: the cluster query only scores the followers of the nearest leaders, with their exact score
+    qp.loadQuery(vtest_queries[3])
+    vtest16 = qp.vectorQuery(10, True, clusters=3)
+    assert len(vtest16) == 10 and set(vtest16) <= set(exact)
+    assert qp.vectorQuery(10, True, clusters=len(qp.clusters)) == qp.vectorQuery(10, True)
+    ## VTEST 17: the LSH query only scores the documents in the buckets of the query, with their exact score
+    vtest17 = qp.vectorQuery(10, True, lsh=True)
+    assert len(vtest17) == 10 and set(vtest17) <= set(exact)
+    for options in [dict(champions=True, lsh=True), dict(tiers=1, clusters=3)]:
+        try:
+            qp.vectorQuery(10, **options)
+            assert False, "Candidate options used together"
+        except ValueError:
+            pass
+    ## VTEST 18: the batch query gives the results of vectorQuery, for the queries it can not batch too
+    batch = vtest_queries + ["title:flow boundary", "", "doooooog", "aero* flow"]
+    for fullNorm in [False, True]:
+        results = []
+        for q in batch:
+            qp.loadQuery(q)
+            results.append(qp.vectorQuery(10, fullNorm))
+        assert qp.batchVectorQuery(batch, 10, fullNorm) == results
+    # the loaded query is kept and the weighted matrices are computed once
+    weighted = qp.weighted
+    loaded   = qp.vectorQuery(3)
+    qp.batchVectorQuery(batch[:2], 3)
+    assert qp.vectorQuery(3) == loaded and qp.raw_query == batch[-1] and qp.weighted is weighted
     print("Vector Tests: PASSED")
 
+    ## FIELD TESTS: a field query term only matches in that field
+    print("Field Tests")
+    qp.loadQuery("experimental")
+    everywhere = set(qp.booleanQuery())
+    qp.loadQuery("title:experimental")
+    inTitle = set(qp.booleanQuery())
+    assert qp.processed_query == ["title:experiment"] and 0 < len(inTitle) < len(everywhere) and inTitle <= everywhere
+    qp.loadQuery("author:dooooog")
+    assert qp.booleanQuery() == [] 
+    qp.loadQuery("body:boundary title:layer")
+    assert len(qp.vectorQuery(3)) == 3 and qp.vectorQuery(3)[0][1] > 0
+    print("Field Tests: PASSED")
+
+    ## WILDCARD TESTS: a wildcard query term is the OR of the terms it matches
+    print("Wildcard Tests")
+    qp.loadQuery("Aerodynam*")
+    assert qp.processed_query == ["aerodynam*"] and "aerodynam" in qp.expanded_query()
+    wildcard = set(qp.booleanQuery())
+    qp.loadQuery("aerodynamic")
+    assert set(qp.booleanQuery()) <= wildcard
+    qp.loadQuery("bifurc* title:*flow")
+    assert qp.processed_query == ["bifurc*", "title:*flow"] and all(t.startswith("title:") for t in qp.expanded_query()[1:])
+    qp.loadQuery("xqz* boundary")
+    assert qp.booleanQuery() == [] and qp.expanded_query() == ["boundari"]
+    print("Wildcard Tests: PASSED")
+
+    ## PHRASE TESTS: a phrase or proximity query only keeps the documents where the words are close
+    print("Phrase Tests")
+    qp.loadQuery("layer boundary")
+    everywhere = set(qp.booleanQuery())
+    qp.loadQuery('"layer boundary"')
+    phrase = qp.booleanQuery()
+    assert qp.phrases == [["layer", "boundari"]] and 0 < len(phrase) < len(everywhere) and set(phrase) <= everywhere
+    qp.loadQuery('"boundary layer"')
+    assert len(qp.booleanQuery()) > len(phrase)
+    qp.loadQuery("layer NEAR/1 boundary")
+    assert qp.nears == [("layer", "boundari", 1)] and set(phrase) < set(qp.booleanQuery()) <= everywhere
+    qp.loadQuery('"supersonic flow" NEAR/2 wedge')
+    assert qp.processed_query == ["superson", "flow", "wedg"] and qp.nears == [("flow", "wedg", 2)]
+    print("Phrase Tests: PASSED")
+
+    ## OPERATOR TESTS: AND, OR, NOT and parentheses
+    print("Operator Tests")
+    results = {}
+    for q in ["supersonic", "hypersonic", "flow"]:
+        qp.loadQuery(q)
+        results[q] = set(qp.booleanQuery())
+    qp.loadQuery("(supersonic OR hypersonic) AND flow")
+    assert set(qp.booleanQuery()) == (results["supersonic"] | results["hypersonic"]) & results["flow"]
+    qp.loadQuery("flow NOT supersonic")
+    assert set(qp.booleanQuery()) == results["flow"] - results["supersonic"] and qp.processed_query == ["flow"]
+    qp.loadQuery("NOT flow")
+    assert len(qp.booleanQuery()) == qp.index.get_total_number_Doc() - len(results["flow"])
+    qp.loadQuery("supersonic OR doooooog")
+    assert set(qp.booleanQuery()) == results["supersonic"]
+    qp.loadQuery("NOT the")
+    assert qp.booleanQuery() == []
+    print("Operator Tests: PASSED")
+
+    ## DELETE TESTS: a deleted document is not returned anymore
+    print("Delete Tests")
+    matrix = qp.term_matrix()
+    qp.index.deleteDoc("957")
+    qp.loadQuery(btest_queries[0])
+    assert qp.booleanQuery() == ['1232']
+    assert qp.vectorQuery(3)[0] == ('1232', 1) and not '957' in [d for d, _ in qp.vectorQuery(3)]
+    # the matrix of the batch queries is built again after the index changed
+    assert qp.batchVectorQuery([btest_queries[0]], 3) == [qp.vectorQuery(3)] and qp.term_matrix() is not matrix
+    matrix = qp.term_matrix()
+    qp.index.updateDoc(Document("1232", "", "", "bifurcation flow"))
+    assert qp.batchVectorQuery([btest_queries[0]], 3) == [qp.vectorQuery(3)] and qp.term_matrix() is not matrix
+    print("Delete Tests: PASSED")
+
 #needed
 def query():
     ''' the main query processing program, using QueryProcessor'''
@@ -508,9 +1294,8 @@ def query():
  #           print("Run:",i+1, "\nTime for boolean model on Query (",numberOfQueries,") \nTime:", end - start, "\n") 
             bresults.append(end-start)
             start = timer()
-            for __, queryText in dictOfQuery.items():    
-                #listOfDocIDAndSimilarity = queryProcessor.vectorQuery(k)
-                queryProcessor.vectorQuery(k)
+            # all the queries are ranked together (see QueryProcessor.batchVectorQuery)
+            queryProcessor.batchVectorQuery(list(dictOfQuery.values()), k)
             end = timer()
 #            print("Run:",i+1, "\nTime for Vector model on Query (",numberOfQueries,") \nTime:", end - start, "\n") 
             vresults.append(end-start)
@@ -0,0 +1,206 @@
+'''
+boolean query language
+
+a query is made of words combined with the operators AND, OR, NOT (written in capitals)
+and parentheses, for example:  (supersonic OR hypersonic) AND flow NOT "boundary layer".
+Words next to each other without an operator are combined with AND, so a query without
+operators means the same as before: all its words.
+NOT binds tighter than AND, which binds tighter than OR.
+A run of words between operators is kept as its raw text (a TERMS node), it is preprocessed
+by the query processor like a whole query (phrases, NEAR/k, fields and wildcards included).
+
+the parser is lenient, as the queries are typed by users: a missing ")" is added,
+a stray ")" or an operator without operand is ignored.
+'''
+import re
+
+AND = "AND"
+OR  = "OR"
+NOT = "NOT"
+TERMS = "TERMS"
+
+# the operators, parentheses and phrases ("..." can hold parentheses or capital words)
+QUERY_TOKENS = re.compile(r'("[^"]*"|\(|\)|\bAND\b|\bOR\b|\bNOT\b)')
+
+
+##
+# @brief     A node of a parsed query: TERMS (a run of words), AND, OR or NOT.
+#            The query processor fills terms, phrases and nears of the TERMS nodes
+#            and the estimated number of documents (cost) of every node when it plans the query
+#
+# @bug       None documented yet
+#
+class QueryNode:
+    ##
+    #    @param         self
+    #    @param         op: TERMS, AND, OR or NOT
+    #    @param         children: list of QueryNode
+    #    @param         text: raw text of a TERMS node
+    #    @return        None
+    #    @brief         The constructor
+    #    @exception     None documented yet
+    ##
+    def __init__(self, op, children=None, text=None):
+        self.op       = op
+        self.children = children if children != None else []
+        self.text     = text
+        self.terms    = []
+        self.phrases  = []
+        self.nears    = []
+        self.cost     = 0
+
+    ##
+    #   @brief         This method returns the TERMS nodes of the query, in order
+    #   @param         self
+    #   @param         negated: boolean, also return the nodes under a NOT
+    #   @return        nodes:list
+    #   @exception     None
+    ##
+    def leaves(self, negated=True):
+        if self.op == TERMS:
+            return [self]
+        if self.op == NOT and not negated:
+            return []
+        return [leaf for child in self.children for leaf in child.leaves(negated)]
+
+    def __repr__(self):
+        if self.op == TERMS:
+            return repr(self.text)
+        return self.op + "(" + ", ".join(repr(child) for child in self.children) + ")"
+
+
+##
+#   @brief         This method builds an operator node without the missing (None) operands
+#   @param         op: AND, OR or NOT
+#   @param         children: list of QueryNode or None
+#   @return        node:QueryNode, None if no operand is left
+#   @exception     None
+##
+def makeNode(op, children):
+    children = [child for child in children if child != None]
+    if len(children) == 0:
+        return None
+    if len(children) == 1 and op != NOT:
+        return children[0]
+    return QueryNode(op, children)
+
+
+##
+# @brief     A recursive descent parser of the query language
+#
+# @bug       None documented yet
+#
+class QueryParser:
+    ##
+    #    @param         self
+    #    @param         query: str
+    #    @return        None
+    #    @brief         The constructor, it splits the query in operators, parentheses and runs of words
+    #    @exception     None documented yet
+    ##
+    def __init__(self, query):
+        self.tokens = []
+        for part in QUERY_TOKENS.split(query):
+            if part in (AND, OR, NOT, "(", ")"):
+                self.tokens.append(part)
+            elif part.strip() == "":
+                continue
+            elif len(self.tokens) > 0 and isinstance(self.tokens[-1], QueryNode):
+                # a phrase and the words around it are one run of words
+                self.tokens[-1].text += " " + part
+            else:
+                self.tokens.append(QueryNode(TERMS, text=part))
+        self.pos = 0
+
+    def __peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def __next(self):
+        token     = self.__peek()
+        self.pos += 1
+        return token
+
+    ##
+    #   @brief         This method parses the whole query, a stray ")" is ignored
+    #   @param         self
+    #   @return        node:QueryNode, None for an empty query
+    #   @exception     None
+    ##
+    def parse(self):
+        children = []
+        while self.__peek() != None:
+            if self.__peek() == ")":
+                self.__next()
+                continue
+            children.append(self.__parse_or())
+        return makeNode(AND, children)
+
+    def __parse_or(self):
+        children = [self.__parse_and()]
+        while self.__peek() == OR:
+            self.__next()
+            children.append(self.__parse_and())
+        return makeNode(OR, children)
+
+    def __parse_and(self):
+        children = [self.__parse_not()]
+        while not self.__peek() in (None, ")", OR):
+            if self.__peek() == AND:
+                self.__next()
+            children.append(self.__parse_not())
+        return makeNode(AND, children)
+
+    def __parse_not(self):
+        if self.__peek() == NOT:
+            self.__next()
+            return makeNode(NOT, [self.__parse_not()])
+        return self.__parse_primary()
+
+    def __parse_primary(self):
+        token = self.__next()
+        if token == "(":
+            node = self.__parse_or()
+            if self.__peek() == ")":
+                self.__next()
+            return node
+        if isinstance(token, QueryNode):
+            return token
+        # an operator or ")" where an operand was expected, it is left to the caller
+        if token != None:
+            self.pos -= 1
+        return None
+
+
+##
+#   @brief         This method parses a query
+#   @param         query: str
+#   @return        node:QueryNode, None for an empty query
+#   @exception     None
+##
+def parseQuery(query):
+    return QueryParser(query).parse()
+
+
+##
+#   @brief     This method Is used for testing this Python script
+#
+#   @return        None
+#   @exception     None
+##
+def test():
+    ''' test your code thoroughly. put the testing cases here'''
+    assert parseQuery("boundary layer flow").text == "boundary layer flow", "Error in a query without operators"
+    assert repr(parseQuery("a OR b c")) == "OR('a ', ' b c')", "Error in OR"
+    assert repr(parseQuery("(a OR b) AND NOT c")) == "AND(OR('a ', ' b'), NOT(' c'))", "Error in parentheses"
+    assert repr(parseQuery("a NOT b OR c")) == "OR(AND('a ', NOT(' b ')), ' c')", "Error in precedence"
+    assert repr(parseQuery('"a (b) OR c" d')) == "'\"a (b) OR c\"  d'", "Error in phrases"
+    assert repr(parseQuery("a NEAR/2 b AND title:c*")) == "AND('a NEAR/2 b ', ' title:c*')", "Error in words"
+    assert repr(parseQuery("((a OR b) c")) == "AND(OR('a ', ' b'), ' c')", "Error in a missing parenthesis"
+    assert repr(parseQuery(") a AND OR b NOT")) == "OR(' a ', ' b ')", "Error in stray operators"
+    assert parseQuery("") == None and parseQuery("AND ( )") == None, "Error in empty queries"
+    node = parseQuery("a AND (NOT b OR c)")
+    assert [leaf.text for leaf in node.leaves()] == ["a ", " b ", " c"] and [leaf.text for leaf in node.leaves(False)] == ["a ", " c"], "Error in leaves"
+    print("test Passed")
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,250 @@
+'''
+sparse term-document matrix
+
+the postings of an index as a CSR matrix: one row per term (in sorted order), one column per live document
+(in docID order), so the scoring and the evaluation can use sparse linear algebra instead of the nested
+dicts of InvertedIndex.tf_doc and InvertedIndex.tf_idf.
+The matrix is kept as the numpy arrays of the CSR format (indptr, indices, tfs), the weights of a variant
+are computed from the tfs when they are needed:
+    tf          the term frequency
+    tfidf       log10(1 + tf) * idf, the weights of InvertedIndex.tf_idf
+    normalized  tfidf divided by the norm of the document, the columns are unit vectors
+to_scipy returns a scipy.sparse.csr_matrix when scipy is installed.
+
+the matrix is saved next to the index ("python index.py cran.all index_file --matrix") in index_file.matrix.npz,
+with the version of the index it was built from (see InvertedIndex.get_version) so a stale matrix can be found.
+'''
+import os
+import shutil
+import tempfile
+import numpy as np
+
+MATRIX_SUFFIX = ".matrix.npz"                 # the matrix of "index_file" is saved in "index_file.matrix.npz"
+VARIANTS      = ("tf", "tfidf", "normalized") # the weights of the matrix
+
+
+##
+# @brief     The term-document matrix of an index (InvertedIndex or DiskIndex), with the maps
+#            term <-> row and docID <-> column. Deleted documents have no column.
+#
+# @bug       None documented yet
+#
+class TermDocMatrix:
+    ##
+    #    @param         self
+    #    @return        None
+    #    @brief         The constructor, the matrix is empty until it is built or loaded
+    #    @exception     None documented yet
+    ##
+    def __init__(self):
+        self.__terms   = np.zeros(0, dtype=str)      # term of every row, sorted
+        self.__docIDs  = np.zeros(0, dtype=np.int32) # docID of every column, sorted
+        self.__indptr  = np.zeros(1, dtype=np.int64) # where the postings of every row start
+        self.__indices = np.zeros(0, dtype=np.int32) # column of every posting
+        self.__tfs     = np.zeros(0, dtype=np.int32) # tf of every posting
+        self.__idfs    = np.zeros(0)                 # idf of every row
+        self.__norms   = np.zeros(0)                 # norm of the tf-idf vector of every column
+        self.__version = None                        # version of the index the matrix was built from
+
+    ##
+    #   @brief         This method builds the matrix from the live postings of an index
+    #   @param         self
+    #   @param         index
+    #   @return        self
+    #   @exception     None
+    ##
+    def build(self, index):
+        terms   = sorted(index.get_terms())
+        docIDs  = index.get_docs().to_array()
+        if len(index.get_deleted()) > 0:
+            docIDs = docIDs[~index.get_deleted().contains_array(docIDs)]
+        lengths = np.zeros(len(terms), dtype=np.int64)
+        indices = []
+        tfs     = []
+        for row, term in enumerate(terms):
+            postings, frequencies = index.get_postings(term)
+            lengths[row] = len(postings)
+            indices.append(np.searchsorted(docIDs, postings))
+            tfs.append(frequencies)
+        norms   = index.get_doc_norms()
+        self.__terms   = np.array(terms, dtype=str)
+        self.__docIDs  = docIDs.astype(np.int32)
+        self.__indptr  = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+        self.__indices = np.concatenate([np.zeros(0, dtype=np.int32)] + indices).astype(np.int32)
+        self.__tfs     = np.concatenate([np.zeros(0, dtype=np.int32)] + tfs).astype(np.int32)
+        self.__idfs    = np.array([index.idf(term) for term in terms], dtype=np.float64)
+        self.__norms   = np.array([norms[d] if d < len(norms) else 0.0 for d in docIDs.tolist()], dtype=np.float64)
+        self.__version = index.get_version()
+        return self
+
+    ##
+    #   @brief         This method returns the shape of the matrix
+    #   @param         self
+    #   @return        (rows, columns)
+    #   @exception     None
+    ##
+    def shape(self):
+        return (len(self.__terms), len(self.__docIDs))
+
+    def get_terms(self):
+        return self.__terms
+
+    def get_docIDs(self):
+        return self.__docIDs
+
+    def get_idfs(self):
+        return self.__idfs
+
+    ##
+    #   @brief         This method returns the version of the index the matrix was built from
+    #   @param         self
+    #   @return        version:str, None for a matrix saved without it
+    #   @exception     None
+    ##
+    def get_version(self):
+        return self.__version
+
+    ##
+    #   @brief         This method returns the row of a term
+    #   @param         self
+    #   @param         term
+    #   @return        row:int, -1 if the term is not in the matrix
+    #   @exception     None
+    ##
+    def get_row(self, term):
+        row = int(np.searchsorted(self.__terms, term))
+        if row < len(self.__terms) and self.__terms[row] == term:
+            return row
+        return -1
+
+    ##
+    #   @brief         This method returns the column of a document
+    #   @param         self
+    #   @param         docID:int
+    #   @return        column:int, -1 if the document is not in the matrix
+    #   @exception     None
+    ##
+    def get_column(self, docID):
+        column = int(np.searchsorted(self.__docIDs, docID))
+        if column < len(self.__docIDs) and self.__docIDs[column] == docID:
+            return column
+        return -1
+
+    ##
+    #   @brief         This method returns the weights of every posting, in the order of the CSR arrays
+    #   @param         self
+    #   @param         variant: one of VARIANTS
+    #   @return        data:np.ndarray(float64)
+    #   @exception     ValueError for an unknown variant
+    ##
+    def get_data(self, variant="tfidf"):
+        if not variant in VARIANTS:
+            raise ValueError("unknown matrix variant: " + str(variant))
+        if variant == "tf":
+            return self.__tfs.astype(np.float64)
+        data = np.log10(self.__tfs + 1.0) * np.repeat(self.__idfs, np.diff(self.__indptr))
+        if variant == "normalized":
+            norms = self.__norms[self.__indices]
+            data  = np.divide(data, norms, out=np.zeros_like(data), where=norms > 0)
+        return data
+
+    ##
+    #   @brief         This method returns the CSR arrays of a variant
+    #   @param         self
+    #   @param         variant: one of VARIANTS
+    #   @return        (data, indices, indptr)
+    #   @exception     ValueError for an unknown variant
+    ##
+    def get_arrays(self, variant="tfidf"):
+        return self.get_data(variant), self.__indices, self.__indptr
+
+    ##
+    #   @brief         This method returns the matrix as a scipy sparse matrix
+    #   @param         self
+    #   @param         variant: one of VARIANTS
+    #   @return        matrix:scipy.sparse.csr_matrix
+    #   @exception     ImportError if scipy is not installed, ValueError for an unknown variant
+    ##
+    def to_scipy(self, variant="tfidf"):
+        from scipy.sparse import csr_matrix
+        return csr_matrix(self.get_arrays(variant), shape=self.shape())
+
+    ##
+    #   @brief         This method saves the matrix
+    #   @param         self
+    #   @param         fileName: ending with .npz
+    #   @return        None
+    #   @exception     IOError
+    ##
+    def save(self, fileName):
+        np.savez(fileName, terms=self.__terms, docIDs=self.__docIDs, indptr=self.__indptr, indices=self.__indices,
+                 tfs=self.__tfs, idfs=self.__idfs, norms=self.__norms, version=np.array(self.__version or ""))
+
+    ##
+    #   @brief         This method loads a saved matrix
+    #   @param         self
+    #   @param         fileName
+    #   @return        self
+    #   @exception     IOError
+    ##
+    def load(self, fileName):
+        with np.load(fileName) as data:
+            self.__terms   = data["terms"]
+            self.__docIDs  = data["docIDs"]
+            self.__indptr  = data["indptr"]
+            self.__indices = data["indices"]
+            self.__tfs     = data["tfs"]
+            self.__idfs    = data["idfs"]
+            self.__norms   = data["norms"]
+            self.__version = (str(data["version"]) or None) if "version" in data.files else None
+        return self
+
+
+##
+#   @brief         This method loads the matrix saved next to an index
+#   @param         indexFile
+#   @return        matrix:TermDocMatrix, None if it was not saved
+#   @exception     None
+##
+def loadMatrix(indexFile):
+    if not os.path.exists(indexFile + MATRIX_SUFFIX):
+        return None
+    return TermDocMatrix().load(indexFile + MATRIX_SUFFIX)
+
+
+##
+#   @brief     This method Is used for testing this Python script
+#
+#   @return        None
+#   @exception     None
+##
+def test():
+    ''' test your code thoroughly. put the testing cases here'''
+    from diskindex import loadIndex
+    index  = loadIndex("./Data/tempFile")
+    matrix = TermDocMatrix().build(index)
+    assert matrix.shape() == (len(index.get_terms()), index.get_total_number_Doc()), "Wrong shape"
+    data, indices, indptr = matrix.get_arrays("tf")
+    row = matrix.get_row("bifurc")
+    assert matrix.get_docIDs()[indices[indptr[row]:indptr[row + 1]]].tolist() == [957, 1232], "Wrong columns"
+    assert data[indptr[row]:indptr[row + 1]].tolist() == [1.0, 1.0] and matrix.get_row("doooooog") == -1, "Wrong rows"
+    # tf_idf rounds the log of the tf to 4 digits
+    tfidf = dict(list(weight.items())[0] for weight in index.tf_idf(index.tf_doc(), index.idfDict())["957"])
+    assert abs(matrix.to_scipy("tfidf")[row, matrix.get_column(957)] - tfidf["bifurc"]) < 1e-3, "Wrong tf-idf"
+    normalized = matrix.to_scipy("normalized")
+    lengths = np.sqrt(np.asarray(normalized.multiply(normalized).sum(axis=0))).ravel()
+    assert np.allclose(lengths[lengths > 0], 1.0) and matrix.get_column(471) != -1, "Columns not normalized"
+    testDir = tempfile.mkdtemp(prefix="termmatrix")
+    matrix.save(os.path.join(testDir, "TestMatrix.npz"))
+    loaded = TermDocMatrix().load(os.path.join(testDir, "TestMatrix.npz"))
+    shutil.rmtree(testDir)
+    assert loaded.get_version() == index.get_version() != None and loaded.get_row("bifurc") == row and np.array_equal(loaded.get_data("normalized"), matrix.get_data("normalized")), "Error in loading the matrix"
+    try:
+        matrix.get_data("bm25")
+        assert False, "Unknown variant accepted"
+    except ValueError:
+        pass
+    print("test Passed")
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,148 @@
+'''
+impact-ordered, tiered postings
+
+the postings of a term are also kept sorted by impact: the tf-idf weight of the term in the document
+divided by the norm of the document vector, which is what the term adds to the cosine of the document.
+The sorted postings are split in tiers, tier 0 holds the highest impacts of the term.
+A vector query can score only the documents of the first tiers of its terms (see QueryProcessor.vectorQuery):
+the documents missing from the candidates are the ones where every query term has a low impact,
+so they rarely reach the top k. Reading more tiers trades latency for recall.
+
+the tiers are built from the postings and idf of the index when a term is first used,
+and built again after the index changed (see InvertedIndex.get_version).
+'''
+import math
+import numpy as np
+
+TIER_FRACTIONS = (0.1, 0.3, 1.0) # end of each tier, as a fraction of the posting list
+TIER_MIN       = 32              # postings of the first tier at least, short lists are a single tier
+
+
+##
+# @brief     The impact-ordered tiers of the posting lists of an index (InvertedIndex or DiskIndex).
+#            The idf and the norms change with every indexed or deleted document, so the tiers are
+#            cleared when the version of the index is not the one they were built from.
+#
+# @bug       None documented yet
+#
+class TieredIndex:
+    ##
+    #    @param         self
+    #    @param         index
+    #    @return        None
+    #    @brief         The constructor
+    #    @exception     None documented yet
+    ##
+    def __init__(self, index):
+        self.index = index
+        self.clear()
+
+    ##
+    #   @brief         This method forgets the tiers, they are built again from the index when they are used
+    #   @param         self
+    #   @return        None
+    #   @exception     None
+    ##
+    def clear(self):
+        self.__docs    = {} # term: docIDs sorted by impact
+        self.__ends    = {} # term: end of each tier in the docIDs
+        self.__version = self.index.get_version() # version of the index the tiers are built from
+
+    ##
+    #   @brief         This method clears the tiers when the index changed since they were built
+    #   @param         self
+    #   @return        None
+    #   @exception     None
+    ##
+    def __check_version(self):
+        if self.__version != self.index.get_version():
+            self.clear()
+
+    def __len__(self):
+        return len(TIER_FRACTIONS)
+
+    ##
+    #   @brief         This method sorts the postings of a term by impact and splits them in tiers
+    #   @param         self
+    #   @param         term: term or "field:term"
+    #   @return        None
+    #   @exception     KeyError
+    ##
+    def __build(self, term):
+        docIDs, tfs = self.index.get_postings(term)
+        impacts     = np.log10(tfs + 1.0) * self.index.idf(term) / self.index.get_doc_norms()[docIDs]
+        # the highest impact first, then the lowest docID
+        self.__docs[term] = docIDs[np.lexsort((docIDs, -impacts))]
+        self.__ends[term] = tierEnds(len(docIDs))
+
+    ##
+    #   @brief         This method builds the tiers of all the terms
+    #   @param         self
+    #   @return        self
+    #   @exception     None
+    ##
+    def build(self):
+        self.__check_version()
+        for term in self.index.get_terms():
+            if not term in self.__docs:
+                self.__build(term)
+        return self
+
+    ##
+    #   @brief         This method returns the documents of the first tiers of a term
+    #   @param         self
+    #   @param         term
+    #   @param         tier: the tiers 0 to tier are returned
+    #   @return        docIDs: np.ndarray, by impact
+    #   @exception     KeyError
+    ##
+    def get_docs(self, term, tier):
+        self.__check_version()
+        if not term in self.__docs:
+            self.__build(term)
+        docIDs = self.__docs[term][:self.__ends[term][min(tier, len(TIER_FRACTIONS) - 1)]]
+        if len(self.index.get_deleted()) > 0:
+            docIDs = docIDs[~self.index.get_deleted().contains_array(docIDs)]
+        return docIDs
+
+
+##
+#   @brief         This method returns the end of every tier of a posting list
+#   @param         df: length of the posting list
+#   @return        ends: list[int]
+#   @exception     None
+##
+def tierEnds(df):
+    return [min(df, max(TIER_MIN, int(math.ceil(df * fraction)))) for fraction in TIER_FRACTIONS]
+
+
+##
+#   @brief     This method Is used for testing this Python script
+#
+#   @return        None
+#   @exception     None
+##
+def test():
+    ''' test your code thoroughly. put the testing cases here'''
+    from diskindex import loadIndex
+    from doc import Document
+    assert tierEnds(10) == [10, 10, 10] and tierEnds(1000) == [100, 300, 1000], "Wrong tiers"
+    index  = loadIndex("./Data/tempFile")
+    tiered = TieredIndex(index)
+    docIDs, tfs = index.get_postings("flow")
+    first  = tiered.get_docs("flow", 0)
+    every  = tiered.get_docs("flow", len(tiered) - 1)
+    assert len(first) == tierEnds(len(docIDs))[0] and sorted(every.tolist()) == docIDs.tolist(), "Error in tiers"
+    impacts = dict(zip(docIDs.tolist(), (np.log10(tfs + 1.0) / index.get_doc_norms()[docIDs]).tolist()))
+    assert min(impacts[d] for d in first.tolist()) >= max(impacts[d] for d in every[len(first):].tolist()), "Tiers not sorted by impact"
+    assert tiered.get_docs("title:flow", 2).tolist() != [] and len(tiered.build().get_docs("bifurc", 0)) == 2, "Error in tiers"
+    index.deleteDoc(int(first[0]))
+    assert not first[0] in tiered.get_docs("flow", 0), "Deleted document in tiers"
+    # the idf and norms changed, the tiers are the ones of the new index
+    assert tiered.get_docs("flow", 0).tolist() == TieredIndex(index).get_docs("flow", 0).tolist(), "Tiers not built again after a delete"
+    index.indexDoc(Document("1401", "", "", "flow flow flow"))
+    assert 1401 in tiered.get_docs("flow", len(tiered) - 1).tolist(), "Indexed document not in tiers"
+    print("test Passed")
+
+if __name__ == '__main__':
+    test()
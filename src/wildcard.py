@@ -0,0 +1,117 @@
+'''
+wildcard term lookup with a permuterm index
+
+every rotation of "term$" is stored in a sorted Lexicon (see lexicon.py), e.g. for "wing":
+"wing$", "ing$w", "ng$wi", "g$win", "$wing".
+A pattern X*Y is rotated so that the wildcard is at the end, "Y$X*", and the matching
+terms are the rotations starting with "Y$X": one prefix lookup, so the cost of an
+expansion depends on the number of matching terms, not on the size of the vocabulary.
+A pattern with several wildcards X*Y*Z is looked up with "Z$X", or with "Y" (the rotations
+starting with Y are the terms containing Y) when Y is longer, and the candidates are
+checked against the whole pattern.
+
+patterns are matched against the index terms, which are stems ("aerodynam*", "*sonic").
+'''
+"""Internal libraries"""
+from lexicon import Lexicon
+
+"""Outside libraries"""
+import fnmatch
+
+END      = "$" # marks the end of a term in the rotations, terms are made of \w characters only
+WILDCARD = "*"
+
+
+##
+# @brief     The permuterm index of a set of terms, used to expand wildcard query terms
+#
+# @bug       None documented yet
+#
+class PermutermIndex:
+    ##
+    #    @param         self
+    #    @param         terms: iterable of terms
+    #    @return        None
+    #    @brief         The constructor, it builds the lexicon of the rotations
+    #    @exception     None documented yet
+    ##
+    def __init__(self, terms=()):
+        rotations = []
+        for term in terms:
+            term += END
+            rotations.extend(term[i:] + term[:i] for i in range(len(term)))
+        self.__rotations = Lexicon(sorted(rotations))
+
+    def to_bytes(self):
+        return self.__rotations.to_bytes()
+
+    ##
+    #   @brief         This method replaces the index by saved bytes (see to_bytes), they are read in place
+    #   @param         self
+    #   @param         data: bytes or memoryview
+    #   @return        self
+    #   @exception     None
+    ##
+    def from_bytes(self, data):
+        self.__rotations = Lexicon().from_bytes(data)
+        return self
+
+    ##
+    #   @brief         This method returns the terms matching a wildcard pattern
+    #   @param         self
+    #   @param         pattern: term with one or more "*"
+    #   @return        terms: sorted list
+    #   @exception     None
+    ##
+    def expand(self, pattern):
+        if not WILDCARD in pattern:
+            return [pattern] if pattern + END in self.__rotations else []
+        parts  = pattern.split(WILDCARD)
+        key    = parts[-1] + END + parts[0]
+        middle = max(parts[1:-1], key=len) if len(parts) > 2 else ""
+        if len(middle) >= len(key):
+            key = middle
+        first, end = self.__rotations.prefix(key)
+        terms  = set()
+        for rotation in self.__rotations.terms(first, end):
+            after, _, before = rotation.partition(END)
+            terms.add(before + after)
+        if len(parts) > 2:
+            terms = [term for term in terms if fnmatch.fnmatchcase(term, pattern)]
+        return sorted(terms)
+
+
+##
+#   @brief     This method checks if a query term is a wildcard pattern
+#
+#   @param         term
+#   @return        boolean
+#   @exception     None
+##
+def isWildcard(term):
+    return WILDCARD in term
+
+
+##
+#   @brief     This method Is used for testing this Python script
+#
+#   @return        None
+#   @exception     None
+##
+def test():
+    ''' test your code thoroughly. put the testing cases here'''
+    terms     = ["aero", "aerodynam", "aerofoil", "airfoil", "foil", "hypersonic", "sonic", "supersonic", "wing"]
+    permuterm = PermutermIndex(terms)
+    assert permuterm.expand("aero*") == ["aero", "aerodynam", "aerofoil"], "Error in prefix wildcard"
+    assert permuterm.expand("*sonic") == ["hypersonic", "sonic", "supersonic"], "Error in suffix wildcard"
+    assert permuterm.expand("a*foil") == ["aerofoil", "airfoil"], "Error in middle wildcard"
+    assert permuterm.expand("*e*o*") == ["aero", "aerodynam", "aerofoil", "hypersonic", "supersonic"], "Error in multiple wildcards"
+    assert permuterm.expand("*oi*") == ["aerofoil", "airfoil", "foil"], "Error in multiple wildcards"
+    assert permuterm.expand("*") == sorted(terms) and permuterm.expand("wing") == ["wing"], "Error in wildcard"
+    assert permuterm.expand("x*") == [] and permuterm.expand("win") == [], "Error in missing terms"
+    copy = PermutermIndex().from_bytes(permuterm.to_bytes())
+    assert copy.expand("*foil") == ["aerofoil", "airfoil", "foil"], "Error in saving the permuterm index"
+    print("test Passed")
+
+if __name__ == '__main__':
+    test()